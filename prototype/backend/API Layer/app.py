@@ -3,6 +3,7 @@ from flask_cors import CORS
 import pandas as pd
 import os 
 import subprocess
+import tempfile
 import json
 import re
 import sys
@@ -67,6 +68,33 @@ DP_SCRIPT_PATH = os.path.join(DP_DIR_PATH, DP_SCRIPT)
 PROCESS_SCRIPT_PATH = os.path.join(PROCESS_DIR_PATH, PROCESS_SCRIPT)
 RISK_SCORE_SCRIPT_PATH = os.path.join(RISK_SCORE_DIR_PATH, RISK_SCORE_SCRIPT)
 
+# Warm SUMO instances for dynamic trips (0 falls back to one subprocess per request)
+SIMULATION_POOL_SIZE = int(os.environ.get("SIMULATION_POOL_SIZE", "2"))
+SIMULATION_POOL_INTERFACE = os.environ.get("SIMULATION_POOL_INTERFACE", "libsumo")
+simulation_pool = None
+
+def get_simulation_pool():
+    """
+    Returns the shared pool of warm SUMO instances, starting it on first use.
+    Returns None when the pool is disabled or cannot be started.
+    """
+    global simulation_pool
+    global SIMULATION_POOL_SIZE
+    if simulation_pool is None and SIMULATION_POOL_SIZE > 0:
+        try:
+            if SCRIPTS_DIR_PATH not in sys.path:
+                sys.path.append(SCRIPTS_DIR_PATH)
+            from simulation_server import SimulationPool, get_map_paths
+            from snapshot_library import get_snapshot_dir
+            sumocfg_path, net_path = get_map_paths()
+            logging.info(f"LOG: Starting {SIMULATION_POOL_SIZE} warm SUMO instances...")
+            simulation_pool = SimulationPool(sumocfg_path, net_path, size=SIMULATION_POOL_SIZE,
+                                             snapshot_dir=get_snapshot_dir("medium_map"), interface=SIMULATION_POOL_INTERFACE)
+        except Exception as e:
+            logging.error(f"LOG: !ERROR! Failed to start simulation pool, falling back to subprocess runs: {e}")
+            SIMULATION_POOL_SIZE = 0
+    return simulation_pool
+
 @app.route('/run-simulation', methods=['POST'])
 def run_simulation():
     """
@@ -81,6 +109,7 @@ def run_simulation():
         end_point = data.get('end_point')
         vehicle_type = data.get('vehicle_type')
         vehicle_behavior = data.get('vehicle_behavior')
+        depart_time = data.get('depart_time')
 
         # Check if all required parameters are present
         if not start_point or not end_point or not vehicle_type or not vehicle_behavior:
@@ -100,10 +129,21 @@ def run_simulation():
             "cautious": "cautious",
         }
         vehicle_behavior = vehicle_behaviors[vehicle_behavior]
+
+        # Run the trip on a warm SUMO instance if the pool is available
+        pool = get_simulation_pool()
+        if pool is not None:
+            from sumo_extract import get_dynamic_output_path
+            output_path = get_dynamic_output_path(RESULTS_DIR_PATH, vehicle_type, vehicle_behavior)
+            logging.info(f"LOG: Running trip on warm SUMO instance: {json.dumps(data)}")
+            pool.run_trip(start_point, end_point, vehicle_type, vehicle_behavior, output_path,
+                          depart_time=float(depart_time) if depart_time is not None else None)
+            logging.info(f"LOG: Vehicle data saved to {output_path}!")
+            logging.info("LOG: Simulation completed successfully.")
+            return jsonify({"message": "Simulation completed successfully."}), 200
         
         # Run the SUMO simulation
-        logging.info(f"LOG: Running command: python {SUMO_SCRIPT_PATH} {json.dumps(data)} --dynamic true --start_point {start_point} --end_point {end_point} --vehicle_type {vehicle_type} --behavior {vehicle_behavior}...")
-        result = subprocess.run([
+        command = [
             "python", 
             SUMO_SCRIPT_PATH, 
             "--dynamic", "true", 
@@ -111,7 +151,11 @@ def run_simulation():
             "--end_point", str(end_point),
             "--vehicle_type", vehicle_type, 
             "--behavior", vehicle_behavior
-        ], capture_output=True, text=True, check=True)
+        ]
+        if depart_time is not None:
+            command += ["--depart_time", str(depart_time)]
+        logging.info(f"LOG: Running command: {' '.join(command)}...")
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
         if result.stdout:
             # Split the stdout into lines and iterate over each line
             for line in result.stdout.splitlines():
@@ -123,9 +167,102 @@ def run_simulation():
             logging.error(f"LOG: !ERROR! Simulation failed.\n{result.stderr}")
         logging.info("LOG: Simulation completed successfully.")
         return jsonify({"message": "Simulation completed successfully."}), 200
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         logging.error(f"LOG: !ERROR! Simulation failed.")
         return jsonify({"error": f"Simulation failed: {str(e)}"}), 500
+
+@app.route('/run-simulation-batch', methods=['POST'])
+def run_simulation_batch():
+    """
+    Runs a batch of dynamic trips together in one SUMO simulation with staggered departures.
+    Each trip is saved to its own file in the dynamic results directory.
+    """
+    try:
+        logging.info(f"LOG: Running SUMO batch simulation...")
+        data = request.get_json()
+
+        # Get the trips, departure time and interval between departures
+        trips = data.get('trips')
+        depart_time = data.get('depart_time')
+        depart_interval = float(data.get('depart_interval', 1.0))
+
+        # Check if all required parameters are present
+        if not trips or any(not trip.get('start_point') or not trip.get('end_point') or not trip.get('vehicle_type')
+                            or not trip.get('vehicle_behavior') for trip in trips):
+            logging.error("LOG: !ERROR! Missing required parameters")
+            return jsonify({"error": "Missing required parameters"}), 400
+
+        # Map vehicle types and vehicle behaviors to SUMO parameters
+        vehicle_types = {
+            "car": "veh_passenger",
+            "motorcycle": "motorcycle_motorcycle",
+            "truck": "truck_truck",
+        }
+        vehicle_behaviors = {
+            "normal": "",
+            "aggressive": "aggressive",
+            "cautious": "cautious",
+        }
+        if any(trip['vehicle_type'] not in vehicle_types or trip['vehicle_behavior'] not in vehicle_behaviors for trip in trips):
+            logging.error("LOG: !ERROR! Unknown vehicle type or behavior")
+            return jsonify({"error": "Unknown vehicle type or behavior"}), 400
+
+        # Every trip gets its own output file, named like single dynamic runs
+        if SCRIPTS_DIR_PATH not in sys.path:
+            sys.path.append(SCRIPTS_DIR_PATH)
+        from sumo_extract import get_dynamic_output_path
+        sumo_trips = []
+        for i, trip in enumerate(trips):
+            vehicle_type = vehicle_types[trip['vehicle_type']]
+            vehicle_behavior = vehicle_behaviors[trip['vehicle_behavior']]
+            sumo_trips.append({
+                "start_point": list(trip['start_point']),
+                "end_point": list(trip['end_point']),
+                "vehicle_type": vehicle_type,
+                "vehicle_behavior": vehicle_behavior,
+                "output_path": get_dynamic_output_path(RESULTS_DIR_PATH, vehicle_type, vehicle_behavior, trip_index=i),
+            })
+
+        # Run the batch on a warm SUMO instance if the pool is available
+        pool = get_simulation_pool()
+        if pool is not None:
+            logging.info(f"LOG: Running {len(sumo_trips)} trips on warm SUMO instance...")
+            pool.run_trips(sumo_trips, depart_time=float(depart_time) if depart_time is not None else None,
+                           depart_interval=depart_interval)
+        else:
+            # Pass the trips to the SUMO script through a JSON file
+            trips_fd, trips_path = tempfile.mkstemp(suffix=".json", prefix="trips_")
+            with os.fdopen(trips_fd, "w") as f:
+                json.dump(sumo_trips, f)
+            command = [
+                "python",
+                SUMO_SCRIPT_PATH,
+                "--trips", trips_path,
+                "--depart_interval", str(depart_interval)
+            ]
+            if depart_time is not None:
+                command += ["--depart_time", str(depart_time)]
+            logging.info(f"LOG: Running command: {' '.join(command)}...")
+            try:
+                result = subprocess.run(command, capture_output=True, text=True, check=True)
+            finally:
+                os.remove(trips_path)
+            if result.stdout:
+                for line in result.stdout.splitlines():
+                    if not line.startswith("LOG: "):
+                        line = f"LOG: {line}"
+                    logging.info(line)
+            if result.stderr:
+                logging.error(f"LOG: !ERROR! Simulation failed.\n{result.stderr}")
+
+        # Report the file of every trip, or null for trips whose vehicle never departed
+        files = [os.path.basename(trip['output_path']) if os.path.exists(trip['output_path']) else None for trip in sumo_trips]
+        logging.info(f"LOG: Batch simulation completed: {sum(f is not None for f in files)} of {len(files)} trips saved.")
+        return jsonify({"message": "Simulation completed successfully.", "files": files}), 200
+    except Exception as e:
+        logging.error(f"LOG: !ERROR! Batch simulation failed.")
+        return jsonify({"error": f"Simulation failed: {str(e)}"}), 500
+
     
 @app.route('/vehicle-list', methods=['GET'])
 def get_vehicle_list():
@@ -571,6 +708,24 @@ def get_vehicle_route():
         logging.error(f"LOG: !ERROR! Failed to fetch vehicle route for data file: {data_file}")
         return jsonify({"error": f"Failed to fetch vehicle route: {str(e)}"}), 500
 
+def restore_cached_dp_release(data_file_path, epsilon):
+    """
+    Puts a cached DP release of the data file with this epsilon at its output path, looked up in the cache manifest.
+    Returns the output path, or None when the release is not cached or the cache cannot be read.
+    """
+    try:
+        if DP_DIR_PATH not in sys.path:
+            sys.path.append(DP_DIR_PATH)
+        from googledp_driving_data import get_release_key, restore_cached_release, DEFAULT_EPSILON
+        from dp_release_cache import DPReleaseCache, get_cache_dir
+        epsilon_input = float(epsilon)
+        cache = DPReleaseCache(get_cache_dir())
+        key = get_release_key(cache, data_file_path, epsilon_input or DEFAULT_EPSILON)
+        return restore_cached_release(cache, key, data_file_path, epsilon_input)
+    except Exception as e:
+        logging.error(f"LOG: !ERROR! Failed to read the DP release cache, applying differential privacy instead: {e}")
+        return None
+
 @app.route('/apply-dp', methods=['POST'])
 def apply_dp():
     """
@@ -594,6 +749,13 @@ def apply_dp():
     if not os.path.exists(data_file_path):
         return jsonify({"error": "No data available. Run the simulation first."}), 404
     
+    # The same data and epsilon were released before: return that release without spending budget again
+    output_file_path = restore_cached_dp_release(data_file_path, epsilon)
+    if output_file_path is not None:
+        log_output = f"LOG: Reused cached DP release, no privacy budget spent\nLOG: Differentially private dataset saved as {output_file_path}\n"
+        logging.info("LOG: Differential privacy release restored from the cache.")
+        return jsonify({"message": "Differential privacy applied successfully.", "log_output": log_output, "cached": True}), 200
+
     try:
         logging.info(f"LOG: Running command: python {DP_SCRIPT_PATH} --dataset {data_file_path} --epsilon {epsilon}")
         # Run the differential privacy script
@@ -609,7 +771,7 @@ def apply_dp():
             logging.error(f"LOG: !ERROR! Failed to apply differential privacy.\n{result.stderr}")
 
         logging.info("LOG: Differential privacy applied successfully.")
-        return jsonify({"message": "Differential privacy applied successfully.", "log_output": result.stdout}), 200
+        return jsonify({"message": "Differential privacy applied successfully.", "log_output": result.stdout, "cached": False}), 200
     except Exception as e:
         logging.error(f"LOG: !ERROR! Failed to apply differential privacy to data file: {data_file}")
         return jsonify({"error": f"Failed to apply differential privacy: {str(e)}", "log_output": result.stdout if result else ""}), 500
@@ -0,0 +1,102 @@
+import sys
+import math
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from googledp_driving_data import add_laplace_noise
+from laplace_noise import new_noise_generator, add_laplace_noise_array
+
+### ------------------------------ STATISTICS ------------------------------ ###
+def laplace_cdf(x, scale):
+    """
+    CDF of Laplace(0, scale).
+    """
+    return np.where(x < 0, 0.5 * np.exp(x / scale), 1 - 0.5 * np.exp(-x / scale))
+
+
+def kolmogorov_pvalue(statistic, n):
+    """
+    Asymptotic p-value of a one-sample Kolmogorov-Smirnov statistic.
+    """
+    t = statistic * math.sqrt(n)
+    if t < 0.2:
+        return 1.0
+    return min(1.0, max(0.0, 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * t * t) for k in range(1, 101))))
+
+
+def ks_statistic(samples, scale):
+    """
+    Largest distance between the empirical CDF of samples and the Laplace(0, scale) CDF.
+    """
+    samples = np.sort(samples)
+    n = len(samples)
+    cdf = laplace_cdf(samples, scale)
+    return max(np.max(np.arange(1, n + 1) / n - cdf), np.max(cdf - np.arange(n) / n))
+
+
+def check_distribution(noise, scale, alpha=0.01):
+    """
+    Tests drawn noise against Laplace(0, scale): a KS test plus the mean, variance (2b^2) and mean absolute value (b).
+    Returns a list of (check, value, expected, passed).
+    """
+    n = len(noise)
+    statistic = ks_statistic(noise, scale)
+    p_value = kolmogorov_pvalue(statistic, n)
+    # Moment checks allow 5 standard errors
+    mean_tolerance = 5 * math.sqrt(2) * scale / math.sqrt(n)
+    variance_tolerance = 5 * math.sqrt(20) * scale ** 2 / math.sqrt(n)
+    abs_tolerance = 5 * scale / math.sqrt(n)
+    return [
+        ("KS p-value", p_value, f"> {alpha}", p_value > alpha),
+        ("mean", float(noise.mean()), 0.0, bool(abs(noise.mean()) < mean_tolerance)),
+        ("variance", float(noise.var()), 2 * scale ** 2, bool(abs(noise.var() - 2 * scale ** 2) < variance_tolerance)),
+        ("mean |noise|", float(np.abs(noise).mean()), scale, bool(abs(np.abs(noise).mean() - scale) < abs_tolerance)),
+    ]
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vectorized Laplace noise against per-value PyDP mechanisms and check its distribution.")
+    parser.add_argument("--rows", type=int, default=5_000_000, help="Rows noised by the vectorized engine.")
+    parser.add_argument("--pydp_rows", type=int, default=200_000, help="Rows noised through PyDP (the per-value path is slow).")
+    parser.add_argument("--sensitivity", type=float, default=30.0, help="Column sensitivity.")
+    parser.add_argument("--epsilon", type=float, default=1.5, help="Column epsilon.")
+    parser.add_argument("--seed", type=int, default=None, help="Generator seed (default: cryptographically seeded).")
+
+    args = parser.parse_args()
+
+    rng = new_noise_generator(args.seed)
+    scale = args.sensitivity / args.epsilon
+    values = pd.Series(rng.uniform(0, 30, args.rows))
+    values[::50] = np.nan
+
+    # Current path: one PyDP mechanism per non-missing value
+    pydp_values = values[:args.pydp_rows]
+    start = time.perf_counter()
+    pydp_noisy = pydp_values.apply(lambda x: add_laplace_noise(x, args.sensitivity, args.epsilon) if pd.notnull(x) else x)
+    pydp_rate = args.pydp_rows / (time.perf_counter() - start)
+
+    # Vectorized path: one draw for the whole column
+    start = time.perf_counter()
+    noisy = add_laplace_noise_array(values, args.sensitivity, args.epsilon, rng)
+    vectorized_rate = args.rows / (time.perf_counter() - start)
+
+    print(f"PyDP per value: {pydp_rate:,.0f} values/s ({args.pydp_rows:,} rows)")
+    print(f"Vectorized:     {vectorized_rate:,.0f} values/s ({args.rows:,} rows, {vectorized_rate / pydp_rate:,.0f}x)")
+
+    # Missing values must stay missing and nothing else may become missing
+    missing_kept = bool(np.array_equal(np.isnan(noisy), values.isna().to_numpy()))
+    print(f"{'missing values':>14}: {'ok' if missing_kept else 'FAILED'}")
+
+    # Noise distribution of both paths against Laplace(sensitivity / epsilon)
+    passed = missing_kept
+    noise = (noisy - values.to_numpy())[~values.isna().to_numpy()]
+    pydp_noise = (pydp_noisy - pydp_values).dropna().to_numpy()
+    for name, samples in (("vectorized", noise), ("PyDP", pydp_noise)):
+        print(f"{name} noise, {len(samples):,} samples, Laplace(0, {scale:g}):")
+        for check, value, expected, ok in check_distribution(samples, scale):
+            print(f"{check:>14}: {value:.4g} (expected {expected}) {'ok' if ok else 'FAILED'}")
+            passed = passed and ok
+
+    sys.exit(0 if passed else 1)
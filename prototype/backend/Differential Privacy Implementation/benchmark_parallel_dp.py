@@ -0,0 +1,76 @@
+import os
+import io
+import time
+import secrets
+import argparse
+import contextlib
+import numpy as np
+import pandas as pd
+from googledp_driving_data import apply_differential_privacy
+from noise_streams import CounterNoiseSource
+from parallel_dp import apply_differential_privacy_parallel
+
+DP_COLUMNS = ["Speed", "Acceleration", "Latitude", "Longitude", "Time_Gap"]
+
+
+def synthetic_dataset(rows, seed=0):
+    """
+    Builds a vehicle-data-like frame with the DP columns and a few missing values.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Speed": rng.uniform(0, 30, rows),
+        "Acceleration": rng.normal(0, 1, rows),
+        "Latitude": 41.8 + rng.normal(0, 1e-3, rows),
+        "Longitude": -72.25 + rng.normal(0, 1e-3, rows),
+        "Time_Gap": rng.exponential(3, rows),
+    })
+    df.loc[::7, "Time_Gap"] = np.nan
+    return df
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how parallel DP scales with the number of workers.")
+    parser.add_argument("--rows", type=int, default=50_000_000, help="Rows of the synthetic dataset.")
+    parser.add_argument("--dataset", type=str, default=None, help="Vehicle data CSV to use instead of a synthetic dataset.")
+    parser.add_argument("--workers", type=str, default="None", help="Comma-separated worker counts (default: powers of two up to the core count).")
+    parser.add_argument("--rows_per_task", type=int, default=2_000_000, help="Rows noised per task.")
+    parser.add_argument("--epsilon", type=float, default=5, help="Privacy budget.")
+
+    args = parser.parse_args()
+
+    if args.workers != "None":
+        worker_counts = [int(w) for w in args.workers.split(",")]
+    else:
+        worker_counts = [2 ** i for i in range(os.cpu_count().bit_length()) if 2 ** i <= os.cpu_count()]
+        if worker_counts[-1] != os.cpu_count():
+            worker_counts.append(os.cpu_count())
+
+    df = pd.read_csv(args.dataset) if args.dataset else synthetic_dataset(args.rows)
+    rows = len(df)
+    noise_source = CounterNoiseSource(secrets.token_bytes(32))
+
+    # Single-process baseline with the same noise
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        serial = apply_differential_privacy(df, numeric_columns=DP_COLUMNS, epsilon=args.epsilon, noise_source=noise_source)
+    serial_time = time.perf_counter() - start
+    print(f"{'serial':>8}: {serial_time:7.2f}s ({rows / serial_time:,.0f} rows/s)")
+
+    identical = True
+    for workers in worker_counts:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            parallel = apply_differential_privacy_parallel(df, numeric_columns=DP_COLUMNS, epsilon=args.epsilon, workers=workers,
+                                                           rows_per_task=args.rows_per_task, noise_source=noise_source)
+        elapsed = time.perf_counter() - start
+        same = all(np.array_equal(serial[column].to_numpy(), parallel[column].to_numpy(), equal_nan=True)
+                   for column in DP_COLUMNS if column in df.columns)
+        identical = identical and same
+        speedup = serial_time / elapsed
+        print(f"{workers:>8}: {elapsed:7.2f}s ({rows / elapsed:,.0f} rows/s, {speedup:.2f}x, "
+              f"{speedup / workers:.0%} efficiency) {'identical' if same else 'DIFFERS'}")
+        del parallel
+
+    print(f"Output bit-identical to the serial run for every worker count: {'yes' if identical else 'NO'}")
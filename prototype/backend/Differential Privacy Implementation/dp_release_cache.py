@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import contextlib
+try:
+    import fcntl
+except ImportError:
+    # Windows has no fcntl; the manifest is locked with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "manifest.lock"
+MANIFEST_VERSION = 1
+DEFAULT_MAX_BYTES = 2 * 2 ** 30
+
+
+def get_cache_dir():
+    """
+    Returns the release cache directory: $DP_CACHE_DIR, or SUMO/results/dp_cache/.
+    """
+    curr_dir_path = os.path.dirname(os.path.realpath(__file__))
+    return os.environ.get("DP_CACHE_DIR") or os.path.join(curr_dir_path, "..", "SUMO", "results", "dp_cache")
+
+
+def file_sha256(path, block_size=2 ** 20):
+    """
+    Returns the SHA-256 of a file's contents, read in blocks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def release_key(dataset_hash, epsilon, epsilon_weights, numeric_columns, mechanism_version, noise_mode="fresh",
+                sensitivity_mode="exact"):
+    """
+    Returns the cache key of a DP release: everything that decides its distribution, including how its sensitivities
+    were computed ("exact", or "sketch-<sample size>" for streamed releases), plus how its noise was seeded
+    ("fresh" or "sealed"), so a request for a reproducible release never gets one whose seed was not kept.
+    """
+    parts = {"dataset": dataset_hash, "epsilon": float(epsilon), "weights": epsilon_weights,
+             "columns": list(numeric_columns), "mechanism": mechanism_version, "noise": noise_mode,
+             "sensitivity": sensitivity_mode}
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+@contextlib.contextmanager
+def exclusive_lock(lock_path):
+    """
+    Holds an exclusive lock on lock_path, shared by every process that uses the same cache directory.
+    """
+    with open(lock_path, "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class DPReleaseCache:
+    """
+    Content-addressed store of DP releases with LRU eviction under a disk-space cap.
+    A repeated request returns the stored release, so the same data is never noised (and its budget spent) twice.
+    manifest.json lists every release with its size and last use, plus the content hashes of seen datasets
+    keyed by (path, size, mtime) so unchanged datasets are not re-hashed.
+    Every change re-reads the manifest under a lock file, so concurrent processes never drop each other's updates.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+        self.lock_path = os.path.join(cache_dir, LOCK_FILE)
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"version": MANIFEST_VERSION, "releases": {}, "datasets": {}}
+
+    def save_manifest(self):
+        """
+        Replaces the manifest atomically so a crash never leaves it half-written.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @contextlib.contextmanager
+    def update_manifest(self):
+        """
+        Locks the cache, reloads the manifest for the caller to change and saves it once the block completes.
+        """
+        with exclusive_lock(self.lock_path):
+            self.manifest = self.load_manifest()
+            yield self.manifest
+            self.save_manifest()
+
+    def dataset_hash(self, dataset_path):
+        """
+        Returns the content hash of a dataset, reusing the stored hash while the file is unchanged.
+        """
+        dataset_path = os.path.abspath(dataset_path)
+        stat = os.stat(dataset_path)
+        entry = self.manifest["datasets"].get(dataset_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        sha256 = file_sha256(dataset_path)
+        with self.update_manifest() as manifest:
+            manifest["datasets"][dataset_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+        return sha256
+
+    def release_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.csv")
+
+    def get(self, key):
+        """
+        Returns the path of a stored release and marks it as used, or None.
+        """
+        with self.update_manifest() as manifest:
+            entry = manifest["releases"].get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(self.release_path(key)):
+                del manifest["releases"][key]
+                return None
+            entry["last_used"] = time.time()
+        return self.release_path(key)
+
+    def details(self, key):
+        """
+        Returns the details stored with a release, e.g. its sealed run ID.
+        """
+        entry = self.manifest["releases"].get(key)
+        return entry["details"] if entry else {}
+
+    def put(self, key, release_file, details=None):
+        """
+        Copies a new release into the cache and evicts the least recently used releases beyond the cap.
+        Releases larger than the whole cap are not stored.
+        """
+        size = os.path.getsize(release_file)
+        if size > self.max_bytes:
+            print(f"LOG: DP release of {size} bytes exceeds the cache cap, not cached")
+            return None
+        # Copy outside the lock, then move into place so readers never see a partial release
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(release_file, tmp_path)
+            os.replace(tmp_path, self.release_path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        with self.update_manifest() as manifest:
+            now = time.time()
+            manifest["releases"][key] = {"size": size, "created": now, "last_used": now, "details": details or {}}
+            self.evict(keep=key)
+        return self.release_path(key)
+
+    def evict(self, keep=None):
+        """
+        Removes least recently used releases until the cache fits its cap. Called inside update_manifest().
+        """
+        releases = self.manifest["releases"]
+        total = sum(entry["size"] for entry in releases.values())
+        for key in sorted(releases, key=lambda k: releases[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= releases.pop(key)["size"]
+            try:
+                os.remove(self.release_path(key))
+            except FileNotFoundError:
+                pass
+            print(f"LOG: Evicted DP release {key} from the cache")
@@ -1,9 +1,34 @@
 import pandas as pd
-from pydp.algorithms.numerical_mechanisms import LaplaceMechanism  # Correct import
 import os
-import numpy as np
+import sys
+import shutil
 import argparse
 from ast import literal_eval
+from laplace_noise import new_noise_generator, add_laplace_noise_array
+from sensitivity_sketch import ColumnSketch, DEFAULT_SAMPLE_SIZE
+from noise_streams import CounterNoiseSource, seal_seed, load_seed, get_seed_dir
+from dp_release_cache import DPReleaseCache, release_key, get_cache_dir, DEFAULT_MAX_BYTES
+
+# Share of the privacy budget spent on each column
+EPSILON_WEIGHTS = {
+    "Speed": 0.3,
+    "Acceleration": 0.4,
+    "Time_Gap": 0.2,
+    "Latitude": 0.05,
+    "Longitude": 0.05,
+}
+
+# Columns released with noise
+DP_COLUMNS = ["Speed", "Acceleration", "Latitude", "Longitude", 
+              "Time_Gap", 
+           #    "Headway_Distance"
+              ]
+
+# Epsilon used when none is given
+DEFAULT_EPSILON = 5
+
+# Version of the noise mechanism and sensitivity rules; bump it whenever either changes so cached releases are not reused
+MECHANISM_VERSION = "laplace-2"
 
 
 def calculate_continous_sensitivity(df, column):
@@ -19,14 +44,35 @@ def calculate_percentile_sensitivity(df, column):
 def calculate_location_sensitivity(df, column):
     return df[column].dropna().diff().abs().max()
 
+def sensitivity_measure(column):
+    """
+    Returns how a column's sensitivity is measured: "continuous" (range), "location" (largest step) or "percentile" (IQR).
+    """
+    if column == "Speed" or column == "Acceleration":
+        return "continuous"
+    elif column == "Latitude" or column == "Longitude":
+        return "location"
+    return "percentile"
+
 def add_laplace_noise(value, sensitivity, epsilon):
     """
     Adds Laplace noise to a given value using the specified sensitivity and epsilon.
+    Builds a PyDP mechanism per value; kept as the reference the vectorized noise is benchmarked against.
     """
+    from pydp.algorithms.numerical_mechanisms import LaplaceMechanism
     laplace_mech = LaplaceMechanism(epsilon, sensitivity)
     return laplace_mech.add_noise(value)
 
-def apply_differential_privacy(df, numeric_columns=["Speed", "Acceleration", "Latitude", "Longitude", "Time_Gap", "Headway_Distance"], epsilon=5):
+def column_rng(rng, noise_source, column, start_row, epsilon):
+    """
+    Returns what a column's noise is drawn from: its counter-based stream from start_row when a noise source is given, else rng.
+    """
+    if noise_source is None:
+        return rng
+    return noise_source.rows(column, start_row, stream=f"epsilon_{epsilon}")
+
+def apply_differential_privacy(df, numeric_columns=["Speed", "Acceleration", "Latitude", "Longitude", "Time_Gap", "Headway_Distance"], epsilon=5, rng=None,
+                               noise_source=None, start_row=0):
     """
     Applies Differential Privacy to specified numeric columns in the dataframe.
     
@@ -34,34 +80,31 @@ def apply_differential_privacy(df, numeric_columns=["Speed", "Acceleration", "La
     df (pd.DataFrame): Input DataFrame.
     numeric_columns (list): List of numeric column names to apply DP.
     epsilon (float): Privacy budget (default: 5).
+    rng (np.random.Generator): Noise source (default: a new cryptographically seeded generator).
+    noise_source (CounterNoiseSource): Reproducible noise keyed by run seed, column and row; replaces rng.
+    start_row (int): Row index of the first row of df in the dataset, for noise_source.
     
     Returns:
     pd.DataFrame: DataFrame with DP-applied columns.
     """
     df_copy = df.copy()  # Avoid modifying original data
+    rng = rng if rng is not None else new_noise_generator()
 
     senstivities = {}
     for column in numeric_columns:
         if column in df_copy.columns:
-            if column == "Speed" or column == "Acceleration":
+            measure = sensitivity_measure(column)
+            if measure == "continuous":
                 senstivities[column] = calculate_continous_sensitivity(df_copy, column)
-            elif column == "Latitude" or column == "Latitude":
+            elif measure == "location":
                 senstivities[column] = calculate_location_sensitivity(df_copy, column)
             else:
                 senstivities[column] = calculate_percentile_sensitivity(df_copy, column)
 
-    epsilon_weights = {
-        "Speed": 0.3,
-        "Acceleration": 0.4,
-        "Time_Gap": 0.2,
-        "Latitude": 0.05,
-        "Longitude": 0.05,
-    }
-
     for column in numeric_columns:
         if column in df_copy.columns:
             column_sensitivity = senstivities[column]
-            column_epsilon = epsilon * epsilon_weights[column]
+            column_epsilon = epsilon * EPSILON_WEIGHTS[column]
 
             noise = column_sensitivity / column_epsilon
 
@@ -69,23 +112,123 @@ def apply_differential_privacy(df, numeric_columns=["Speed", "Acceleration", "La
             print(f"LOG: Epsilon for {column}: {column_epsilon}")
             print(f"LOG: Noise for {column}: {noise}")
             
-            df_copy[column] = df_copy[column].apply(
-                lambda x: add_laplace_noise(x, column_sensitivity, column_epsilon) if pd.notnull(x) else x
-            )
+            # Draw the whole column's noise at once; missing values stay missing
+            df_copy[column] = add_laplace_noise_array(df_copy[column], column_sensitivity, column_epsilon,
+                                                      column_rng(rng, noise_source, column, start_row, epsilon))
     
     return df_copy
 
+def apply_differential_privacy_chunked(dataset_path, output_path, numeric_columns=["Speed", "Acceleration", "Latitude", "Longitude", "Time_Gap"], epsilon=5, chunksize=500_000, rng=None,
+                                       noise_source=None):
+    """
+    Streaming version of apply_differential_privacy() whose memory use does not grow with the dataset.
+    The first pass computes the sensitivities from bounded-memory column sketches, the second pass
+    noises and writes the dataset chunk by chunk. Columns without noise are copied as read.
+    
+    Parameters:
+    dataset_path (str): Input CSV file.
+    output_path (str): Output CSV file.
+    numeric_columns (list): List of numeric column names to apply DP.
+    epsilon (float): Privacy budget (default: 5).
+    chunksize (int): Rows read per chunk.
+    rng (np.random.Generator): Noise source (default: a new cryptographically seeded generator).
+    noise_source (CounterNoiseSource): Reproducible noise keyed by run seed, column and row; replaces rng.
+    """
+    rng = rng if rng is not None else new_noise_generator()
+    columns = pd.read_csv(dataset_path, nrows=0).columns
+    dp_columns = [column for column in numeric_columns if column in columns]
+
+    # First pass: sensitivities
+    sketches = {column: ColumnSketch() for column in dp_columns}
+    for chunk in pd.read_csv(dataset_path, usecols=dp_columns, chunksize=chunksize):
+        for column in dp_columns:
+            sketches[column].update(chunk[column])
+
+    noise_parameters = {}
+    for column in dp_columns:
+        column_sensitivity = sketches[column].sensitivity(sensitivity_measure(column))
+        column_epsilon = epsilon * EPSILON_WEIGHTS[column]
+        noise_parameters[column] = (column_sensitivity, column_epsilon)
+
+        print(f"LOG: Sensitivity for {column}: {column_sensitivity}")
+        print(f"LOG: Epsilon for {column}: {column_epsilon}")
+        print(f"LOG: Noise for {column}: {column_sensitivity / column_epsilon}")
+
+    # Second pass: noise and write each chunk
+    # Other columns are read as text without missing-value parsing, so values like "None" are written back verbatim
+    dtypes = {column: str for column in columns if column not in dp_columns}
+    na_values = {column: ["", "nan", "NaN", "NA", "null"] for column in dp_columns}
+    rows = 0
+    for chunk in pd.read_csv(dataset_path, dtype=dtypes, keep_default_na=False, na_values=na_values, chunksize=chunksize):
+        for column, (column_sensitivity, column_epsilon) in noise_parameters.items():
+            chunk[column] = add_laplace_noise_array(chunk[column], column_sensitivity, column_epsilon,
+                                                    column_rng(rng, noise_source, column, rows, epsilon))
+        chunk.to_csv(output_path, index=False, mode='w' if rows == 0 else 'a', header=rows == 0)
+        rows += len(chunk)
+    if rows == 0:
+        pd.DataFrame(columns=columns).to_csv(output_path, index=False)
+    print(f"LOG: Applied differential privacy to {rows} rows in chunks of {chunksize}")
+
+def get_dp_output_path(dataset_path, epsilon_input):
+    """
+    Returns where a dataset's DP release is saved: dp_<name>.csv for the default epsilon (0), else dp_<name>_epsilon_<epsilon>.csv.
+    """
+    input_dir = os.path.dirname(dataset_path)
+    if epsilon_input == 0:
+        return os.path.join(input_dir, "dp_" + os.path.basename(dataset_path))
+    return os.path.join(input_dir, "dp_" + os.path.basename(dataset_path).replace(".csv", f"_epsilon_{epsilon_input}.csv"))
+
+def remove_epsilon_releases(dataset_path):
+    """
+    Removes earlier dp_<name>_epsilon_*.csv releases next to a dataset, so only the newest one is found there.
+    Earlier releases stay in the release cache.
+    """
+    input_dir = os.path.dirname(dataset_path)
+    for filename in os.listdir(input_dir):
+        if filename.startswith("dp_" + os.path.basename(dataset_path).replace(".csv", f"_epsilon_")) and filename.endswith(".csv"):
+            os.remove(os.path.join(input_dir, filename))
+
+def get_release_key(cache, dataset_path, epsilon, numeric_columns=DP_COLUMNS, sealed=False, sketch_size=None):
+    """
+    Returns the cache key of a dataset's release: its content hash, epsilon, column weights, mechanism version,
+    whether its noise seed is sealed and, for streamed releases, the sample size of the sensitivity sketches.
+    """
+    return release_key(cache.dataset_hash(dataset_path), epsilon, EPSILON_WEIGHTS, numeric_columns, MECHANISM_VERSION,
+                       noise_mode="sealed" if sealed else "fresh",
+                       sensitivity_mode="exact" if sketch_size is None else f"sketch-{sketch_size}")
+
+def restore_cached_release(cache, key, dataset_path, epsilon_input):
+    """
+    Puts a stored release at the dataset's DP output path. Returns the path, or None when the release is not cached.
+    """
+    cached_path = cache.get(key)
+    if cached_path is None:
+        return None
+    if epsilon_input != 0:
+        remove_epsilon_releases(dataset_path)
+    output_file_path = get_dp_output_path(dataset_path, epsilon_input)
+    shutil.copyfile(cached_path, output_file_path)
+    return output_file_path
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Apply Differential Privacy to vehicle data.")
     parser.add_argument("--dataset", type=str, required=True, help="Full path to dataset file (e.g., /path/to/vehicle_data.csv)")
     parser.add_argument("--epsilon", type=float, default=0, help="Epsilon parameter to use while applying differential privacy.")
+    parser.add_argument("--chunksize", type=int, default=0, help="Stream the dataset in chunks of this many rows with bounded memory (0: load it whole).")
+    parser.add_argument("--sealed_seed", type=bool, default=False, help="Draw reproducible noise from a new seed kept in a sealed manifest outside the data directory.")
+    parser.add_argument("--workers", type=int, default=0, help="Apply DP on a process pool of this many workers (0: single process).")
+    parser.add_argument("--seed_run", type=str, default="None", help="Regenerate the noise of a sealed run (its run ID) for an audit.")
+    parser.add_argument("--no_cache", type=bool, default=False, help="Always noise the dataset instead of reusing a cached release.")
+    parser.add_argument("--cache_max_mb", type=int, default=DEFAULT_MAX_BYTES // 2 ** 20, help="Disk space cap of the release cache in MiB.")
 
     args = parser.parse_args()
+    if args.workers > 0 and args.chunksize > 0:
+        parser.error("Use either --workers or --chunksize, not both.")
 
     epsilon_input = args.epsilon
 
     if epsilon_input == 0:
-        epsilon = 5
+        epsilon = DEFAULT_EPSILON
     else:
         epsilon = epsilon_input
 
@@ -95,38 +238,77 @@ if __name__ == "__main__":
     dataset_path = os.path.abspath(args.dataset)
     input_dir = os.path.dirname(dataset_path)
     
-    # Load dataset
-    df = pd.read_csv(dataset_path)
-
     # Define numerical columns that need DP
-    numeric_columns = ["Speed", "Acceleration", "Latitude", "Longitude", 
-                       "Time_Gap", 
-                    #    "Headway_Distance"
-                       ]
-    
-    # Get all original columns that are not numeric
-    non_numeric_columns = [col for col in df.columns if col not in numeric_columns]
-
-    # Apply Differential Privacy
-    df_dp = apply_differential_privacy(df, numeric_columns=numeric_columns, epsilon=epsilon)
-
-    # Keep only original and DP columns
-    # dp_columns = [f"{col}_DP" for col in numeric_columns]
-    # selected_columns = non_numeric_columns + dp_columns    
-    # df_dp = df_dp[selected_columns]
-
-    # Save and display results
-    if epsilon_input == 0:
-        output_file_path = os.path.join(input_dir, "dp_" + os.path.basename(dataset_path))
+    numeric_columns = DP_COLUMNS
+
+    # Return the stored release if this data was already released with the same epsilon; audits always regenerate.
+    # Sealed-seed requests only reuse releases that were sealed themselves, so they stay reproducible
+    cache = None
+    if not args.no_cache and args.seed_run == "None":
+        cache = DPReleaseCache(get_cache_dir(), max_bytes=args.cache_max_mb * 2 ** 20)
+        # Streamed releases use sketched percentile sensitivities, so they are kept apart from exact ones
+        key = get_release_key(cache, dataset_path, epsilon, numeric_columns, sealed=args.sealed_seed,
+                              sketch_size=DEFAULT_SAMPLE_SIZE if args.chunksize > 0 else None)
+        output_file_path = restore_cached_release(cache, key, dataset_path, epsilon_input)
+        if output_file_path is not None:
+            print(f"LOG: Reused cached release {key}, no privacy budget spent")
+            if args.sealed_seed:
+                print(f"LOG: Its noise seed is sealed as run {cache.details(key).get('seed_run')} in {get_seed_dir()}")
+            print(f"LOG: Differentially private dataset saved as {output_file_path}")
+            sys.exit(0)
+
+    # Counter-based noise from a sealed seed makes the release reproducible in audits
+    noise_source = None
+    run_id = None
+    if args.seed_run != "None":
+        seed, details = load_seed(args.seed_run)
+        if details.get("epsilon") != epsilon:
+            print(f"LOG: !WARNING! Sealed run {args.seed_run} used epsilon {details.get('epsilon')}, not {epsilon}")
+        noise_source = CounterNoiseSource(seed)
+        print(f"LOG: Reproducing the noise of sealed run {args.seed_run}")
+    elif args.sealed_seed:
+        run_id, seed = seal_seed({"dataset": dataset_path, "epsilon": epsilon, "columns": numeric_columns})
+        noise_source = CounterNoiseSource(seed)
+        print(f"LOG: Noise seed sealed as run {run_id} in {get_seed_dir()}")
+
+    # Set output path
+    if epsilon_input != 0:
+        remove_epsilon_releases(dataset_path)
+    output_file_path = get_dp_output_path(dataset_path, epsilon_input)
+
+    if args.chunksize > 0:
+        # Apply Differential Privacy without loading the whole dataset
+        apply_differential_privacy_chunked(dataset_path, output_file_path, numeric_columns=numeric_columns, epsilon=epsilon,
+                                           chunksize=args.chunksize, noise_source=noise_source)
     else:
-        for filename in os.listdir(input_dir):
-            if filename.startswith("dp_" + os.path.basename(dataset_path).replace(".csv", f"_epsilon_")) and filename.endswith(".csv"):
-                os.remove(os.path.join(input_dir, filename))
-        output_file_path = os.path.join(input_dir, "dp_" + os.path.basename(dataset_path).replace(".csv", f"_epsilon_{epsilon}.csv"))
-    df_dp.to_csv(output_file_path, index=False)
+        # Load dataset
+        df = pd.read_csv(dataset_path)
+    
+        # Get all original columns that are not numeric
+        non_numeric_columns = [col for col in df.columns if col not in numeric_columns]
+
+        # Apply Differential Privacy
+        if args.workers > 0:
+            from parallel_dp import apply_differential_privacy_parallel
+            df_dp = apply_differential_privacy_parallel(df, numeric_columns=numeric_columns, epsilon=epsilon, workers=args.workers,
+                                                        noise_source=noise_source)
+        else:
+            df_dp = apply_differential_privacy(df, numeric_columns=numeric_columns, epsilon=epsilon, noise_source=noise_source)
+
+        # Keep only original and DP columns
+        # dp_columns = [f"{col}_DP" for col in numeric_columns]
+        # selected_columns = non_numeric_columns + dp_columns    
+        # df_dp = df_dp[selected_columns]
+
+        # Save and display results
+        df_dp.to_csv(output_file_path, index=False)
     print(f"LOG: Differentially private dataset saved as {output_file_path}")
     # print(df_dp.head())
 
+    # Keep the release so a repeated request is answered without noising again
+    if cache is not None:
+        cache.put(key, output_file_path, {"dataset": dataset_path, "epsilon": epsilon, "seed_run": run_id})
+
 
 ###################### FOR CONTINOUS DATA ######################
 # import numpy as np
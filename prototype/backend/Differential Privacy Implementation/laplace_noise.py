@@ -0,0 +1,42 @@
+import secrets
+import numpy as np
+
+
+def new_noise_generator(seed=None):
+    """
+    Returns the random generator the noise is drawn from.
+    Without a seed it is seeded with 128 bits from the operating system's cryptographic entropy source.
+    """
+    if seed is None:
+        seed = secrets.randbits(128)
+    return np.random.Generator(np.random.PCG64(seed))
+
+
+def laplace_scale(sensitivity, epsilon):
+    """
+    Returns the scale b = sensitivity / epsilon of the Laplace mechanism.
+    An undefined (NaN) sensitivity, e.g. of a column with too few values, gives NaN noise.
+    """
+    if epsilon <= 0:
+        raise ValueError(f"Epsilon must be positive, got {epsilon}")
+    if sensitivity < 0:
+        raise ValueError(f"Sensitivity must not be negative, got {sensitivity}")
+    return sensitivity / epsilon
+
+
+def laplace_noise(size, sensitivity, epsilon, rng=None):
+    """
+    Draws size values of Laplace(0, sensitivity / epsilon) noise in one vectorized call.
+    """
+    rng = rng if rng is not None else new_noise_generator()
+    return rng.laplace(0.0, laplace_scale(sensitivity, epsilon), size)
+
+
+def add_laplace_noise_array(values, sensitivity, epsilon, rng=None):
+    """
+    Returns a float64 copy of values with Laplace noise added to every element.
+    Missing values (NaN) stay missing.
+    """
+    noisy = np.array(values, dtype=np.float64)
+    noisy += laplace_noise(noisy.shape, sensitivity, epsilon, rng)
+    return noisy
@@ -0,0 +1,118 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import secrets
+import numpy as np
+
+# Philox returns 4 64-bit values per counter increment
+PHILOX_BLOCK = 4
+
+SEED_BYTES = 32
+
+
+### ------------------------------ NOISE STREAMS ------------------------------ ###
+class CounterNoiseSource:
+    """
+    Counter-based Laplace noise: the noise of a value depends only on (run seed, column, stream, row index).
+    Each (column, stream) gets its own Philox key and row r uses the generator's r-th 64-bit output,
+    so any split of the rows across workers reproduces the serial run bit for bit.
+    The stream label separates releases of the same run (e.g. different epsilons), whose noise must not be shared.
+    """
+
+    def __init__(self, seed):
+        if len(seed) != SEED_BYTES:
+            raise ValueError(f"Seed must be {SEED_BYTES} bytes, got {len(seed)}")
+        self.seed = seed
+
+    def key(self, column, stream=""):
+        """
+        Derives the 128-bit Philox key of a column's stream from the run seed.
+        """
+        digest = hashlib.blake2b(f"{column}\0{stream}".encode(), key=self.seed, digest_size=16).digest()
+        return np.frombuffer(digest, dtype="<u8").copy()
+
+    def uniforms(self, column, start_row, count, stream=""):
+        """
+        Returns the uniform (0, 1) values of rows [start_row, start_row + count) of a column's stream.
+        """
+        block, skip = divmod(start_row, PHILOX_BLOCK)
+        bit_generator = np.random.Philox(key=self.key(column, stream), counter=np.array([block, 0, 0, 0], dtype=np.uint64))
+        raw = bit_generator.random_raw(count + skip)[skip:]
+        # 53-bit midpoints never reach 0 or 1, so the inverse CDF below stays finite
+        return ((raw >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+
+    def laplace(self, column, start_row, count, scale, stream=""):
+        """
+        Returns Laplace(0, scale) noise for rows [start_row, start_row + count) by inverting the CDF.
+        """
+        centered = self.uniforms(column, start_row, count, stream) - 0.5
+        return -scale * np.sign(centered) * np.log1p(-2.0 * np.abs(centered))
+
+    def rows(self, column, start_row, stream=""):
+        """
+        Returns a generator-like view of a column's stream from start_row, usable as the rng of laplace_noise().
+        """
+        return RowNoise(self, column, start_row, stream)
+
+
+class RowNoise:
+    """
+    Answers laplace(loc, scale, size) like np.random.Generator, drawing consecutive rows of one noise stream.
+    """
+
+    def __init__(self, source, column, start_row, stream=""):
+        self.source = source
+        self.column = column
+        self.row = start_row
+        self.stream = stream
+
+    def laplace(self, loc, scale, size):
+        count = int(np.prod(size))
+        noise = loc + self.source.laplace(self.column, self.row, count, scale, self.stream)
+        self.row += count
+        return noise.reshape(size)
+
+
+### ------------------------------ SEED MANIFEST ------------------------------ ###
+def get_seed_dir():
+    """
+    Returns the directory of sealed seed manifests: $DP_SEED_DIR, or ~/.dp_seeds.
+    Seeds are kept away from the released data, which must not reveal them.
+    """
+    return os.environ.get("DP_SEED_DIR") or os.path.join(os.path.expanduser("~"), ".dp_seeds")
+
+
+def manifest_digest(entry):
+    return hashlib.sha256(json.dumps(entry, sort_keys=True).encode()).hexdigest()
+
+
+def seal_seed(details, seed_dir=None):
+    """
+    Creates a run seed and writes it to a new sealed manifest: created exclusively, owner read-only,
+    with a digest of its contents that load_seed() checks. Returns (run_id, seed).
+    """
+    seed_dir = seed_dir or get_seed_dir()
+    os.makedirs(seed_dir, mode=0o700, exist_ok=True)
+    run_id = uuid.uuid4().hex
+    seed = secrets.token_bytes(SEED_BYTES)
+    entry = {"run_id": run_id, "seed": seed.hex(), "created": time.time(), "details": details}
+    manifest = dict(entry, digest=manifest_digest(entry))
+
+    fd = os.open(os.path.join(seed_dir, f"{run_id}.json"), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o400)
+    with os.fdopen(fd, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return run_id, seed
+
+
+def load_seed(run_id, seed_dir=None):
+    """
+    Returns the seed and details of a sealed run, refusing manifests whose contents were changed.
+    """
+    with open(os.path.join(seed_dir or get_seed_dir(), f"{run_id}.json")) as f:
+        manifest = json.load(f)
+    digest = manifest.pop("digest", None)
+    if digest != manifest_digest(manifest) or manifest.get("run_id") != run_id:
+        raise ValueError(f"Seed manifest of run {run_id} does not match its digest")
+    return bytes.fromhex(manifest["seed"]), manifest["details"]
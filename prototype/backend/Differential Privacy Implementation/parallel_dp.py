@@ -0,0 +1,101 @@
+import os
+import secrets
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from googledp_driving_data import sensitivity_measure, EPSILON_WEIGHTS
+from noise_streams import CounterNoiseSource
+from laplace_noise import laplace_scale
+
+# Per-process view of the shared column block (shared memory handle and array)
+_worker = {}
+
+
+### ------------------------------ POOL WORKERS ------------------------------ ###
+def attach_block(shm_name, shape):
+    """
+    Pool initializer: maps the shared column block once per worker.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _worker.update(shm=shm, block=np.ndarray(shape, dtype=np.float64, buffer=shm.buf))
+
+
+def sensitivity_task(column_index, measure):
+    """
+    Computes one column's sensitivity from the shared block, with the same measures as the in-memory path.
+    """
+    values = _worker['block'][column_index]
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.nan
+    if measure == "continuous":
+        return values.max() - values.min()
+    if measure == "location":
+        return np.abs(np.diff(values)).max() if len(values) > 1 else np.nan
+    q25, q75 = np.quantile(values, [0.25, 0.75])
+    return q75 - q25
+
+
+def noise_task(column_index, column, start, stop, scale, seed, stream):
+    """
+    Adds a column's counter-based noise to rows [start, stop) of the shared block in place.
+    """
+    noise = CounterNoiseSource(seed).laplace(column, start, stop - start, scale, stream)
+    _worker['block'][column_index, start:stop] += noise
+    return stop - start
+
+
+### ------------------------------ PARALLEL DP ------------------------------ ###
+def apply_differential_privacy_parallel(df, numeric_columns=["Speed", "Acceleration", "Latitude", "Longitude", "Time_Gap"], epsilon=5,
+                                        workers=None, rows_per_task=2_000_000, noise_source=None):
+    """
+    Applies Differential Privacy like apply_differential_privacy(), split across a process pool by column and row range.
+    The DP columns are copied once into a shared memory block that workers map instead of receiving pickled slices,
+    and the noised block is copied out once more before the shared memory is released;
+    sensitivities are computed one task per column and noise is added in place one task per (column, row range).
+    Noise is counter-based, so the output is bit-identical for any number of workers and to
+    apply_differential_privacy() with the same noise_source. Without a noise_source a fresh unsealed seed is used.
+    """
+    noise_source = noise_source if noise_source is not None else CounterNoiseSource(secrets.token_bytes(32))
+    workers = workers or os.cpu_count()
+    dp_columns = [column for column in numeric_columns if column in df.columns]
+    rows = len(df)
+
+    shape = (len(dp_columns), rows)
+    shm = shared_memory.SharedMemory(create=True, size=max(8 * shape[0] * shape[1], 1))
+    block = None
+    try:
+        block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        for i, column in enumerate(dp_columns):
+            block[i] = df[column].to_numpy(dtype=np.float64)
+
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes=workers, initializer=attach_block, initargs=(shm.name, shape)) as pool:
+            # Sensitivities, one task per column
+            sensitivities = pool.starmap(sensitivity_task, [(i, sensitivity_measure(column)) for i, column in enumerate(dp_columns)])
+
+            # Noise, one task per column and row range, written into the block in place
+            tasks = []
+            for i, column in enumerate(dp_columns):
+                column_epsilon = epsilon * EPSILON_WEIGHTS[column]
+                print(f"LOG: Sensitivity for {column}: {sensitivities[i]}")
+                print(f"LOG: Epsilon for {column}: {column_epsilon}")
+                print(f"LOG: Noise for {column}: {sensitivities[i] / column_epsilon}")
+                for start in range(0, rows, rows_per_task):
+                    tasks.append((i, column, start, min(start + rows_per_task, rows), laplace_scale(sensitivities[i], column_epsilon),
+                                  noise_source.seed, f"epsilon_{epsilon}"))
+            pool.starmap(noise_task, tasks)
+
+        # Copy the block out of shared memory in one go and attach its rows as the noised columns without further copies
+        # (pandas copies plain arrays on assignment, but not Series); the other columns are shared with df
+        values = block.copy()
+        df_dp = df.assign(**{column: pd.Series(values[i], index=df.index, copy=False) for i, column in enumerate(dp_columns)})
+    finally:
+        # The array must go before the mapping can be closed
+        block = None
+        shm.close()
+        shm.unlink()
+
+    print(f"LOG: Applied differential privacy to {rows} rows with {workers} workers in {len(tasks)} tasks")
+    return df_dp
@@ -0,0 +1,65 @@
+import numpy as np
+
+# Values kept for the quantile sample of a column (8 bytes each plus an 8-byte sampling key)
+DEFAULT_SAMPLE_SIZE = 2 ** 20
+
+
+class ColumnSketch:
+    """
+    Bounded-memory summary of a numeric column read in chunks, enough to compute every sensitivity measure:
+    exact minimum, maximum and largest difference between consecutive non-missing values, and a uniform
+    sample of at most sample_size values for the quantiles. Up to sample_size values the sample holds
+    the whole column, so the quantiles are exact.
+    """
+
+    def __init__(self, sample_size=DEFAULT_SAMPLE_SIZE, rng=None):
+        self.sample_size = sample_size
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.count = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.last = np.nan
+        self.max_diff = np.nan
+        self.sample = np.empty(0, dtype=np.float64)
+        self.keys = np.empty(0, dtype=np.float64)
+
+    def update(self, values):
+        """
+        Adds the next chunk of the column, in file order.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+
+        # Consecutive differences continue across chunk boundaries
+        diffs = np.abs(np.diff(values, prepend=self.last))
+        if not np.isnan(self.last) or len(values) > 1:
+            chunk_max_diff = np.nanmax(diffs)
+            self.max_diff = chunk_max_diff if np.isnan(self.max_diff) else max(self.max_diff, chunk_max_diff)
+        self.last = values[-1]
+
+        # Bottom-k sample: every value gets a random key and the values with the smallest keys are kept
+        self.keys = np.concatenate([self.keys, self.rng.random(len(values))])
+        self.sample = np.concatenate([self.sample, values])
+        if len(self.sample) > self.sample_size:
+            keep = np.argpartition(self.keys, self.sample_size)[:self.sample_size]
+            self.keys, self.sample = self.keys[keep], self.sample[keep]
+
+    def quantile(self, q):
+        return float(np.quantile(self.sample, q)) if self.count else np.nan
+
+    def sensitivity(self, measure):
+        """
+        Returns the column's sensitivity for a measure of sensitivity_measure().
+        """
+        if self.count == 0:
+            return np.nan
+        if measure == "continuous":
+            return self.max - self.min
+        if measure == "location":
+            return self.max_diff
+        return self.quantile(0.75) - self.quantile(0.25)
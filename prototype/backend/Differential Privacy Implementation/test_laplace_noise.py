@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from laplace_noise import new_noise_generator, laplace_scale, laplace_noise, add_laplace_noise_array
+from benchmark_laplace_noise import check_distribution
+
+SEED = 20250101
+SAMPLES = 200_000
+
+
+@pytest.mark.parametrize("sensitivity, epsilon", [(1.0, 1.0), (30.0, 1.5), (0.5, 10.0)])
+def test_noise_follows_laplace_distribution(sensitivity, epsilon):
+    """
+    A fixed-seed draw passes a Kolmogorov-Smirnov test against scipy's Laplace(0, sensitivity / epsilon).
+    """
+    stats = pytest.importorskip("scipy.stats")
+    scale = sensitivity / epsilon
+    noise = laplace_noise(SAMPLES, sensitivity, epsilon, rng=new_noise_generator(SEED))
+    assert stats.kstest(noise, stats.laplace(loc=0.0, scale=scale).cdf).pvalue > 0.01
+
+    # The wrong scale is rejected, so the test can tell distributions apart
+    assert stats.kstest(noise, stats.laplace(loc=0.0, scale=scale * 1.05).cdf).pvalue < 0.01
+
+
+def test_benchmark_distribution_checks_pass():
+    """
+    The mean, variance and KS checks run by benchmark_laplace_noise.py pass on a fixed-seed draw.
+    """
+    noise = laplace_noise(SAMPLES, 30.0, 1.5, rng=new_noise_generator(SEED))
+    for check, value, expected, passed in check_distribution(noise, 20.0):
+        assert passed, f"{check}: {value} (expected {expected})"
+
+
+def test_same_seed_gives_same_noise():
+    a = laplace_noise(1000, 1.0, 1.0, rng=new_noise_generator(SEED))
+    b = laplace_noise(1000, 1.0, 1.0, rng=new_noise_generator(SEED))
+    assert np.array_equal(a, b)
+
+
+def test_missing_values_stay_missing():
+    values = np.array([1.0, np.nan, 3.0])
+    noisy = add_laplace_noise_array(values, 1.0, 1.0, rng=new_noise_generator(SEED))
+    assert np.isnan(noisy[1]) and not np.isnan(noisy[[0, 2]]).any()
+    assert values[0] == 1.0
+
+
+@pytest.mark.parametrize("sensitivity, epsilon", [(1.0, 0.0), (1.0, -1.0), (-1.0, 1.0)])
+def test_invalid_parameters_are_rejected(sensitivity, epsilon):
+    with pytest.raises(ValueError):
+        laplace_scale(sensitivity, epsilon)
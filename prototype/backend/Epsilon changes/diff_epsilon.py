@@ -1,7 +1,11 @@
 import pandas as pd
 import os
-from pydp.algorithms.numerical_mechanisms import LaplaceMechanism
+import sys
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "Differential Privacy Implementation"))
+from laplace_noise import new_noise_generator, add_laplace_noise_array
 
 #Calculate continuous sensitivity for a given column
 def calculate_continous_sensitivity(df, column):
@@ -15,67 +19,92 @@ def calculate_percentile_sensitivity(df, column):
 def calculate_location_sensitivity(df, column):
     return df[column].dropna().diff().abs().max()
 
-#Add Laplace noise to a value based on sensitivity and epsilon
-def add_laplace_noise(value, sensitivity, epsilon):
-    laplace_mech = LaplaceMechanism(epsilon, sensitivity)
-    return laplace_mech.add_noise(value)
-
-#Apply differential privacy to specified numeric columns in the dataset
-def apply_differential_privacy(df, numeric_columns=["Speed", "Acceleration", "Latitude", "Longitude", "Time_Gap"], epsilon=5):
-    df_copy = df.copy()  
-
-    #Calculate and store sensitivities
+#Apply epsilon weight to each numeric column
+EPSILON_WEIGHTS = {
+    "Speed": 0.3,
+    "Acceleration": 0.4,
+    "Time_Gap": 0.2,
+    "Latitude": 0.05,
+    "Longitude": 0.05,
+}
+
+#Calculate and store sensitivities of the numeric columns present in the dataset
+def calculate_sensitivities(df, numeric_columns):
     sensitivities = {}
     for column in numeric_columns:
-        if column in df_copy.columns:
+        if column in df.columns:
             if column == "Speed" or column == "Acceleration":
-                sensitivities[column] = calculate_continous_sensitivity(df_copy, column)
-            elif column == "Latitude" or column == "Latitude":
-                sensitivities[column] = calculate_location_sensitivity(df_copy, column)
+                sensitivities[column] = calculate_continous_sensitivity(df, column)
+            elif column == "Latitude" or column == "Longitude":
+                sensitivities[column] = calculate_location_sensitivity(df, column)
             else:
-                sensitivities[column] = calculate_percentile_sensitivity(df_copy, column)
+                sensitivities[column] = calculate_percentile_sensitivity(df, column)
             print(f"Sensitivity for {column}: {sensitivities[column]}")
-    
-    #Apply epsilon weight to each numeric column
-    epsilon_weights = {
-        "Speed": 0.3,
-        "Acceleration": 0.4,
-        "Time_Gap": 0.2,
-        "Latitude": 0.05,
-        "Longitude": 0.05,
-    }
+    return sensitivities
+
+#Print the epsilon and noise scale of every column
+def print_noise(sensitivities, epsilon):
+    for column, sensitivity in sensitivities.items():
+        column_epsilon = epsilon * EPSILON_WEIGHTS[column]
+        print(f"Epsilon for {column}: {column_epsilon}")
+        print(f"Noise for {column}: {sensitivity / column_epsilon}")
+
+#Draw the noisy values of every column with a sensitivity, missing values stay missing
+def noisy_columns(df, sensitivities, epsilon, rng):
+    return {column: add_laplace_noise_array(df[column], sensitivity, epsilon * EPSILON_WEIGHTS[column], rng)
+            for column, sensitivity in sensitivities.items()}
+
+#Apply differential privacy to specified numeric columns in the dataset
+def apply_differential_privacy(df, numeric_columns=["Speed", "Acceleration", "Latitude", "Longitude", "Time_Gap"], epsilon=5, rng=None):
+    df_copy = df.copy()  
+    rng = rng if rng is not None else new_noise_generator()
+
+    sensitivities = calculate_sensitivities(df_copy, numeric_columns)
+    print_noise(sensitivities, epsilon)
 
     #Apply Laplace noise to each numeric column
-    for column in numeric_columns:
-        if column in df_copy.columns:
-            column_sensitivity = sensitivities[column]
-            column_epsilon = epsilon * epsilon_weights[column]
-
-            noise = column_sensitivity / column_epsilon
-
-            print(f"Epsilon for {column}: {column_epsilon}")
-            print(f"Noise for {column}: {noise}")
-            
-            df_copy[column] = df_copy[column].apply(
-                lambda x: add_laplace_noise(x, column_sensitivity, column_epsilon) if pd.notnull(x) else x
-            )
+    for column, values in noisy_columns(df_copy, sensitivities, epsilon, rng).items():
+        df_copy[column] = values
     
     return df_copy
 
-def apply_multiple_epsilons(dataset, epsilon_values):
+#Apply DP for every epsilon in one pass: sensitivities are computed once, then each chunk of rows is noised
+#for all epsilons and handed to that epsilon's writer thread, so the outputs are written concurrently
+def apply_multiple_epsilons(dataset, epsilon_values, numeric_columns=["Speed", "Acceleration", "Latitude", "Longitude", "Time_Gap"],
+                            chunksize=250_000, output_dir="."):
+    rng = new_noise_generator()
+    sensitivities = calculate_sensitivities(dataset, numeric_columns)
+    output_file_paths = {epsilon: os.path.join(output_dir, f"dp_vehicle_data_epsilon_{epsilon}.csv") for epsilon in epsilon_values}
     for epsilon in epsilon_values:
-        #Apply DP for each epsilon
-        df_dp = apply_differential_privacy(dataset, epsilon=epsilon)
-
-        #Save the output for each epsilon value
-        output_file_path = f"dp_vehicle_data_epsilon_{epsilon}.csv"
-        df_dp.to_csv(output_file_path, index=False)
+        print_noise(sensitivities, epsilon)
+
+    #One single-thread writer per epsilon keeps its chunks in order
+    writers = {epsilon: ThreadPoolExecutor(max_workers=1) for epsilon in epsilon_values}
+    pending = {epsilon: None for epsilon in epsilon_values}
+    try:
+        for start in range(0, max(len(dataset), 1), chunksize):
+            chunk = dataset.iloc[start:start + chunksize]
+            for epsilon in epsilon_values:
+                chunk_dp = chunk.assign(**noisy_columns(chunk, sensitivities, epsilon, rng))
+                #Wait for this epsilon's previous chunk so at most one chunk per output is queued
+                if pending[epsilon] is not None:
+                    pending[epsilon].result()
+                pending[epsilon] = writers[epsilon].submit(chunk_dp.to_csv, output_file_paths[epsilon], index=False,
+                                                           mode='w' if start == 0 else 'a', header=start == 0)
+        for epsilon in epsilon_values:
+            pending[epsilon].result()
+    finally:
+        for writer in writers.values():
+            writer.shutdown()
+
+    for epsilon, output_file_path in output_file_paths.items():
         print(f"Differentially private dataset with epsilon {epsilon} saved as {output_file_path}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Apply Differential Privacy to vehicle data.")
     parser.add_argument("--dataset", type=str, required=True, help="Full path to dataset file (e.g., /path/to/vehicle_data.csv)")
     parser.add_argument("--epsilon_values", type=str, default="0.01,0.1,0.5,1.0,2.0,5.0", help="Comma-separated list of epsilon values to use (e.g., 0.01,0.1,1.0,5.0)")
+    parser.add_argument("--chunksize", type=int, default=250_000, help="Rows noised and written per chunk for all epsilons")
 
     args = parser.parse_args()
 
@@ -89,4 +118,4 @@ if __name__ == "__main__":
     df['Collision'] = df['Collision'].astype('boolean').fillna(False).astype(int)
 
     #Apply Differential Privacy for each epsilon value
-    apply_multiple_epsilons(df, epsilon_values)
+    apply_multiple_epsilons(df, epsilon_values, chunksize=args.chunksize)
@@ -48,6 +48,8 @@ def calculate_risk(df):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Calculate risk scores from vehicle data.")
     parser.add_argument("--dataset", type=str, required=True, help="Full path of dataset file (e.g., /path/to/vehicle_data.csv)")
+    parser.add_argument("--features", action="store_true", help="Dataset is a per-vehicle risk feature summary (*_risk_features.csv) written during simulation")
+    parser.add_argument("--lane_table", type=str, default=None, help="Optional lane table CSV to join speed limits and road types from")
 
     args = parser.parse_args()
 
@@ -60,7 +62,10 @@ if __name__ == "__main__":
     # Load the dataset
     #df = pd.read_csv(dataset_path)
     #input_file = "/Users/saimanish/SeniorDesign/SDP/prototype/backend/SUMO/results/vehicle_data.csv"
-    df = process_sumo_data(dataset_path)
+    if args.features:
+        df = pd.read_csv(dataset_path)
+    else:
+        df = process_sumo_data(dataset_path, lane_table=args.lane_table)
 
     road_risk_scores = calculate_risk(df)
     # risk_score = road_risk_scores["Avg_Risk_Score"][0]
@@ -6,6 +6,17 @@ def load_data(file_path):
     """Loads the SUMO CSV data into a DataFrame."""
     return pd.read_csv(file_path)
 
+def join_lane_attributes(df, lane_table):
+    """
+    Adds static lane attributes (speed limit, edge, lane index, road type) by joining on the Lane column.
+    lane_table is a lane table DataFrame or the path of one exported by SUMO/scripts/network_index.py.
+    Columns the data already has (e.g. a recorded Speed_Limit) are kept as they are.
+    """
+    if isinstance(lane_table, str):
+        lane_table = pd.read_csv(lane_table)
+    columns = ['Lane'] + [c for c in lane_table.columns if c not in df.columns]
+    return df.merge(lane_table[columns], on='Lane', how='left')
+
 # ------------------ Feature Detection Functions ------------------
 
 def detect_speeding(df):
@@ -60,13 +71,16 @@ def detect_collisions(df):
 
 # ------------------ Main Processing Function ------------------
 
-def process_sumo_data(file_path):
+def process_sumo_data(file_path, lane_table=None):
     """
     Main function to load SUMO driving data and compute various aggressive driving metrics.
     Returns a DataFrame where each row summarizes a vehicle’s behavior.
+    If a lane table is given, lane attributes missing from the data are joined from it.
     """
     # Load raw SUMO CSV data
     df = load_data(file_path)
+    if lane_table is not None:
+        df = join_lane_attributes(df, lane_table)
     
     # Precompute behavior flags
     df['SpeedingViolation'] = df['Speed'] > df['Speed_Limit']
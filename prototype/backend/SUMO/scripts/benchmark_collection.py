@@ -0,0 +1,59 @@
+import os
+import time
+import filecmp
+import argparse
+import tempfile
+from sumo_extract import simulate_and_extract_metrics, find_chunk_files, COLLECTION_MODES
+
+### ------------------------------ BENCHMARK ------------------------------ ###
+def run_collection_mode(sumocfg_path, net_path, output_dir, collection_mode, simulation_time, save_interval):
+    """
+    Runs a static extraction with the given collection mode and returns the elapsed time and chunk files.
+    """
+    output_path = os.path.join(output_dir, collection_mode, "vehicle_data.csv")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    start = time.perf_counter()
+    simulate_and_extract_metrics(sumocfg_path, net_path, output_path, simulation_time=simulation_time,
+                                 save_interval=save_interval, state_file="None", collection_mode=collection_mode)
+    elapsed = time.perf_counter() - start
+
+    return elapsed, find_chunk_files(output_path)
+
+
+def compare_outputs(baseline_files, candidate_files):
+    """
+    Checks that two runs produced byte-identical chunk files.
+    """
+    if len(baseline_files) != len(candidate_files):
+        return False
+    return all(filecmp.cmp(a, b, shallow=False) for a, b in zip(baseline_files, candidate_files))
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare TraCI polling and subscription metric collection.")
+    parser.add_argument("--map", type=str, default="medium_map", help="Map config directory to simulate.")
+    parser.add_argument("--simulation_time", type=int, default=600, help="Number of simulated seconds per run.")
+    parser.add_argument("--save_interval", type=int, default=200, help="Steps between chunk writes.")
+
+    args = parser.parse_args()
+
+    curr_dir_path = os.path.dirname(os.path.realpath(__file__))
+    configs_dir_path = os.path.join(curr_dir_path, "..", "configs", args.map)
+    sumocfg_path = os.path.join(configs_dir_path, "osm.sumocfg")
+    net_path = os.path.join(configs_dir_path, "osm.net.xml.gz")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = {}
+        for collection_mode in COLLECTION_MODES:
+            print(f"LOG: Running {collection_mode} collection for {args.simulation_time} seconds...")
+            results[collection_mode] = run_collection_mode(sumocfg_path, net_path, output_dir, collection_mode,
+                                                           args.simulation_time, args.save_interval)
+
+        baseline_time, baseline_files = results["poll"]
+        for collection_mode, (elapsed, chunk_files) in results.items():
+            print(f"{collection_mode:>10}: {elapsed:8.2f}s ({baseline_time / elapsed:5.2f}x vs poll)")
+
+        identical = compare_outputs(baseline_files, results["subscribe"][1])
+        print(f"Byte-identical output: {identical}")
@@ -0,0 +1,66 @@
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+from sumo_extract import start_sumo, extract_metrics, find_chunk_files, SUMO_INTERFACES, COLLECTION_MODES
+
+### ------------------------------ BENCHMARK ------------------------------ ###
+def run_interface(interface, sumocfg_path, net_path, output_dir, simulation_time, save_interval, collection_mode):
+    """
+    Runs the static extraction loop on one SUMO interface.
+    Returns the startup time, loop time and number of rows written.
+    """
+    output_path = os.path.join(output_dir, interface, "vehicle_data.csv")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    start = time.perf_counter()
+    sumo = start_sumo(sumocfg_path, interface=interface)
+    startup = time.perf_counter() - start
+    try:
+        start = time.perf_counter()
+        extract_metrics(net_path, output_path, simulation_time=simulation_time, save_interval=save_interval,
+                        collection_mode=collection_mode)
+        elapsed = time.perf_counter() - start
+    finally:
+        sumo.close()
+
+    rows = 0
+    for chunk_file in find_chunk_files(output_path):
+        with open(chunk_file, 'rb') as f:
+            rows += sum(1 for _ in f)
+    # The first chunk has a header row
+    return startup, elapsed, rows - 1
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare extraction loop throughput on libsumo and TraCI.")
+    parser.add_argument("--map", type=str, default="medium_map", help="Map config directory to simulate.")
+    parser.add_argument("--simulation_time", type=int, default=600, help="Number of simulated seconds per run.")
+    parser.add_argument("--save_interval", type=int, default=200, help="Steps between chunk writes.")
+    parser.add_argument("--collection_mode", type=str, default="subscribe", choices=COLLECTION_MODES, help="How vehicle metrics are fetched.")
+
+    args = parser.parse_args()
+
+    curr_dir_path = os.path.dirname(os.path.realpath(__file__))
+    configs_dir_path = os.path.join(curr_dir_path, "..", "configs", args.map)
+    sumocfg_path = os.path.join(configs_dir_path, "osm.sumocfg")
+    net_path = os.path.join(configs_dir_path, "osm.net.xml.gz")
+
+    # Each interface runs in a fresh process so libsumo's in-process simulation never shares state with TraCI
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = {}
+        for interface in SUMO_INTERFACES:
+            print(f"LOG: Running {args.collection_mode} collection on {interface} for {args.simulation_time} seconds...")
+            with context.Pool(processes=1) as pool:
+                results[interface] = pool.apply(run_interface, (interface, sumocfg_path, net_path, output_dir,
+                                                                args.simulation_time, args.save_interval,
+                                                                args.collection_mode))
+
+        baseline_elapsed = results["traci"][1]
+        for interface, (startup, elapsed, rows) in results.items():
+            print(f"{interface:>8}: startup {startup:6.2f}s, loop {elapsed:8.2f}s, "
+                  f"{args.simulation_time / elapsed:8.1f} steps/s, {rows / elapsed:10,.0f} rows/s "
+                  f"({baseline_elapsed / elapsed:5.2f}x vs traci)")
@@ -0,0 +1,115 @@
+import os
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+import pandas as pd
+import numpy as np
+from vehicle_recorder import ColumnarRecorder, VEHICLE_DATA_COLUMNS
+
+### ------------------------------ SYNTHETIC STEPS ------------------------------ ###
+def generate_steps(num_steps, num_vehicles, num_lanes=2000, seed=0):
+    """
+    Generates per-step vehicle samples shaped like the extraction loop's output.
+    """
+    rng = random.Random(seed)
+    vehicle_ids = [f"veh{i}" for i in range(num_vehicles)]
+    lane_ids = [f"{rng.randint(100000, 999999)}#{rng.randint(0, 9)}_{rng.randint(0, 2)}" for _ in range(num_lanes)]
+
+    for step in range(num_steps):
+        step_metrics = []
+        for _ in vehicle_ids:
+            speed = rng.uniform(0, 30)
+            headway = rng.uniform(1, 100) if rng.random() < 0.7 else None
+            time_gap = headway / speed if headway is not None and speed > 0 else None
+            step_metrics.append((speed, rng.uniform(-4, 4), rng.choice(lane_ids), headway, time_gap, 13.89))
+        lats = np.random.default_rng(step).uniform(41.7, 41.8, num_vehicles)
+        lons = np.random.default_rng(step + 1).uniform(-72.3, -72.2, num_vehicles)
+        yield float(step + 1), vehicle_ids, step_metrics, lats, lons
+
+
+### ------------------------------ BUFFERS ------------------------------ ###
+def run_dict_buffer(steps, output_dir, save_interval):
+    """
+    Buffers rows as one dict per sample and builds a DataFrame per chunk (previous extraction loop).
+    """
+    data_rows = []
+    chunk_counter = 0
+    for step, (current_time, vehicle_ids, step_metrics, lats, lons) in enumerate(steps):
+        for vehicle_id, metrics, lat, lon in zip(vehicle_ids, step_metrics, lats.tolist(), lons.tolist()):
+            speed, acceleration, lane_id, headway_distance, time_gap, speed_limit = metrics
+            data_rows.append({
+                'Time': current_time,
+                'Vehicle_ID': vehicle_id,
+                'Speed': speed,
+                'Acceleration': acceleration,
+                'Latitude': lat,
+                'Longitude': lon,
+                'Lane': lane_id,
+                'Headway_Distance': headway_distance,
+                'Time_Gap': time_gap,
+                'Speed_Limit': speed_limit,
+                'Lane_Change': False,
+                'Lane_Change_Reason': 'None',
+                'Collision': False
+            })
+        if step % save_interval == 0 and step != 0:
+            chunk_counter += 1
+            pd.DataFrame(data_rows).to_csv(os.path.join(output_dir, f"dict_chunk_{chunk_counter}.csv"), index=False)
+            data_rows.clear()
+    return chunk_counter
+
+
+def run_columnar_buffer(steps, output_dir, save_interval):
+    """
+    Buffers samples in the columnar recorder and flushes it per chunk.
+    """
+    recorder = ColumnarRecorder()
+    chunk_counter = 0
+    for step, (current_time, vehicle_ids, step_metrics, lats, lons) in enumerate(steps):
+        recorder.append_step(current_time, vehicle_ids, step_metrics, lats, lons)
+        if step % save_interval == 0 and step != 0:
+            chunk_counter += 1
+            recorder.write_csv(os.path.join(output_dir, f"columnar_chunk_{chunk_counter}.csv"))
+    return chunk_counter
+
+
+def measure(buffer_function, args, output_dir):
+    """
+    Returns the elapsed time and peak traced memory of a buffer run.
+    Timing and memory tracing use separate runs since tracemalloc slows allocation down.
+    """
+    steps = list(generate_steps(args.steps, args.vehicles))
+    start = time.perf_counter()
+    buffer_function(steps, output_dir, args.save_interval)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    buffer_function(steps, output_dir, args.save_interval)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare list-of-dicts and columnar step buffers.")
+    parser.add_argument("--steps", type=int, default=400, help="Number of simulated steps.")
+    parser.add_argument("--vehicles", type=int, default=2000, help="Active vehicles per step.")
+    parser.add_argument("--save_interval", type=int, default=200, help="Steps between chunk writes.")
+
+    args = parser.parse_args()
+    rows = args.steps * args.vehicles
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name, buffer_function in (("dict rows", run_dict_buffer), ("columnar", run_columnar_buffer)):
+            elapsed, peak = measure(buffer_function, args, output_dir)
+            print(f"{name:>10}: {elapsed:7.2f}s, {rows / elapsed:12,.0f} rows/s, peak buffer memory {peak / 2**20:8.1f} MiB")
+
+        # Both buffers must write the same rows (float32 columns agree to float32 precision)
+        dict_chunk = pd.read_csv(os.path.join(output_dir, "dict_chunk_1.csv"))
+        columnar_chunk = pd.read_csv(os.path.join(output_dir, "columnar_chunk_1.csv"))
+        assert list(columnar_chunk.columns) == VEHICLE_DATA_COLUMNS
+        pd.testing.assert_frame_equal(dict_chunk, columnar_chunk, check_exact=False, rtol=1e-6)
+        print("Chunk contents match.")
@@ -0,0 +1,64 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from trajectory_store import write_trajectories, read_trajectories, DEFAULT_ERROR_BOUNDS
+
+### ------------------------------ BENCHMARK ------------------------------ ###
+def max_errors(original, decoded, error_bounds):
+    """
+    Returns the largest absolute error per bounded column, after aligning rows by vehicle and time.
+    """
+    original = original.sort_values(['Vehicle_ID', 'Time'], kind='stable').reset_index(drop=True)
+    decoded = decoded.sort_values(['Vehicle_ID', 'Time'], kind='stable').reset_index(drop=True)
+    errors = {}
+    for column in error_bounds:
+        if column in original.columns:
+            errors[column] = float(np.nanmax(np.abs(original[column].to_numpy(dtype=np.float64) -
+                                                    decoded[column].to_numpy(dtype=np.float64)), initial=0.0))
+    return errors
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the trajectory store with CSV on size and read throughput.")
+    parser.add_argument("--dataset", type=str, default=None, help="Vehicle data CSV (default: SUMO/results/vehicle_data.csv).")
+    parser.add_argument("--error_bounds", type=str, default="None", help="Per-column error bounds as JSON, e.g. '{\"Speed\": 0.05}'.")
+
+    args = parser.parse_args()
+
+    curr_dir_path = os.path.dirname(os.path.realpath(__file__))
+    dataset_path = args.dataset or os.path.join(curr_dir_path, "..", "results", "vehicle_data.csv")
+    error_bounds = dict(DEFAULT_ERROR_BOUNDS)
+    if args.error_bounds != "None":
+        error_bounds.update(json.loads(args.error_bounds))
+
+    start = time.perf_counter()
+    df = pd.read_csv(dataset_path)
+    csv_read_time = time.perf_counter() - start
+    rows = len(df)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        store_path = os.path.join(output_dir, "vehicle_data.traj.npz")
+        start = time.perf_counter()
+        metadata = write_trajectories(df, store_path, error_bounds=error_bounds)
+        encode_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        decoded = read_trajectories(store_path)
+        decode_time = time.perf_counter() - start
+
+        csv_size, store_size = os.path.getsize(dataset_path), os.path.getsize(store_path)
+
+    print(f"Rows: {rows:,} ({metadata['kept_rows']:,} stored, {1 - metadata['kept_rows'] / rows:.1%} interpolated)")
+    print(f"Size: CSV {csv_size / 2**20:,.1f} MiB, store {store_size / 2**20:,.1f} MiB ({csv_size / store_size:.1f}x smaller)")
+    print(f"Encode: {encode_time:.2f}s ({rows / encode_time:,.0f} rows/s)")
+    print(f"Read: CSV {csv_read_time:.2f}s ({rows / csv_read_time:,.0f} rows/s), "
+          f"store {decode_time:.2f}s ({rows / decode_time:,.0f} rows/s, {csv_read_time / decode_time:.1f}x)")
+
+    for column, error in max_errors(df, decoded, error_bounds).items():
+        status = "ok" if error <= error_bounds[column] + 1e-12 else "EXCEEDED"
+        print(f"{column:>18}: max error {error:.3g} (bound {error_bounds[column]:g}) {status}")
@@ -0,0 +1,156 @@
+import os
+import glob
+import json
+import time
+import shutil
+import argparse
+import functools
+import itertools
+import multiprocessing
+import pandas as pd
+from sumo_extract import start_sumo, extract_metrics, merge_chunks_and_save, COLLECTION_MODES, SUMO_INTERFACES, DEFAULT_SUMO_INTERFACE
+from simulation_server import get_map_paths, get_results_dir_path
+
+MANIFEST_FILE = "ensemble.json"
+
+
+### ------------------------------ FILE MANAGEMENT ------------------------------ ###
+def get_ensemble_dir(ensemble_name):
+    """
+    Returns the output directory of an ensemble (SUMO/results/ensemble/<ensemble_name>/).
+    """
+    return os.path.join(get_results_dir_path(), "ensemble", ensemble_name)
+
+
+def get_partition_path(ensemble_dir, run_id):
+    """
+    Returns the vehicle data file of one run in the partitioned dataset (vehicle_data/Run_ID=<run_id>/).
+    """
+    return os.path.join(ensemble_dir, "vehicle_data", f"Run_ID={run_id}", "vehicle_data.csv")
+
+
+def save_manifest(ensemble_dir, manifest):
+    """
+    Writes the ensemble manifest atomically.
+    """
+    manifest_path = os.path.join(ensemble_dir, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def build_runs(maps, seeds, scales):
+    """
+    Returns one run per (map, seed, demand scale) combination with a stable run ID.
+    """
+    return [{"run_id": f"{map_name}_s{seed}_x{scale:g}", "map": map_name, "seed": seed, "scale": scale}
+            for map_name, seed, scale in itertools.product(maps, seeds, scales)]
+
+
+### ------------------------------ ENSEMBLE MEMBERS ------------------------------ ###
+def run_member(run, ensemble_dir, simulation_time, save_interval, collection_mode, interface=DEFAULT_SUMO_INTERFACE, keep_work_files=False):
+    """
+    Runs one isolated SUMO instance and writes its output into the run's partition.
+    Chunk files are written to a private work directory so runs never share paths.
+    """
+    start = time.perf_counter()
+    sumocfg_path, net_path = get_map_paths(run["map"])
+    work_dir = os.path.join(ensemble_dir, "runs", run["run_id"])
+    os.makedirs(work_dir, exist_ok=True)
+
+    output_path = os.path.join(work_dir, "vehicle_data.csv")
+    partition_path = get_partition_path(ensemble_dir, run["run_id"])
+    os.makedirs(os.path.dirname(partition_path), exist_ok=True)
+
+    result = dict(run)
+    try:
+        # One thread per instance: the pool spreads independent runs over the cores instead
+        sumo = start_sumo(sumocfg_path, threads=1, interface=interface,
+                          extra_args=["--seed", str(run["seed"]), "--scale", str(run["scale"])])
+        try:
+            extract_metrics(net_path, output_path, simulation_time=simulation_time, save_interval=save_interval,
+                            collection_mode=collection_mode)
+        finally:
+            sumo.close()
+
+        result["rows"] = merge_chunks_and_save(output_path, run_id=run["run_id"], merged_path=partition_path)
+        result["status"] = "done"
+    except Exception as e:
+        print(f"LOG: !ERROR! Run {run['run_id']} failed: {e}")
+        result["status"] = "failed"
+        result["error"] = str(e)
+
+    if not keep_work_files:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    result["elapsed"] = round(time.perf_counter() - start, 2)
+    print(f"LOG: Run {run['run_id']} {result['status']} in {result['elapsed']}s.")
+    return result
+
+
+def run_ensemble(runs, ensemble_dir, processes=None, simulation_time=2100, save_interval=200,
+                 collection_mode="subscribe", interface=DEFAULT_SUMO_INTERFACE, keep_work_files=False):
+    """
+    Runs every ensemble member in a process pool and records the outcome of each run in the manifest.
+    """
+    os.makedirs(ensemble_dir, exist_ok=True)
+    processes = processes or min(len(runs), os.cpu_count() or 1)
+    manifest = {"simulation_time": simulation_time, "collection_mode": collection_mode, "interface": interface, "runs": []}
+
+    member = functools.partial(run_member, ensemble_dir=ensemble_dir, simulation_time=simulation_time,
+                               save_interval=save_interval, collection_mode=collection_mode,
+                               interface=interface, keep_work_files=keep_work_files)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(processes=processes) as pool:
+        for result in pool.imap_unordered(member, runs):
+            manifest["runs"].append(result)
+            # Rewritten after every run so an interrupted ensemble still lists its finished runs
+            save_manifest(ensemble_dir, manifest)
+
+    manifest["runs"].sort(key=lambda r: r["run_id"])
+    save_manifest(ensemble_dir, manifest)
+    return manifest
+
+
+### ------------------------------ DATASET ------------------------------ ###
+def load_ensemble(ensemble_dir, run_ids=None):
+    """
+    Reads the partitioned vehicle data of an ensemble, optionally only the given runs.
+    """
+    partition_paths = sorted(glob.glob(get_partition_path(ensemble_dir, "*")))
+    if run_ids is not None:
+        partition_paths = [p for p in partition_paths
+                           if os.path.basename(os.path.dirname(p)).split("=", 1)[1] in set(run_ids)]
+    if not partition_paths:
+        return pd.DataFrame()
+    return pd.concat((pd.read_csv(p) for p in partition_paths), ignore_index=True)
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run independent SUMO simulations in parallel and merge them into one dataset.")
+    parser.add_argument("--name", type=str, default="default", help="Ensemble name (output directory in results/ensemble/).")
+    parser.add_argument("--maps", type=str, nargs="+", default=["medium_map"], help="Map config directories to simulate.")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[42], help="SUMO random seeds.")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1.0], help="Demand scale factors.")
+    parser.add_argument("--processes", type=int, default=None, help="Number of parallel SUMO instances (default: CPU count).")
+    parser.add_argument("--simulation_time", type=int, default=2100, help="Number of simulated seconds per run.")
+    parser.add_argument("--save_interval", type=int, default=200, help="Steps between chunk writes.")
+    parser.add_argument("--collection_mode", type=str, default="subscribe", choices=COLLECTION_MODES, help="How vehicle metrics are fetched from TraCI.")
+    parser.add_argument("--sumo_interface", type=str, default=DEFAULT_SUMO_INTERFACE, choices=SUMO_INTERFACES, help="Run SUMO in-process (libsumo) or over a TraCI socket.")
+    parser.add_argument("--keep_work_files", action="store_true", help="Keep per-run chunk and XML output files.")
+
+    args = parser.parse_args()
+
+    runs = build_runs(args.maps, args.seeds, args.scales)
+    ensemble_dir = get_ensemble_dir(args.name)
+    print(f"LOG: Running {len(runs)} simulations into {ensemble_dir}...")
+
+    start = time.perf_counter()
+    manifest = run_ensemble(runs, ensemble_dir, processes=args.processes, simulation_time=args.simulation_time,
+                            save_interval=args.save_interval, collection_mode=args.collection_mode,
+                            interface=args.sumo_interface, keep_work_files=args.keep_work_files)
+
+    for result in manifest["runs"]:
+        print(f"{result['run_id']:>30}: {result['status']:>6} {result.get('rows', 0):>10} rows {result['elapsed']:8.2f}s")
+    print(f"Total: {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,280 @@
+import xml.etree.ElementTree as ET
+import gzip
+import os
+import subprocess
+import array
+import numpy as np
+import pandas as pd
+from network_index import load_network_index
+from vehicle_recorder import ColumnarRecorder
+
+# Leader look-ahead (meters) for FCD leader attributes.
+# vehicle.getLeader with its default dist=0 searches 100 m ahead, so FCD leaders use the same distance.
+DEFAULT_LEADER_DISTANCE = 100.0
+
+# Decimals SUMO writes for FCD values; its default of 2 truncates speeds, accelerations and gaps
+FCD_PRECISION = 6
+FCD_GEO_PRECISION = 9
+
+# SUMO's default minGap, used for vehicle types that do not set one
+DEFAULT_MIN_GAP = 2.5
+
+
+### ------------------------------ SIMULATION ------------------------------ ###
+def run_fcd_simulation(sumo_cfg, fcd_path, lanechange_path, collision_path, simulation_time, leader_distance=DEFAULT_LEADER_DISTANCE):
+    """
+    Runs SUMO headless with floating-car data output enabled.
+    Positions are written as lon/lat by SUMO itself, together with acceleration and leader gap.
+    Lane changes and collisions go to per-run output files, since FCD does not carry them.
+    """
+    command = ["sumo", "-c", sumo_cfg,
+               "--end", str(simulation_time),
+               "--fcd-output", fcd_path,
+               "--fcd-output.geo", "true",
+               "--fcd-output.acceleration", "true",
+               "--fcd-output.max-leader-distance", str(leader_distance),
+               "--precision", str(FCD_PRECISION),
+               "--precision.geo", str(FCD_GEO_PRECISION),
+               "--lanechange-output", lanechange_path,
+               "--collision-output", collision_path]
+    print(f"LOG: Running command: {' '.join(command)}")
+    subprocess.run(command, check=True)
+
+
+def get_config_value(sumo_cfg, option):
+    """
+    Returns an option's value from a .sumocfg file, or None if it is not set.
+    """
+    for element in ET.parse(sumo_cfg).getroot().iter(option):
+        return element.get("value")
+    return None
+
+
+def get_step_length(sumo_cfg):
+    """
+    Returns the simulation step length (seconds) set in a .sumocfg file, 1 by default.
+    """
+    step_length = get_config_value(sumo_cfg, "step-length")
+    return float(step_length) if step_length is not None else 1.0
+
+
+def load_min_gaps(sumo_cfg):
+    """
+    Returns {vehicle type: minGap} for the vehicle types defined in a config's route and additional files.
+    Types without a minGap, and types not listed, use SUMO's default.
+    """
+    config_dir = os.path.dirname(os.path.abspath(sumo_cfg))
+    min_gaps = {}
+    for option in ("route-files", "additional-files"):
+        files = get_config_value(sumo_cfg, option)
+        for file_name in (files.split(",") if files else []):
+            path = os.path.join(config_dir, file_name.strip())
+            if not os.path.exists(path):
+                continue
+            for vehicle_type in iter_output_elements(path, "vType"):
+                min_gaps[vehicle_type.get("id")] = float(vehicle_type.get("minGap", DEFAULT_MIN_GAP))
+    return min_gaps
+
+
+### ------------------------------ EVENT OUTPUTS ------------------------------ ###
+def open_sumo_output(output_file):
+    """
+    Opens a SUMO XML output file for streaming, accepting both .xml and .xml.gz.
+    If the plain file does not exist but a compressed one does, the compressed one is used.
+    """
+    if not os.path.exists(output_file) and os.path.exists(output_file + '.gz'):
+        output_file = output_file + '.gz'
+    if output_file.endswith('.gz'):
+        return gzip.open(output_file, 'rb')
+    return open(output_file, 'rb')
+
+
+def iter_output_elements(output_file, tag):
+    """
+    Streams the elements with the given tag from a SUMO XML output file in constant memory.
+    Each element is cleared from the tree once the caller has read it.
+    """
+    with open_sumo_output(output_file) as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event == 'end' and elem.tag == tag:
+                yield elem
+                root.clear()
+
+
+def extract_lane_change_data(lane_change_file):
+    """
+    Extracts lane change data from a SUMO lane change output file.
+    """
+    # Stream the XML file into typed columns
+    times = array.array('d')
+    vehicle_ids, from_lanes, to_lanes, reasons = [], [], [], []
+    for lane_change in iter_output_elements(lane_change_file, "change"):
+        times.append(float(lane_change.get("time")))
+        vehicle_ids.append(lane_change.get("id"))
+        from_lanes.append(lane_change.get("from"))
+        to_lanes.append(lane_change.get("to"))
+        reasons.append(lane_change.get("reason", "unknown"))
+
+    return pd.DataFrame({
+        'Time': np.frombuffer(times, dtype=np.float64),
+        'Vehicle_ID': vehicle_ids,
+        'Lane_Change': np.ones(len(times), dtype=bool),
+        'From_Lane': from_lanes,
+        'To_Lane': to_lanes,
+        'Lane_Change_Reason': reasons
+    })
+
+
+def extract_collision_data(collision_file):
+    """
+    Extracts collision data from a SUMO collision output file.
+    Each collision yields one row for the collider and one for the victim.
+    """
+    # Stream the XML file into typed columns
+    times = array.array('d')
+    vehicle_ids = []
+    for collision in iter_output_elements(collision_file, "collision"):
+        time = float(collision.get("time"))
+        times.append(time)
+        times.append(time)
+        vehicle_ids.append(collision.get("collider"))
+        vehicle_ids.append(collision.get("victim"))
+
+    return pd.DataFrame({
+        'Time': np.frombuffer(times, dtype=np.float64),
+        'Vehicle_ID': vehicle_ids,
+        'Collision': np.ones(len(times), dtype=bool)
+    })
+
+
+def index_step_events(lanechange_path, collision_path):
+    """
+    Groups lane change reasons ({time: {vehicle: reason}}) and collided vehicles ({time: {vehicle}}) by step,
+    so event columns are filled while the FCD steps are recorded. The first lane change of a vehicle in a step wins.
+    """
+    lane_changes, collisions = {}, {}
+    lane_change_data = extract_lane_change_data(lanechange_path)
+    for time, vehicle_id, reason in zip(lane_change_data['Time'].tolist(), lane_change_data['Vehicle_ID'],
+                                        lane_change_data['Lane_Change_Reason']):
+        lane_changes.setdefault(time, {}).setdefault(vehicle_id, reason)
+    collision_data = extract_collision_data(collision_path)
+    for time, vehicle_id in zip(collision_data['Time'].tolist(), collision_data['Vehicle_ID']):
+        collisions.setdefault(time, set()).add(vehicle_id)
+    return lane_changes, collisions
+
+
+def step_event_columns(vehicle_ids, step_lane_changes, step_collisions):
+    """
+    Returns the (lane_changes, reasons, collisions) columns of a step for ColumnarRecorder.append_step.
+    """
+    reasons = [step_lane_changes.get(vehicle_id, "None") for vehicle_id in vehicle_ids]
+    lane_changes = np.array([vehicle_id in step_lane_changes for vehicle_id in vehicle_ids], dtype=bool)
+    collisions = np.array([vehicle_id in step_collisions for vehicle_id in vehicle_ids], dtype=bool)
+    return lane_changes, reasons, collisions
+
+
+### ------------------------------ FCD PARSING ------------------------------ ###
+def iter_fcd_timesteps(fcd_path, step_length=1.0, min_gaps=None):
+    """
+    Streams an FCD output file (.xml or .xml.gz) one <timestep> at a time.
+    Yields (time, vehicle_ids, step_metrics, lats, lons) in the shape ColumnarRecorder.append_step expects.
+    SUMO stamps FCD with the time the step started, while TraCI reads the same state after the step,
+    so step_length is added to match the Time of the TraCI loop.
+    FCD's leaderGap includes the follower's minGap (min_gaps, by vehicle type), which getLeader does not.
+    """
+    min_gaps = min_gaps or {}
+    opener = gzip.open if fcd_path.endswith('.gz') else open
+    with opener(fcd_path, 'rb') as f:
+        context = ET.iterparse(f, events=('start', 'end'))
+        _, root = next(context)
+        for event, elem in context:
+            if event != 'end' or elem.tag != 'timestep':
+                continue
+
+            vehicle_ids, step_metrics, lats, lons = [], [], [], []
+            for vehicle in elem.iterfind('vehicle'):
+                vehicle_ids.append(vehicle.get('id'))
+                lons.append(float(vehicle.get('x')))
+                lats.append(float(vehicle.get('y')))
+
+                # Vehicles without a leader in range have an empty leaderID
+                headway_distance = None
+                if vehicle.get('leaderID'):
+                    headway_distance = float(vehicle.get('leaderGap')) - min_gaps.get(vehicle.get('type'), DEFAULT_MIN_GAP)
+                acceleration = vehicle.get('acceleration')
+                step_metrics.append((float(vehicle.get('speed')),
+                                     float(acceleration) if acceleration is not None else None,
+                                     vehicle.get('lane'),
+                                     headway_distance,
+                                     None,
+                                     None))
+
+            yield float(elem.get('time')) + step_length, vehicle_ids, step_metrics, np.asarray(lats), np.asarray(lons)
+
+            # Drop parsed timesteps so memory stays bounded by one step
+            root.clear()
+
+
+def add_derived_columns(df):
+    """
+    Fills Time_Gap for a chunk in one vectorized pass (Speed_Limit is joined by the recorder).
+    """
+    speeds = df['Speed'].to_numpy(dtype=np.float64)
+    headways = df['Headway_Distance'].to_numpy(dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['Time_Gap'] = np.where(speeds > 0, headways / speeds, np.nan).astype(np.float32)
+    return df
+
+
+def extract_fcd_metrics(fcd_path, net_path, output_path, lanechange_path, collision_path, save_interval=200,
+                        step_length=1.0, min_gaps=None):
+    """
+    Converts FCD output into vehicle_data chunk files with the same schema and chunk naming as the TraCI loop.
+    Events are flagged on the row whose Time equals the lanechange/collision output time, like the TraCI loop.
+    """
+    recorder = ColumnarRecorder(net_index=load_network_index(net_path))
+    lane_changes, collisions = index_step_events(lanechange_path, collision_path)
+    chunk_counter = 0
+
+    def write_chunk():
+        nonlocal chunk_counter
+        chunk_counter += 1
+        output_chunk_path = f"{output_path.replace('.csv', '')}_chunk_{chunk_counter}.csv"
+        add_derived_columns(recorder.to_frame()).to_csv(output_chunk_path, index=False, mode='w', header=chunk_counter == 1)
+        recorder.clear()
+
+    for step, (current_time, vehicle_ids, step_metrics, lats, lons) in enumerate(iter_fcd_timesteps(fcd_path, step_length, min_gaps)):
+        if step % save_interval == 0:
+            print(f"LOG: Parsed {current_time} seconds...")
+        events = step_event_columns(vehicle_ids, lane_changes.get(current_time, {}), collisions.get(current_time, ()))
+        recorder.append_step(current_time, vehicle_ids, step_metrics, lats, lons, events=events)
+
+        if step % save_interval == 0 and step != 0:
+            write_chunk()
+
+    # Save last chunk
+    if len(recorder):
+        write_chunk()
+
+    return chunk_counter
+
+
+def simulate_and_extract_fcd(sumo_cfg, net_path, output_path, simulation_time=100, save_interval=200,
+                             leader_distance=DEFAULT_LEADER_DISTANCE, keep_fcd=False):
+    """
+    Runs the simulation with native FCD output and extracts vehicle metrics from it.
+    """
+    fcd_path = output_path.replace('.csv', '_fcd.xml.gz')
+    lanechange_path = output_path.replace('.csv', '_lanechange.xml')
+    collision_path = output_path.replace('.csv', '_collision.xml')
+    run_fcd_simulation(sumo_cfg, fcd_path, lanechange_path, collision_path, simulation_time, leader_distance=leader_distance)
+    chunk_count = extract_fcd_metrics(fcd_path, net_path, output_path, lanechange_path, collision_path, save_interval=save_interval,
+                                      step_length=get_step_length(sumo_cfg), min_gaps=load_min_gaps(sumo_cfg))
+    print(f"LOG: Wrote {chunk_count} chunks from FCD output.")
+
+    if not keep_fcd:
+        for path in (fcd_path, lanechange_path, collision_path):
+            os.remove(path)
+    return chunk_count
@@ -0,0 +1,365 @@
+import xml.etree.ElementTree as ET
+import gzip
+import os
+import json
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+INDEX_VERSION = 3
+
+# Grid cell size (meters) used to bucket lane segments
+DEFAULT_CELL_SIZE = 100.0
+
+# Loaded indices, keyed by network path, mtime and size
+_LOADED_INDICES = {}
+
+
+### ------------------------------ FILE MANAGEMENT ------------------------------ ###
+def file_checksum(path, block_size=1 << 20):
+    """
+    Computes the SHA-256 checksum of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_index_path(net_file):
+    """
+    Returns the path of the on-disk index for a network file (osm.net.xml.gz -> osm.net.index.npz).
+    """
+    base = net_file[:-3] if net_file.endswith('.gz') else net_file
+    base = base[:-4] if base.endswith('.xml') else base
+    return base + '.index.npz'
+
+
+def open_network(net_file):
+    """
+    Opens a SUMO network file, compressed or not, for streaming reads.
+    """
+    if net_file.endswith('.gz'):
+        return gzip.open(net_file, 'rb')
+    return open(net_file, 'rb')
+
+
+def parse_shape(shape):
+    """
+    Parses a SUMO shape attribute ("x1,y1 x2,y2 ...") into a list of points.
+    """
+    return [tuple(map(float, point.split(','))) for point in shape.split()]
+
+
+### ------------------------------ NETWORK INDEX ------------------------------ ###
+class NetworkIndex:
+    """
+    Precomputed lookup tables for a SUMO network: lane segments bucketed in a uniform grid,
+    lane attributes and the <location> projection parameters.
+    A lane's position in lane_ids is its interned lane code, used to join samples against the lane attributes.
+    """
+
+    def __init__(self, metadata, arrays):
+        self.metadata = metadata
+        self.net_offset_x, self.net_offset_y = metadata['net_offset']
+        self.proj_parameter = metadata['proj_parameter']
+        self.cell_size = metadata['cell_size']
+
+        self.edge_ids = arrays['edge_ids']
+        self.edge_types = arrays['edge_types']
+        self.lane_ids = arrays['lane_ids']
+        self.lane_edges = arrays['lane_edges']
+        self.lane_indexes = arrays['lane_indexes']
+        self.lane_speeds = arrays['lane_speeds']
+        self.lane_lengths = arrays['lane_lengths']
+        self.segments = arrays['segments']
+        self.segment_edges = arrays['segment_edges']
+        self.cell_keys = arrays['cell_keys']
+        self.cell_offsets = arrays['cell_offsets']
+        self.cell_segments = arrays['cell_segments']
+
+        self.lane_positions = {lane_id: i for i, lane_id in enumerate(self.lane_ids.tolist())}
+        self.cell_positions = {key: i for i, key in enumerate(self.cell_keys.tolist())}
+
+    @classmethod
+    def build(cls, net_file, checksum=None, cell_size=DEFAULT_CELL_SIZE):
+        """
+        Builds the index by streaming through the network XML once.
+        Lanes of internal (junction) edges get attributes but stay out of the spatial grid,
+        matching sumolib.net.readNet defaults for nearest-edge lookups.
+        """
+        location = None
+        edge_ids, edge_types, lane_ids, lane_edges, lane_indexes, lane_speeds, lane_lengths = [], [], [], [], [], [], []
+        segments, segment_edges = [], []
+        current_edge = None
+        current_internal = False
+
+        with open_network(net_file) as f:
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if elem.tag == 'edge':
+                        current_edge = len(edge_ids)
+                        current_internal = elem.get('function') == 'internal'
+                        edge_ids.append(elem.get('id'))
+                        edge_types.append(elem.get('type', ''))
+                    continue
+
+                if elem.tag == 'location':
+                    location = dict(elem.attrib)
+                elif elem.tag == 'lane' and current_edge is not None:
+                    lane_ids.append(elem.get('id'))
+                    lane_edges.append(current_edge)
+                    lane_indexes.append(int(elem.get('index', -1)))
+                    lane_speeds.append(float(elem.get('speed')))
+                    lane_lengths.append(float(elem.get('length')))
+                    if current_internal:
+                        continue
+
+                    points = parse_shape(elem.get('shape', ''))
+                    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+                        segments.append((x1, y1, x2, y2))
+                        segment_edges.append(current_edge)
+                elif elem.tag == 'edge':
+                    current_edge = None
+                    elem.clear()
+                elif elem.tag in ('junction', 'connection', 'tlLogic', 'roundabout'):
+                    elem.clear()
+
+        if location is None:
+            raise ValueError("No <location> tag found in the network file.")
+
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        segment_edges = np.asarray(segment_edges, dtype=np.int32)
+
+        # Bucket each segment into every grid cell its bounding box touches
+        cell_entries = {}
+        for i, (x1, y1, x2, y2) in enumerate(segments.tolist()):
+            cx_min, cx_max = int(np.floor(min(x1, x2) / cell_size)), int(np.floor(max(x1, x2) / cell_size))
+            cy_min, cy_max = int(np.floor(min(y1, y2) / cell_size)), int(np.floor(max(y1, y2) / cell_size))
+            for cx in range(cx_min, cx_max + 1):
+                for cy in range(cy_min, cy_max + 1):
+                    cell_entries.setdefault(cell_key(cx, cy), []).append(i)
+
+        # Store the grid as a sorted key array with CSR-style offsets
+        cell_keys = np.asarray(sorted(cell_entries), dtype=np.int64)
+        cell_offsets = np.zeros(len(cell_keys) + 1, dtype=np.int64)
+        cell_segments = []
+        for i, key in enumerate(cell_keys.tolist()):
+            cell_segments.extend(cell_entries[key])
+            cell_offsets[i + 1] = len(cell_segments)
+
+        metadata = {
+            'version': INDEX_VERSION,
+            'checksum': checksum if checksum is not None else file_checksum(net_file),
+            'net_offset': list(map(float, location['netOffset'].split(','))),
+            'proj_parameter': location.get('projParameter'),
+            'conv_boundary': location.get('convBoundary'),
+            'orig_boundary': location.get('origBoundary'),
+            'cell_size': cell_size,
+        }
+        arrays = {
+            'edge_ids': np.asarray(edge_ids, dtype=str),
+            'edge_types': np.asarray(edge_types, dtype=str),
+            'lane_ids': np.asarray(lane_ids, dtype=str),
+            'lane_edges': np.asarray(lane_edges, dtype=np.int32),
+            'lane_indexes': np.asarray(lane_indexes, dtype=np.int16),
+            'lane_speeds': np.asarray(lane_speeds, dtype=np.float64),
+            'lane_lengths': np.asarray(lane_lengths, dtype=np.float64),
+            'segments': segments,
+            'segment_edges': segment_edges,
+            'cell_keys': cell_keys,
+            'cell_offsets': cell_offsets,
+            'cell_segments': np.asarray(cell_segments, dtype=np.int32),
+        }
+        return cls(metadata, arrays)
+
+    def save(self, index_path):
+        """
+        Saves the index as a single .npz file, writing to a unique temporary file first
+        so processes that build the same index at once never write into each other's file.
+        """
+        arrays = {name: getattr(self, name) for name in ('edge_ids', 'edge_types', 'lane_ids', 'lane_edges', 'lane_indexes',
+                                                         'lane_speeds', 'lane_lengths', 'segments', 'segment_edges', 'cell_keys', 'cell_offsets', 'cell_segments')}
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, metadata=np.asarray(json.dumps(self.metadata)), **arrays)
+            os.replace(tmp_path, index_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, index_path):
+        """
+        Loads an index saved with save().
+        """
+        with np.load(index_path, allow_pickle=False) as data:
+            metadata = json.loads(str(data['metadata']))
+            arrays = {name: data[name] for name in data.files if name != 'metadata'}
+        return cls(metadata, arrays)
+
+    def segments_in_ring(self, cx, cy, ring):
+        """
+        Returns the indices of segments stored in the square ring of cells at distance `ring` around (cx, cy).
+        """
+        slices = []
+        for x, y in ring_cells(cx, cy, ring):
+            position = self.cell_positions.get(cell_key(x, y))
+            if position is not None:
+                slices.append(self.cell_segments[self.cell_offsets[position]:self.cell_offsets[position + 1]])
+
+        if not slices:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate(slices) if len(slices) > 1 else slices[0]
+
+    def nearest_edge(self, x, y, radius):
+        """
+        Returns (edge_id, distance) of the edge closest to a SUMO coordinate within `radius`, or None.
+        Grid rings are searched outwards until no closer segment can exist.
+        """
+        cx, cy = int(np.floor(x / self.cell_size)), int(np.floor(y / self.cell_size))
+        max_ring = int(np.ceil(radius / self.cell_size))
+
+        best_distance, best_edge = np.inf, None
+        for ring in range(max_ring + 1):
+            # Every cell in this ring is at least (ring - 1) cells away from the point
+            if (ring - 1) * self.cell_size > best_distance:
+                break
+
+            candidates = self.segments_in_ring(cx, cy, ring)
+            if len(candidates) == 0:
+                continue
+
+            distances = point_segment_distances(x, y, self.segments[candidates])
+            i = int(np.argmin(distances))
+            if distances[i] < best_distance:
+                best_distance, best_edge = float(distances[i]), int(self.segment_edges[candidates[i]])
+
+        if best_edge is None or best_distance > radius:
+            return None
+        return str(self.edge_ids[best_edge]), best_distance
+
+    def lane_speed_limit(self, lane_id):
+        """
+        Returns the speed limit of a lane, or None for unknown lanes.
+        """
+        position = self.lane_positions.get(lane_id)
+        return None if position is None else float(self.lane_speeds[position])
+
+    def lane_codes(self, lane_ids):
+        """
+        Returns the interned lane codes for a sequence of lane IDs (-1 for unknown lanes or None).
+        """
+        return np.fromiter((self.lane_positions.get(lane_id, -1) for lane_id in lane_ids), dtype=np.int32, count=len(lane_ids))
+
+    def lane_speed_limits(self, lane_ids):
+        """
+        Returns an array of speed limits for a sequence of lane IDs (NaN for unknown lanes).
+        """
+        positions = self.lane_codes(lane_ids)
+        limits = np.full(len(positions), np.nan)
+        known = positions >= 0
+        limits[known] = self.lane_speeds[positions[known]]
+        return limits
+
+    def lane_table(self):
+        """
+        Returns the static lane attribute table, one row per lane in lane code order.
+        """
+        return pd.DataFrame({
+            'Lane': self.lane_ids,
+            'Edge_ID': self.edge_ids[self.lane_edges],
+            'Lane_Index': self.lane_indexes,
+            'Speed_Limit': self.lane_speeds.astype(np.float32),
+            'Lane_Length': self.lane_lengths.astype(np.float32),
+            'Road_Type': self.edge_types[self.lane_edges],
+        })
+
+
+def cell_key(cx, cy):
+    """
+    Packs grid cell coordinates into a single sortable integer key.
+    """
+    return (cx + (1 << 24)) * (1 << 25) + (cy + (1 << 24))
+
+
+def ring_cells(cx, cy, ring):
+    """
+    Yields the grid cells on the square ring at Chebyshev distance `ring` from (cx, cy).
+    """
+    if ring == 0:
+        yield cx, cy
+        return
+    for dx in range(-ring, ring + 1):
+        yield cx + dx, cy - ring
+        yield cx + dx, cy + ring
+    for dy in range(-ring + 1, ring):
+        yield cx - ring, cy + dy
+        yield cx + ring, cy + dy
+
+
+def point_segment_distances(x, y, segments):
+    """
+    Returns the distances from a point to each segment in an (n, 4) array of x1, y1, x2, y2.
+    """
+    x1, y1, x2, y2 = segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3]
+    dx, dy = x2 - x1, y2 - y1
+    length_sq = dx * dx + dy * dy
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(length_sq > 0, ((x - x1) * dx + (y - y1) * dy) / length_sq, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(x1 + t * dx - x, y1 + t * dy - y)
+
+
+def load_network_index(net_file, cell_size=DEFAULT_CELL_SIZE):
+    """
+    Returns the index for a network file, building and saving it when it is missing
+    or was built from a different version of the network (checksum mismatch).
+    """
+    stat = os.stat(net_file)
+    cache_key = (os.path.realpath(net_file), stat.st_mtime_ns, stat.st_size)
+    if cache_key in _LOADED_INDICES:
+        return _LOADED_INDICES[cache_key]
+
+    checksum = file_checksum(net_file)
+    index_path = get_index_path(net_file)
+
+    index = None
+    if os.path.exists(index_path):
+        try:
+            index = NetworkIndex.load(index_path)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Failed to load network index {index_path}: {e}")
+        if index is not None and (index.metadata.get('checksum') != checksum or index.metadata.get('version') != INDEX_VERSION):
+            print(f"LOG: Network index {index_path} is out of date, rebuilding...")
+            index = None
+
+    if index is None:
+        print(f"LOG: Building network index for {net_file}...")
+        index = NetworkIndex.build(net_file, checksum=checksum, cell_size=cell_size)
+        index.save(index_path)
+        print(f"LOG: Network index saved to {index_path}")
+
+    _LOADED_INDICES[cache_key] = index
+    return index
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a network index and export its lane attribute table.")
+    parser.add_argument("--map", type=str, default="medium_map", help="Map config directory of the network.")
+    parser.add_argument("--output", type=str, default=None, help="Lane table CSV path (default: SUMO/results/lane_table_<map>.csv).")
+
+    args = parser.parse_args()
+
+    curr_dir_path = os.path.dirname(os.path.realpath(__file__))
+    net_path = os.path.join(curr_dir_path, "..", "configs", args.map, "osm.net.xml.gz")
+    output_path = args.output or os.path.join(curr_dir_path, "..", "results", f"lane_table_{args.map}.csv")
+
+    lane_table = load_network_index(net_path).lane_table()
+    lane_table.to_csv(output_path, index=False)
+    print(f"LOG: Lane table with {len(lane_table)} lanes saved to {output_path}")
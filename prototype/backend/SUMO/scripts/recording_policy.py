@@ -0,0 +1,103 @@
+import zlib
+import numpy as np
+
+
+### ------------------------------ GEOMETRY ------------------------------ ###
+def points_in_polygon(xs, ys, polygon_xs, polygon_ys):
+    """
+    Returns a boolean mask of the points inside a polygon (even-odd ray casting, vectorized over points).
+    """
+    inside = np.zeros(len(xs), dtype=bool)
+    j = len(polygon_xs) - 1
+    for i in range(len(polygon_xs)):
+        xi, yi, xj, yj = polygon_xs[i], polygon_ys[i], polygon_xs[j], polygon_ys[j]
+        crosses = (yi > ys) != (yj > ys)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = (xj - xi) * (ys - yi) / (yj - yi) + xi
+        inside ^= crosses & (xs < x_cross)
+        j = i
+    return inside
+
+
+def sample_value(vehicle_id, seed=0):
+    """
+    Maps a vehicle ID to a deterministic value in [0, 1), stable across runs and processes.
+    """
+    return zlib.crc32(f"{seed}:{vehicle_id}".encode()) / 2**32
+
+
+### ------------------------------ RECORDING POLICY ------------------------------ ###
+class RecordingPolicy:
+    """
+    Decides which vehicles are recorded at each step, before any metric is fetched for them:
+    every `step_interval`-th step only, a sampled fraction of vehicles per vehicle type (decided once
+    per vehicle by hashing its ID) and only vehicles inside a lat/lon region.
+    """
+
+    def __init__(self, region=None, type_fractions=None, default_fraction=1.0, step_interval=1, seed=0):
+        if step_interval < 1:
+            raise ValueError("step_interval must be at least 1")
+        if region is not None and len(region) < 3:
+            raise ValueError("A region needs at least three (lat, lon) vertices")
+        self.region = region
+        self.type_fractions = type_fractions or {}
+        self.default_fraction = default_fraction
+        self.step_interval = step_interval
+        self.seed = seed
+        self.region_xs = self.region_ys = None
+        self.sampled = {}
+
+    @classmethod
+    def from_bbox(cls, min_lat, min_lon, max_lat, max_lon, **kwargs):
+        """
+        Creates a policy whose region is a lat/lon bounding box.
+        """
+        region = [(min_lat, min_lon), (min_lat, max_lon), (max_lat, max_lon), (max_lat, min_lon)]
+        return cls(region=region, **kwargs)
+
+    @property
+    def samples_vehicles(self):
+        """
+        Whether any vehicle type is recorded at a fraction below 1.
+        """
+        return self.default_fraction < 1.0 or any(fraction < 1.0 for fraction in self.type_fractions.values())
+
+    def bind(self, latlon_to_sumo):
+        """
+        Projects the region to SUMO coordinates once, so positions are tested without projecting them.
+        latlon_to_sumo maps (lats, lons) arrays to (xs, ys) arrays for the simulated network.
+        """
+        if self.region is not None:
+            lats, lons = zip(*self.region)
+            self.region_xs, self.region_ys = latlon_to_sumo(np.asarray(lats), np.asarray(lons))
+
+    def keeps_vehicle(self, vehicle_id, get_type):
+        """
+        Returns whether a vehicle is in the sample. The vehicle type is only queried the first time a vehicle is seen.
+        """
+        keep = self.sampled.get(vehicle_id)
+        if keep is None:
+            fraction = self.type_fractions.get(get_type(vehicle_id), self.default_fraction)
+            keep = self.sampled[vehicle_id] = sample_value(vehicle_id, self.seed) < fraction
+        return keep
+
+    def forget(self, vehicle_ids):
+        """
+        Drops the sampling decisions of vehicles that have left the network.
+        """
+        for vehicle_id in vehicle_ids:
+            self.sampled.pop(vehicle_id, None)
+
+    def select(self, step, vehicle_ids, get_type, get_position):
+        """
+        Returns the vehicles to record at a step.
+        """
+        if step % self.step_interval != 0:
+            return []
+        if self.samples_vehicles:
+            vehicle_ids = [v for v in vehicle_ids if self.keeps_vehicle(v, get_type)]
+        if self.region_xs is not None and vehicle_ids:
+            positions = np.array([get_position(v) for v in vehicle_ids], dtype=np.float64).reshape(-1, 2)
+            inside = points_in_polygon(positions[:, 0], positions[:, 1], self.region_xs, self.region_ys)
+            vehicle_ids = [v for v, keep in zip(vehicle_ids, inside.tolist()) if keep]
+        return vehicle_ids
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from vehicle_recorder import StringDictionary
+
+# Thresholds of Risk-Assessment/data_pipeline.py::process_sumo_data
+FAST_ACCELERATION_THRESHOLD = 3.0
+HARD_BRAKING_THRESHOLD = -3.0
+UNSAFE_HEADWAY_THRESHOLD = 2.0
+UNSAFE_TIME_GAP_THRESHOLD = 1.5
+
+# Per-vehicle summary columns, in the order process_sumo_data returns them
+RISK_FEATURE_COLUMNS = ['Vehicle_ID', 'SpeedingViolations', 'FastAccelerations', 'HardBrakings', 'LaneChanges',
+                        'UnsafeHeadways', 'UnsafeTimeGaps', 'Collisions', 'Instance_Count']
+
+# Counters updated every step, one int32 array each
+STEP_COUNTERS = ('SpeedingViolations', 'FastAccelerations', 'HardBrakings', 'UnsafeHeadways', 'UnsafeTimeGaps', 'Instance_Count')
+
+
+class RiskAccumulator:
+    """
+    Keeps the per-vehicle risk feature counts of process_sumo_data up to date while the simulation runs,
+    so the summary calculate_risk consumes is ready without re-reading the vehicle data.
+    Counters live in growable arrays indexed by an interned vehicle code.
+    """
+
+    def __init__(self, net_index, capacity=4096):
+        self.net_index = net_index
+        self.vehicles = StringDictionary()
+        self.lane_limits = {}
+        self.capacity = capacity
+        self.counters = {name: np.zeros(capacity, dtype=np.int32) for name in STEP_COUNTERS}
+        self.lane_changes = np.zeros(capacity, dtype=bool)
+        self.collisions = np.zeros(capacity, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.vehicles.values)
+
+    def reserve(self, size):
+        """
+        Grows every counter so `size` vehicles fit.
+        """
+        if size <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        extra = capacity - self.capacity
+        for name, counter in self.counters.items():
+            self.counters[name] = np.concatenate([counter, np.zeros(extra, dtype=counter.dtype)])
+        self.lane_changes = np.concatenate([self.lane_changes, np.zeros(extra, dtype=bool)])
+        self.collisions = np.concatenate([self.collisions, np.zeros(extra, dtype=np.int32)])
+        self.capacity = capacity
+
+    def lane_speed_limit(self, lane_id):
+        """
+        Returns a lane's speed limit from the network index (NaN for unknown lanes), cached per lane.
+        """
+        limit = self.lane_limits.get(lane_id)
+        if limit is None:
+            limit = self.net_index.lane_speed_limit(lane_id) if lane_id is not None else None
+            limit = self.lane_limits[lane_id] = np.nan if limit is None else limit
+        return limit
+
+    def update(self, vehicle_ids, step_metrics, events=None):
+        """
+        Counts one simulation step. Values are compared as float32, like the recorded CSV columns.
+        events holds the step's (lane_changes, reasons, collisions) columns, as recorded with the rows.
+        """
+        if not vehicle_ids:
+            return
+        codes = self.vehicles.encode_many(vehicle_ids)
+        self.reserve(len(self.vehicles.values))
+
+        speeds, accelerations, lane_ids, _, time_gaps, _ = zip(*step_metrics)
+        speeds = np.array(speeds, dtype=np.float64).astype(np.float32)
+        accelerations = np.array(accelerations, dtype=np.float64).astype(np.float32)
+        time_gaps = np.array(time_gaps, dtype=np.float64).astype(np.float32)
+        speed_limits = np.array([self.lane_speed_limit(lane_id) for lane_id in lane_ids], dtype=np.float32)
+
+        # A vehicle appears at most once per step, so plain fancy-index increments are safe
+        counters = self.counters
+        counters['SpeedingViolations'][codes] += speeds > speed_limits
+        counters['FastAccelerations'][codes] += accelerations > FAST_ACCELERATION_THRESHOLD
+        counters['HardBrakings'][codes] += accelerations < HARD_BRAKING_THRESHOLD
+        counters['UnsafeHeadways'][codes] += time_gaps < UNSAFE_HEADWAY_THRESHOLD
+        counters['UnsafeTimeGaps'][codes] += time_gaps < UNSAFE_TIME_GAP_THRESHOLD
+        counters['Instance_Count'][codes] += 1
+        if events is not None:
+            lane_changes, _, collisions = events
+            self.lane_changes[codes] |= lane_changes
+            self.collisions[codes] += collisions
+
+    def to_frame(self):
+        """
+        Returns the per-vehicle feature summary in the shape process_sumo_data returns.
+        """
+        n = len(self)
+        data = {'Vehicle_ID': self.vehicles.values}
+        for name in STEP_COUNTERS:
+            data[name] = self.counters[name][:n]
+        data['LaneChanges'] = self.lane_changes[:n]
+        data['Collisions'] = self.collisions[:n]
+        df = pd.DataFrame(data)[RISK_FEATURE_COLUMNS]
+        return df.sort_values('Vehicle_ID', kind='stable').reset_index(drop=True)
@@ -0,0 +1,187 @@
+import os
+import ast
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from sumo_extract import start_sumo, extract_metrics, get_dynamic_output_path, sumo_errors, SUMO_INTERFACES, DEFAULT_SUMO_INTERFACE
+from snapshot_library import find_snapshot, get_snapshot_dir
+
+# Per-process state of a pool worker (SUMO interface, snapshot path, config)
+_worker = {}
+
+
+### ------------------------------ FILE MANAGEMENT ------------------------------ ###
+def get_map_paths(map_name="medium_map"):
+    """
+    Returns the sumocfg and network paths of a map in SUMO/configs/.
+    """
+    curr_dir_path = os.path.dirname(os.path.realpath(__file__))
+    configs_dir_path = os.path.join(curr_dir_path, "..", "configs", map_name)
+    return os.path.join(configs_dir_path, "osm.sumocfg"), os.path.join(configs_dir_path, "osm.net.xml.gz")
+
+
+def get_results_dir_path():
+    """
+    Returns the SUMO/results/ directory.
+    """
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "results")
+
+
+### ------------------------------ POOL WORKERS ------------------------------ ###
+def init_worker(sumo_cfg, net_path, threads, interface):
+    """
+    Pool initializer: starts this worker's SUMO instance and saves its clean snapshot.
+    """
+    _worker.update(sumo_cfg=sumo_cfg, net_path=net_path, threads=threads, interface=interface)
+    start_worker_sumo()
+
+
+def start_worker_sumo():
+    """
+    Starts SUMO (network and trip files are loaded once here) and saves the clean start state.
+    """
+    sumo = start_sumo(_worker['sumo_cfg'], threads=_worker['threads'], interface=_worker['interface'])
+    _worker['sumo'] = sumo
+
+    snapshot_dir = tempfile.mkdtemp(prefix="sumo_worker_")
+    snapshot_path = os.path.join(snapshot_dir, "clean_state.xml")
+    sumo.simulation.saveState(snapshot_path)
+    _worker['snapshot_dir'] = snapshot_dir
+    _worker['snapshot_path'] = snapshot_path
+    print(f"LOG: Simulation worker {os.getpid()} ready.")
+
+
+def restart_worker_sumo():
+    """
+    Replaces a worker's SUMO instance after it failed mid-request.
+    """
+    try:
+        _worker['sumo'].close()
+    except Exception:
+        pass
+    shutil.rmtree(_worker.get('snapshot_dir', ''), ignore_errors=True)
+    start_worker_sumo()
+
+
+def run_trip(start_point, end_point, vehicle_type, vehicle_behavior, output_path, simulation_time, state_file=None):
+    """
+    Restores the clean snapshot (or a traffic snapshot from the library), injects one vehicle,
+    tracks only that vehicle until it arrives and saves its trajectory with its lane changes and collisions.
+    """
+    start = time.perf_counter()
+    fatal_error, command_error = sumo_errors(_worker['sumo'])
+    try:
+        _worker['sumo'].simulation.loadState(state_file or _worker['snapshot_path'])
+        extract_metrics(_worker['net_path'], output_path, simulation_time=simulation_time, dynamic=True,
+                                       start_point=start_point, end_point=end_point, vehicle_type=vehicle_type,
+                                       vehicle_behavior=vehicle_behavior, collection_mode="subscribe")
+    except fatal_error:
+        # The SUMO process is gone, bring up a fresh one so this worker stays usable
+        restart_worker_sumo()
+        raise
+    except command_error as e:
+        # SUMO rejected a command but is still running; the next trip restores the snapshot
+        print(f"LOG: !ERROR! Trip failed in worker {os.getpid()}: {e}")
+        raise
+
+    print(f"LOG: Trip simulated by worker {os.getpid()} in {time.perf_counter() - start:.2f}s.")
+    return output_path
+
+
+def run_trip_batch(trips, simulation_time, depart_interval, state_file=None):
+    """
+    Restores the clean snapshot (or a traffic snapshot), injects every trip of the batch with staggered departures
+    and tracks them together until all have arrived, saving each trip to its own output path.
+    """
+    start = time.perf_counter()
+    fatal_error, command_error = sumo_errors(_worker['sumo'])
+    try:
+        _worker['sumo'].simulation.loadState(state_file or _worker['snapshot_path'])
+        extract_metrics(_worker['net_path'], trips[0]['output_path'], simulation_time=simulation_time, trips=trips,
+                        depart_interval=depart_interval, collection_mode="subscribe")
+    except fatal_error:
+        restart_worker_sumo()
+        raise
+    except command_error as e:
+        print(f"LOG: !ERROR! Batch of {len(trips)} trips failed in worker {os.getpid()}: {e}")
+        raise
+
+    print(f"LOG: Batch of {len(trips)} trips simulated by worker {os.getpid()} in {time.perf_counter() - start:.2f}s.")
+    return [trip['output_path'] for trip in trips if os.path.exists(trip['output_path'])]
+
+
+### ------------------------------ POOL ------------------------------ ###
+class SimulationPool:
+    """
+    A pool of pre-started SUMO instances that serve dynamic single-vehicle trips.
+    Each instance is restored to its clean snapshot before every trip.
+    """
+
+    def __init__(self, sumo_cfg, net_path, size=2, threads=4, snapshot_dir=None, interface=DEFAULT_SUMO_INTERFACE):
+        self.net_path = net_path
+        self.snapshot_dir = snapshot_dir
+        context = multiprocessing.get_context("spawn")
+        self.pool = context.Pool(processes=size, initializer=init_worker, initargs=(sumo_cfg, net_path, threads, interface))
+
+    def run_trip(self, start_point, end_point, vehicle_type, vehicle_behavior, output_path, simulation_time=2100,
+                 depart_time=None, timeout=None):
+        """
+        Simulates one dynamic trip on the next free instance and returns the output path.
+        With a departure time, the trip starts from the latest snapshot before it in the library instead of an empty network.
+        """
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        state_file = None
+        if depart_time is not None and self.snapshot_dir is not None:
+            state_file = find_snapshot(self.snapshot_dir, self.net_path, depart_time)
+        result = self.pool.apply_async(run_trip, (start_point, end_point, vehicle_type, vehicle_behavior, output_path,
+                                                  simulation_time, state_file))
+        return result.get(timeout)
+
+    def run_trips(self, trips, simulation_time=2100, depart_time=None, depart_interval=1.0, timeout=None):
+        """
+        Simulates a batch of dynamic trips together in one run on the next free instance.
+        Each trip is a dict with start_point, end_point, vehicle_type, vehicle_behavior and output_path;
+        returns the output paths of the trips that were saved.
+        """
+        for trip in trips:
+            os.makedirs(os.path.dirname(trip['output_path']), exist_ok=True)
+        state_file = None
+        if depart_time is not None and self.snapshot_dir is not None:
+            state_file = find_snapshot(self.snapshot_dir, self.net_path, depart_time)
+        result = self.pool.apply_async(run_trip_batch, (trips, simulation_time, depart_interval, state_file))
+        return result.get(timeout)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run dynamic trips on a pool of warm SUMO instances.")
+    parser.add_argument("--map", type=str, default="medium_map", help="Map config directory to simulate.")
+    parser.add_argument("--pool_size", type=int, default=2, help="Number of SUMO instances to keep running.")
+    parser.add_argument("--start_point", type=str, required=True, help="Starting point of the route, e.g. '(41.80, -72.25)'.")
+    parser.add_argument("--end_point", type=str, required=True, help="Ending point of the route.")
+    parser.add_argument("--vehicle_type", type=str, default="veh_passenger", help="Type of vehicle to add to the simulation.")
+    parser.add_argument("--behavior", type=str, default="", help="Behavior of the vehicle.")
+    parser.add_argument("--depart_time", type=float, default=None, help="Simulated departure time; starts from the nearest traffic snapshot.")
+    parser.add_argument("--sumo_interface", type=str, default=DEFAULT_SUMO_INTERFACE, choices=SUMO_INTERFACES, help="Run SUMO in-process (libsumo) or over a TraCI socket.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times to run the trip (shows warm latency).")
+
+    args = parser.parse_args()
+
+    sumocfg_path, net_path = get_map_paths(args.map)
+    start = time.perf_counter()
+    pool = SimulationPool(sumocfg_path, net_path, size=args.pool_size, snapshot_dir=get_snapshot_dir(args.map),
+                          interface=args.sumo_interface)
+    for i in range(args.repeat):
+        trip_start = time.perf_counter()
+        output_path = get_dynamic_output_path(get_results_dir_path(), args.vehicle_type, args.behavior)
+        pool.run_trip(ast.literal_eval(args.start_point), ast.literal_eval(args.end_point), args.vehicle_type, args.behavior, output_path,
+                      depart_time=args.depart_time)
+        print(f"Trip {i + 1}: {time.perf_counter() - trip_start:.2f}s -> {output_path}")
+    pool.close()
+    print(f"Total: {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,120 @@
+import os
+import json
+import argparse
+from network_index import load_network_index
+from sumo_extract import start_sumo
+
+MANIFEST_FILE = "snapshots.json"
+
+
+### ------------------------------ FILE MANAGEMENT ------------------------------ ###
+def get_snapshot_dir(map_name):
+    """
+    Returns the snapshot directory of a map (SUMO/snapshots/<map_name>/).
+    """
+    curr_dir_path = os.path.dirname(os.path.realpath(__file__))
+    return os.path.join(curr_dir_path, "..", "snapshots", map_name)
+
+
+def load_manifest(snapshot_dir):
+    """
+    Loads a snapshot library manifest, or None if the library has not been built.
+    """
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(snapshot_dir, manifest):
+    """
+    Writes a snapshot library manifest atomically.
+    """
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+### ------------------------------ SNAPSHOTS ------------------------------ ###
+def build_snapshot_library(sumo_cfg, net_path, snapshot_dir, interval=300, end_time=2100):
+    """
+    Simulates the map's background traffic once and saves its state every `interval` simulated seconds.
+    The manifest records the network checksum so snapshots of an older network are never used.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    network_checksum = load_network_index(net_path).metadata['checksum']
+
+    sumo = start_sumo(sumo_cfg)
+    snapshots = []
+    try:
+        while True:
+            current_time = sumo.simulation.getTime()
+            if current_time % interval == 0:
+                snapshot_file = f"state_{int(current_time)}.xml.gz"
+                sumo.simulation.saveState(os.path.join(snapshot_dir, snapshot_file))
+                snapshots.append({"time": current_time, "file": snapshot_file,
+                                  "vehicles": sumo.vehicle.getIDCount()})
+                print(f"LOG: Saved snapshot at {current_time} seconds ({snapshots[-1]['vehicles']} vehicles).")
+            if current_time >= end_time:
+                break
+            sumo.simulationStep()
+    finally:
+        sumo.close()
+
+    save_manifest(snapshot_dir, {
+        "network_checksum": network_checksum,
+        "sumo_cfg": os.path.basename(sumo_cfg),
+        "interval": interval,
+        "snapshots": snapshots,
+    })
+    print(f"LOG: Snapshot library with {len(snapshots)} snapshots saved to {snapshot_dir}")
+    return snapshots
+
+
+def find_snapshot(snapshot_dir, net_path, depart_time):
+    """
+    Returns the path of the latest snapshot taken at or before the requested departure time, or None (start from
+    the clean state) if there is none, no library, or the library was built for a different version of the network.
+    A later snapshot would skip traffic that should have departed before it.
+    """
+    manifest = load_manifest(snapshot_dir)
+    if manifest is None or not manifest["snapshots"]:
+        print(f"LOG: No snapshot library found in {snapshot_dir}.")
+        return None
+
+    if manifest["network_checksum"] != load_network_index(net_path).metadata['checksum']:
+        print(f"LOG: Snapshot library in {snapshot_dir} was built for a different network, ignoring it.")
+        return None
+
+    earlier = [s for s in manifest["snapshots"] if s["time"] <= depart_time]
+    if not earlier:
+        print(f"LOG: No snapshot at or before departure time {depart_time}, starting from the clean state.")
+        return None
+    snapshot = max(earlier, key=lambda s: s["time"])
+    snapshot_path = os.path.join(snapshot_dir, snapshot["file"])
+    if not os.path.exists(snapshot_path):
+        print(f"LOG: Snapshot {snapshot_path} is missing.")
+        return None
+
+    print(f"LOG: Using snapshot at {snapshot['time']} seconds for departure time {depart_time}.")
+    return snapshot_path
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the traffic snapshot library for a map.")
+    parser.add_argument("--map", type=str, default="medium_map", help="Map config directory to simulate.")
+    parser.add_argument("--interval", type=int, default=300, help="Simulated seconds between snapshots.")
+    parser.add_argument("--end_time", type=int, default=2100, help="Last simulated second to snapshot.")
+
+    args = parser.parse_args()
+
+    curr_dir_path = os.path.dirname(os.path.realpath(__file__))
+    configs_dir_path = os.path.join(curr_dir_path, "..", "configs", args.map)
+    sumocfg_path = os.path.join(configs_dir_path, "osm.sumocfg")
+    net_path = os.path.join(configs_dir_path, "osm.net.xml.gz")
+
+    build_snapshot_library(sumocfg_path, net_path, get_snapshot_dir(args.map), interval=args.interval, end_time=args.end_time)
@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Phases of one extraction loop step, in the order they run
+PHASES = ("simulation_step", "collection", "projection", "recording", "chunk_write")
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss():
+    """
+    Returns the resident memory of this process in bytes (peak RSS where the current value is unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+### ------------------------------ PROFILER ------------------------------ ###
+class StepProfiler:
+    """
+    Records how long each phase of every extraction loop step takes, together with the simulated time,
+    active vehicles, recorded rows and process RSS. Samples are kept in growable arrays.
+    """
+
+    def __init__(self, rss_interval=10, capacity=4096):
+        self.rss_interval = rss_interval
+        self.size = 0
+        self.capacity = capacity
+        self.phase_times = np.zeros((capacity, len(PHASES)), dtype=np.float32)
+        self.sim_times = np.zeros(capacity, dtype=np.float64)
+        self.vehicles = np.zeros(capacity, dtype=np.int32)
+        self.rows = np.zeros(capacity, dtype=np.int32)
+        self.rss = np.zeros(capacity, dtype=np.int64)
+        self.extra = {}
+        self.step_start = self.last_mark = None
+        self.wall_start = time.perf_counter()
+
+    def __len__(self):
+        return self.size
+
+    def start_step(self):
+        self.step_start = self.last_mark = time.perf_counter()
+        if self.size == self.capacity:
+            self.grow()
+
+    def mark(self, phase):
+        """
+        Charges the time since the previous mark to a phase of the current step.
+        """
+        now = time.perf_counter()
+        self.phase_times[self.size, PHASES.index(phase)] += now - self.last_mark
+        self.last_mark = now
+
+    def end_step(self, sim_time, vehicles, rows):
+        i = self.size
+        self.sim_times[i] = sim_time
+        self.vehicles[i] = vehicles
+        self.rows[i] = rows
+        self.rss[i] = current_rss() if i % self.rss_interval == 0 else self.rss[i - 1] if i else current_rss()
+        self.size += 1
+
+    def record(self, name, seconds):
+        """
+        Records a one-off duration outside the step loop (e.g. the final chunk write).
+        """
+        self.extra[name] = self.extra.get(name, 0.0) + seconds
+
+    def grow(self):
+        self.capacity *= 2
+        self.phase_times = np.concatenate([self.phase_times, np.zeros_like(self.phase_times)])
+        for name in ("sim_times", "vehicles", "rows", "rss"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+
+    def arrays(self):
+        n = self.size
+        return {
+            "phase_times": self.phase_times[:n],
+            "sim_times": self.sim_times[:n],
+            "vehicles": self.vehicles[:n],
+            "rows": self.rows[:n],
+            "rss": self.rss[:n],
+        }
+
+    def save(self, profile_path):
+        """
+        Saves the per-step samples as a compressed .npz profile.
+        """
+        metadata = {"phases": list(PHASES), "wall_time": time.perf_counter() - self.wall_start, "extra": self.extra}
+        with open(profile_path, "wb") as f:
+            np.savez_compressed(f, metadata=np.asarray(json.dumps(metadata)), **self.arrays())
+        print(f"LOG: Step profile saved to {profile_path}")
+
+
+class NullProfiler:
+    """
+    Stand-in used when profiling is off, so the loop calls the same methods without cost.
+    """
+
+    def start_step(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end_step(self, sim_time, vehicles, rows):
+        pass
+
+    def record(self, name, seconds):
+        pass
+
+
+### ------------------------------ SUMMARY ------------------------------ ###
+def load_profile(profile_path):
+    """
+    Loads a profile saved with StepProfiler.save() as (metadata, arrays).
+    """
+    with np.load(profile_path, allow_pickle=False) as data:
+        metadata = json.loads(str(data["metadata"]))
+        arrays = {name: data[name] for name in data.files if name != "metadata"}
+    return metadata, arrays
+
+
+def summarize(arrays, extra=None):
+    """
+    Returns per-phase totals and percentiles plus overall throughput for a profile.
+    """
+    phase_times = arrays["phase_times"].astype(np.float64)
+    steps = len(phase_times)
+    step_totals = phase_times.sum(axis=1)
+    loop_time = float(step_totals.sum())
+    phases = {}
+    for i, phase in enumerate(PHASES):
+        times = phase_times[:, i]
+        phases[phase] = {
+            "total": float(times.sum()),
+            "share": float(times.sum() / loop_time) if loop_time else 0.0,
+            "mean_ms": float(times.mean() * 1000) if steps else 0.0,
+            "p95_ms": float(np.percentile(times, 95) * 1000) if steps else 0.0,
+        }
+    return {
+        "steps": steps,
+        "loop_time": loop_time,
+        "steps_per_second": steps / loop_time if loop_time else 0.0,
+        "rows": int(arrays["rows"].sum()),
+        "rows_per_second": float(arrays["rows"].sum() / loop_time) if loop_time else 0.0,
+        "mean_vehicles": float(arrays["vehicles"].mean()) if steps else 0.0,
+        "max_vehicles": int(arrays["vehicles"].max()) if steps else 0,
+        "peak_rss": int(arrays["rss"].max()) if steps else 0,
+        "phases": phases,
+        "extra": extra or {},
+    }
+
+
+def print_summary(summary, baseline=None):
+    """
+    Prints the phase table of a profile summary, with the change against a baseline summary if given.
+    """
+    print(f"{'phase':>16} {'total s':>9} {'share':>7} {'mean ms':>9} {'p95 ms':>9}" + (f" {'vs base':>8}" if baseline else ""))
+    for phase, stats in summary["phases"].items():
+        line = f"{phase:>16} {stats['total']:9.2f} {stats['share']:7.1%} {stats['mean_ms']:9.3f} {stats['p95_ms']:9.3f}"
+        if baseline:
+            base_mean = baseline["phases"][phase]["mean_ms"]
+            line += f" {stats['mean_ms'] / base_mean - 1:+8.1%}" if base_mean else f" {'-':>8}"
+        print(line)
+    for name, seconds in summary["extra"].items():
+        print(f"{name:>16} {seconds:9.2f}")
+    print(f"Steps: {summary['steps']:,} in {summary['loop_time']:.2f}s ({summary['steps_per_second']:,.1f} steps/s)")
+    print(f"Rows: {summary['rows']:,} ({summary['rows_per_second']:,.0f} rows/s)")
+    print(f"Vehicles: {summary['mean_vehicles']:,.0f} mean, {summary['max_vehicles']:,} max")
+    print(f"Peak RSS: {summary['peak_rss'] / 2**20:,.1f} MiB")
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a step profile written by sumo_extract.py --profile.")
+    parser.add_argument("--profile", type=str, required=True, help="Profile file (*_profile.npz).")
+    parser.add_argument("--baseline", type=str, default=None, help="Earlier profile to compare phase times against.")
+
+    args = parser.parse_args()
+
+    metadata, arrays = load_profile(args.profile)
+    baseline = None
+    if args.baseline:
+        baseline_metadata, baseline_arrays = load_profile(args.baseline)
+        baseline = summarize(baseline_arrays, baseline_metadata.get("extra"))
+    print_summary(summarize(arrays, metadata.get("extra")), baseline=baseline)
@@ -2,15 +2,25 @@ import xml.etree.ElementTree as ET
 import gzip
 import os
 import traci
-import pandas as pd
+import traci.constants as tc
 import math
 import shutil
 import argparse
 import ast
-from sumolib import net
+import json
+from network_index import load_network_index
+from vehicle_recorder import ColumnarRecorder
+from vehicle_events import EventTracker
+from fcd_extract import simulate_and_extract_fcd
+from risk_accumulator import RiskAccumulator
+from recording_policy import RecordingPolicy
+from step_profiler import StepProfiler, NullProfiler, summarize, print_summary
+from traci_replay import TraciRecorder, TraciReplay
 import time
 import glob
 import pyproj
+import functools
+import numpy as np
 import datetime
 
 ### ------------------------------ FILE MANAGEMENT ------------------------------ ###
@@ -51,11 +61,20 @@ def extract_network_info(net_file, is_gz=True):
     return net_offset_x, net_offset_y, proj_parameter
 
 
+@functools.lru_cache(maxsize=None)
+def get_projection(proj_string):
+    """
+    Returns the cached projection for a network's projParameter string.
+    pyproj.Proj is a Transformer, so it is built once per network and reused for every conversion.
+    """
+    return pyproj.Proj(proj_string)
+
+
 def sumo_to_latlon(x, y, net_offset_x, net_offset_y, proj_string):
     """
     Converts SUMO coordinates to real-world latitude and longitude.
     """
-    proj = pyproj.Proj(proj_string)
+    proj = get_projection(proj_string)
     
     x_proj = x - net_offset_x
     y_proj = y - net_offset_y
@@ -65,11 +84,25 @@ def sumo_to_latlon(x, y, net_offset_x, net_offset_y, proj_string):
     return lat, lon
 
 
+def sumo_to_latlon_batch(xs, ys, net_offset_x, net_offset_y, proj_string):
+    """
+    Converts arrays of SUMO coordinates to latitude and longitude arrays in one vectorized call.
+    """
+    proj = get_projection(proj_string)
+
+    x_proj = np.asarray(xs, dtype=np.float64) - net_offset_x
+    y_proj = np.asarray(ys, dtype=np.float64) - net_offset_y
+
+    lons, lats = proj(x_proj, y_proj, inverse=True)
+
+    return lats, lons
+
+
 def latlon_to_sumo(lat, lon, net_offset_x, net_offset_y, proj_string):
     """
     Converts real-world latitude and longitude to SUMO coordinates.
     """
-    proj = pyproj.Proj(proj_string)
+    proj = get_projection(proj_string)
 
     x_proj, y_proj = proj(lon, lat)
     
@@ -79,94 +112,191 @@ def latlon_to_sumo(lat, lon, net_offset_x, net_offset_y, proj_string):
     return x_sumo, y_sumo
 
 
+def latlon_to_sumo_batch(lats, lons, net_offset_x, net_offset_y, proj_string):
+    """
+    Converts arrays of latitude and longitude to SUMO coordinate arrays in one vectorized call.
+    """
+    proj = get_projection(proj_string)
+
+    x_proj, y_proj = proj(np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+
+    return x_proj + net_offset_x, y_proj + net_offset_y
+
+
+def project_step_positions(step_positions, net_offset_x, net_offset_y, proj_string):
+    """
+    Projects the SUMO positions collected for a step to latitude and longitude arrays in one call.
+    Vehicles without a position (failed lookups) get NaN.
+    """
+    lats = np.full(len(step_positions), np.nan)
+    lons = np.full(len(step_positions), np.nan)
+
+    valid = [i for i, position in enumerate(step_positions) if position is not None]
+    if valid:
+        xs = [step_positions[i][0] for i in valid]
+        ys = [step_positions[i][1] for i in valid]
+        lats[valid], lons[valid] = sumo_to_latlon_batch(xs, ys, net_offset_x, net_offset_y, proj_string)
+
+    return lats, lons
+
+
 def get_nearest_edge(lat, lon, net_file, net_offset_x, net_offset_y, proj_string):
     """
     Finds the nearest edge to a given latitude and longitude.
+    Uses the persistent network index instead of re-reading the network.
     """
-    # Read the SUMO network
-    net_data = net.readNet(net_file)
+    # Load the SUMO network index (built once per network version)
+    net_index = load_network_index(net_file)
     # Convert latitude and longitude to SUMO coordinates
     x, y = latlon_to_sumo(lat, lon, net_offset_x, net_offset_y, proj_string)
 
     print(f"Converted ({lat}, {lon}) -> SUMO ({x}, {y})")
-    
+
     # Find the nearest edge
-    edges = net_data.getNeighboringEdges(x, y, 1609)
-    if not edges:
+    nearest_edge = net_index.nearest_edge(x, y, 1609)
+    if nearest_edge is None:
         print("No edges found nearby.")
         return None
-    
+
     # Get the ID of the nearest edge
-    nearest_edge = min(edges, key=lambda edge: edge[1])[0]
+    nearest_edge_id, _ = nearest_edge
+
+    print(f"Nearest edge: {nearest_edge_id}")
+
+    return nearest_edge_id
+
+
+### ------------------------------ METRIC COLLECTION ------------------------------ ###
+COLLECTION_MODES = ("poll", "subscribe")
+EXTRACTION_BACKENDS = ("traci", "fcd")
+SUMO_INTERFACES = ("libsumo", "traci")
+
+# Headless runs use the in-process backend; the GUI can only be driven through TraCI
+DEFAULT_SUMO_INTERFACE = "libsumo"
+
+# SUMO interface used by the extraction loop, switched by start_sumo()
+sumo = traci
 
-    print(f"Nearest edge: {nearest_edge.getID()}")
+# Variables needed for a single vehicle row, fetched in one subscription.
+# The leader is not subscribed: a subscribed VAR_LEADER is evaluated at a different point of the step than
+# getLeader and misses leaders that getLeader finds, so both modes poll getLeader.
+SUBSCRIBED_VARIABLES = (tc.VAR_SPEED, tc.VAR_ACCELERATION, tc.VAR_POSITION, tc.VAR_LANE_ID)
 
-    return nearest_edge.getID()
 
-### ------------------------------ METRIC EXTRACTION ------------------------------ ###
-def extract_lane_change_data(lane_change_file):
+def leader_metrics(leader_info, speed):
     """
-    Extracts lane change data from a SUMO lane change output file.
+    Returns the headway distance and time gap for a getLeader-style result.
+    libsumo reports a missing leader as ('', -1.0) instead of None, which is treated the same way.
     """
-    # Parse the XML file
-    tree = ET.parse(lane_change_file)
-    root = tree.getroot()
+    if leader_info and leader_info[0]:
+        _, headway_distance = leader_info
+        time_gap = headway_distance / speed if speed > 0 else None
+    else:
+        headway_distance, time_gap = None, None
+    return headway_distance, time_gap
 
-    # Extract the lane change data
-    lane_changes = []
-    for lane_change in root.findall("change"):
-        time = float(lane_change.get("time"))
-        vehicle_id = lane_change.get("id")
-        from_lane = lane_change.get("from")
-        to_lane = lane_change.get("to")
-        reason = lane_change.get("reason", "unknown")
 
-        lane_changes.append({
-            'Time': time,
-            'Vehicle_ID': vehicle_id,
-            'Lane_Change': True,
-            'From_Lane': from_lane,
-            'To_Lane': to_lane,
-            'Lane_Change_Reason': reason
-        })
+def poll_vehicle_metrics(vehicle_id, current_time):
+    """
+    Collects a vehicle's metrics with one TraCI round-trip per value.
+    Returns the metrics tuple and the raw SUMO position, which is projected in batch for the whole step.
+    The speed limit is left empty; the recorder joins it from the static lane table.
+    """
+    speed_limit = None
+    try:
+        speed = sumo.vehicle.getSpeed(vehicle_id)
+        acceleration = sumo.vehicle.getAcceleration(vehicle_id)
+        position = sumo.vehicle.getPosition(vehicle_id)
+        lane_id = sumo.vehicle.getLaneID(vehicle_id)
+        headway_distance, time_gap = leader_metrics(sumo.vehicle.getLeader(vehicle_id), speed)
+    except Exception as e:
+        print(f"Error processing vehicle {vehicle_id}: {e} at time {current_time}!")
+        speed = acceleration = position = lane_id = headway_distance = time_gap = None
 
-    return pd.DataFrame(lane_changes)
+    return (speed, acceleration, lane_id, headway_distance, time_gap, speed_limit), position
 
 
-def extract_collision_data(collision_file):
+def subscribe_vehicle_metrics(vehicle_id):
     """
-    Extracts collision data from a SUMO collision output file.
+    Subscribes a vehicle to every variable needed for its data row except the leader.
     """
-    # Parse the XML file
-    tree = ET.parse(collision_file)
-    root = tree.getroot()
+    sumo.vehicle.subscribe(vehicle_id, SUBSCRIBED_VARIABLES)
 
-    # Extract the collision data
-    collisions = []
-    for collision in root.findall("collision"):
-        time = float(collision.get("time"))
-        vehicle_1 = collision.get("vehicle1")
-        vehicle_2 = collision.get("vehicle2")
 
-        collisions.append({'Time': time, 'Vehicle_ID': vehicle_1, 'Collision': True})
-        collisions.append({'Time': time, 'Vehicle_ID': vehicle_2, 'Collision': True})
+def subscribe_tracked_vehicles(vehicle_ids, tracked=None):
+    """
+    Subscribes the given vehicles, or only the ones in tracked when the run is limited to a set of vehicles,
+    so trip runs do not pay for a subscription of every vehicle in the fleet.
+    """
+    for vehicle_id in vehicle_ids:
+        if tracked is None or vehicle_id in tracked:
+            subscribe_vehicle_metrics(vehicle_id)
 
-    return pd.DataFrame(collisions)
+
+def read_subscribed_metrics(vehicle_id, results, current_time):
+    """
+    Collects a vehicle's metrics from its subscription results for the current step.
+    The leader is polled with getLeader, so headway and time gap match poll mode.
+    Returns the metrics tuple and the raw SUMO position, like poll_vehicle_metrics.
+    """
+    speed_limit = None
+    try:
+        speed = results[tc.VAR_SPEED]
+        acceleration = results[tc.VAR_ACCELERATION]
+        position = results[tc.VAR_POSITION]
+        lane_id = results[tc.VAR_LANE_ID]
+        headway_distance, time_gap = leader_metrics(sumo.vehicle.getLeader(vehicle_id), speed)
+    except Exception as e:
+        print(f"Error processing vehicle {vehicle_id}: {e} at time {current_time}!")
+        speed = acceleration = position = lane_id = headway_distance = time_gap = None
+
+    return (speed, acceleration, lane_id, headway_distance, time_gap, speed_limit), position
 
 
 ### ------------------------------ SIMULATION ------------------------------ ###
-def simulate_and_extract_metrics(sumo_cfg, net_path, output_path, simulation_time=100, vehicles=None, 
-                                 dynamic=False, start_point=None, end_point=None, vehicle_type=None, 
-                                 vehicle_behavior=None, chunk_size=100000, save_interval=200, state_file=None):
+def load_sumo_interface(interface):
     """
-    Runs the SUMO simulation and extracts vehicle metrics.
+    Returns the module for a SUMO interface: libsumo runs the simulation in-process,
+    TraCI talks to a separate SUMO process over a socket. Falls back to TraCI if libsumo is not installed.
     """
-    # Extract network info
-    net_offset_x, net_offset_y, proj_string = extract_network_info(net_path)
-    
-    # Start the SUMO simulation
-    traci.start(["sumo", "-c", sumo_cfg, "--start", "--delay", "10", 
-                 "--threads", "16",
+    if interface not in SUMO_INTERFACES:
+        raise ValueError(f"Unknown SUMO interface: {interface}")
+    if interface == "libsumo":
+        try:
+            import libsumo
+            return libsumo
+        except ImportError:
+            print("LOG: libsumo is not installed, falling back to TraCI.")
+    return traci
+
+
+def sumo_errors(interface_module):
+    """
+    Returns the (fatal, command) exception classes raised by a SUMO interface module.
+    libsumo raises its own classes rather than the ones in traci.exceptions.
+    """
+    fatal_error = getattr(interface_module, "FatalTraCIError", traci.exceptions.FatalTraCIError)
+    command_error = getattr(interface_module, "TraCIException", traci.exceptions.TraCIException)
+    return fatal_error, command_error
+
+
+def start_sumo(sumo_cfg, threads=16, extra_args=(), interface=None, gui=False, record_log=None):
+    """
+    Starts a SUMO instance for the given config on the chosen interface and returns the interface module.
+    Without an interface, headless runs use libsumo and GUI runs TraCI, the only interface the GUI is available through.
+    If record_log is given, every response is also captured to that file for later replay.
+    """
+    global sumo
+    if interface is None:
+        interface = "traci" if gui else DEFAULT_SUMO_INTERFACE
+    if gui and interface != "traci":
+        raise ValueError("sumo-gui can only be driven through the traci interface")
+    sumo = load_sumo_interface(interface)
+    if record_log is not None:
+        sumo = TraciRecorder(sumo, record_log)
+    sumo.start(["sumo-gui" if gui else "sumo", "-c", sumo_cfg, "--start", "--delay", "10", 
+                 "--threads", str(threads),
+                 *extra_args,
                 # "--device.rerouting.probability", "0", "--device.emissions.probability", "0", 
                 # "--no-internal-links", "1", "--ignore-junction-blocker", "5",
                 # "--collision.mingap-factor", "0", "--collision.action", "remove", "--collision.check-junctions", "0",
@@ -180,13 +310,80 @@ def simulate_and_extract_metrics(sumo_cfg, net_path, output_path, simulation_tim
                 ],
                 # traceFile="trace.xml",
                 )
+    return sumo
+
+
+def start_replay(replay_log):
+    """
+    Points the extraction loop at a recorded TraCI log instead of a running SUMO instance.
+    """
+    global sumo
+    sumo = TraciReplay(replay_log)
+    print(f"LOG: Replaying {len(sumo.steps) - 1} recorded {sumo.recorded_interface} steps from {replay_log}")
+    return sumo
+
+
+def simulate_and_extract_metrics(sumo_cfg, net_path, output_path, simulation_time=100, vehicles=None, 
+                                 dynamic=False, start_point=None, end_point=None, vehicle_type=None, 
+                                 vehicle_behavior=None, chunk_size=100000, save_interval=200, state_file=None,
+                                 collection_mode="poll", interface=None, gui=False, risk_accumulator=None,
+                                 recording_policy=None, profiler=None, record_log=None, replay_log=None,
+                                 trips=None, depart_interval=1.0):
+    """
+    Runs the SUMO simulation and extracts vehicle metrics.
+    trips is a list of dynamic trips simulated together, see extract_metrics().
+    collection_mode is "poll" (one TraCI call per value) or "subscribe" (one batched result per step).
+    interface is "libsumo" (in-process, default for headless runs) or "traci" (default with the GUI).
+    A RiskAccumulator, if given, is updated with every step's samples.
+    A RecordingPolicy, if given, limits which vehicles and steps are recorded.
+    A StepProfiler, if given, records the time spent in each phase of every step.
+    record_log captures the run's TraCI responses; replay_log serves a captured run instead of starting SUMO.
+    """
+    if collection_mode not in COLLECTION_MODES:
+        raise ValueError(f"Unknown collection mode: {collection_mode}")
+
+    # Start the SUMO simulation
+    if replay_log is not None:
+        start_replay(replay_log)
+    else:
+        start_sumo(sumo_cfg, interface=interface, gui=gui, record_log=record_log)
+    try:
+        return extract_metrics(net_path, output_path, simulation_time=simulation_time, vehicles=vehicles, dynamic=dynamic,
+                               start_point=start_point, end_point=end_point, vehicle_type=vehicle_type,
+                               vehicle_behavior=vehicle_behavior, save_interval=save_interval, state_file=state_file,
+                               collection_mode=collection_mode, risk_accumulator=risk_accumulator,
+                               recording_policy=recording_policy, profiler=profiler, trips=trips,
+                               depart_interval=depart_interval)
+    finally:
+        sumo.close()
+
+
+def extract_metrics(net_path, output_path, simulation_time=100, vehicles=None, dynamic=False, start_point=None,
+                    end_point=None, vehicle_type=None, vehicle_behavior=None, save_interval=200, state_file=None,
+                    collection_mode="poll", risk_accumulator=None, recording_policy=None, profiler=None,
+                    trips=None, depart_interval=1.0):
+    """
+    Runs the extraction loop on the already connected SUMO instance and saves the output.
+    Long-lived instances call this directly after restoring a snapshot.
+    trips is a list of dicts with start_point, end_point, vehicle_type, vehicle_behavior and output_path:
+    all trips are injected depart_interval seconds apart, tracked until they arrive and saved to their own output_path.
+    """
+    # Phase timings are only recorded when a StepProfiler is passed
+    profiler = profiler if profiler is not None else NullProfiler()
+
+    # Extract network info from the network index
+    net_index = load_network_index(net_path)
+    net_offset_x, net_offset_y, proj_string = net_index.net_offset_x, net_index.net_offset_y, net_index.proj_parameter
+    if recording_policy is not None:
+        recording_policy.bind(lambda lats, lons: latlon_to_sumo_batch(lats, lons, net_offset_x, net_offset_y, proj_string))
 
     # Load the saved state if provided
-    if state_file != "None" and os.path.exists(state_file):
+    if state_file not in (None, "None") and os.path.exists(state_file):
         print(f"Loading saved state from {state_file}")
-        traci.simulation.loadState(state_file)
+        sumo.simulation.loadState(state_file)
 
     # Add dynamic vehicle if requested
+    trip_output_paths = None
     if dynamic:
         print(f"LOG: Adding dynamic vehicle {vehicle_type} from {start_point} to {end_point} with behvaior {vehicle_behavior}.")
         nearest_start_edge = get_nearest_edge(start_point[0], start_point[1], net_path, net_offset_x, net_offset_y, proj_string)
@@ -194,79 +391,122 @@ def simulate_and_extract_metrics(sumo_cfg, net_path, output_path, simulation_tim
         dynamic_vehicle_id = add_vehicle(nearest_start_edge, nearest_end_edge, vehicle_type, vehicle_behavior)
         vehicles = [dynamic_vehicle_id]
         print(f"LOG: Dynamic vehicle ID: {dynamic_vehicle_id}")
+    elif trips:
+        trip_output_paths = add_trips(trips, net_path, net_offset_x, net_offset_y, proj_string, depart_interval)
+        vehicles = list(trip_output_paths)
 
     # Create variables to keep track of progress
-    data_rows = []
+    # Speed limits are joined from the network index's lane table instead of queried per sample
+    recorder = ColumnarRecorder(net_index=net_index)
+    events = EventTracker()
     chunk_counter = 0
+    pending_step = None
+
+    def record_step(step_time, step_ids, step_metrics, lats, lons):
+        # Takes the events queued for the step's vehicles and records its rows
+        step_events = events.step_events(step_ids)
+        recorder.append_step(step_time, step_ids, step_metrics, lats, lons, events=step_events)
+        if risk_accumulator is not None:
+            risk_accumulator.update(step_ids, step_metrics, step_events)
+    tracked = None
     if vehicles != None:
         vehicles_remaining = set(vehicles)
         vehicles_in_progress = set()
+        tracked = set(vehicles)
+
+    # Vehicles already in the network (e.g. from a loaded state) never show up as departed
+    if collection_mode == "subscribe":
+        subscribe_tracked_vehicles(sumo.vehicle.getIDList(), tracked)
 
     # Run the simulation, iterating over each step
-    # while traci.simulation.getMinExpectedNumber() > 0: # until all vehicles have left the network
+    # while sumo.simulation.getMinExpectedNumber() > 0: # until all vehicles have left the network
     for step in range(simulation_time): # run for SIMULATION_TIME seconds
-        traci.simulationStep()
-        current_time = float(traci.simulation.getTime())
+        profiler.start_step()
+        sumo.simulationStep()
+        profiler.mark("simulation_step")
+        current_time = float(sumo.simulation.getTime())
         if step % save_interval == 0:
             print(f"LOG: Simulated {current_time} seconds...")
-        vehicle_ids = traci.vehicle.getIDList()
+        vehicle_ids = sumo.vehicle.getIDList()
 
         if vehicles != None:
             vehicle_ids = [v for v in vehicle_ids if v in vehicles_remaining]
 
+        # Queue the collisions that happened during this step
+        events.add_collisions(sumo.simulation.getCollisions())
+
+        # Subscribe newly departed vehicles so their metrics arrive with the step
+        if collection_mode == "subscribe":
+            subscribe_tracked_vehicles(sumo.simulation.getDepartedIDList(), tracked)
+            subscription_results = sumo.vehicle.getAllSubscriptionResults()
+
+        # Apply the recording policy before fetching any metrics
+        recorded_ids = vehicle_ids
+        if recording_policy is not None:
+            if collection_mode == "subscribe":
+                get_position = lambda v: subscription_results[v][tc.VAR_POSITION] if v in subscription_results else sumo.vehicle.getPosition(v)
+            else:
+                get_position = sumo.vehicle.getPosition
+            recorded_ids = recording_policy.select(step, vehicle_ids, sumo.vehicle.getTypeID, get_position)
+
         # Extract vehicle metrics
-        for vehicle_id in vehicle_ids:
-            try:
-                speed = traci.vehicle.getSpeed(vehicle_id)
-                acceleration = traci.vehicle.getAcceleration(vehicle_id)
-                x, y = traci.vehicle.getPosition(vehicle_id)
-                lat, lon = sumo_to_latlon(x, y, net_offset_x, net_offset_y, proj_string)
-                lane_id = traci.vehicle.getLaneID(vehicle_id)
-                speed_limit = traci.lane.getMaxSpeed(lane_id)
-                
-                leader_info = traci.vehicle.getLeader(vehicle_id)
-                if leader_info:
-                    _, headway_distance = leader_info
-                    time_gap = headway_distance / speed if speed > 0 else None
-                else:
-                    headway_distance, time_gap = None, None
-            except Exception as e:
-                print(f"Error processing vehicle {vehicle_id}: {e} at time {current_time}!")
-                speed = acceleration = lat = lon = lane_id = headway_distance = time_gap = speed_limit = None
-
-            data_rows.append({
-                'Time': current_time,
-                'Vehicle_ID': vehicle_id,
-                'Speed': speed,
-                'Acceleration': acceleration,
-                'Latitude': lat,
-                'Longitude': lon,
-                'Lane': lane_id,
-                'Headway_Distance': headway_distance,
-                'Time_Gap': time_gap,
-                'Speed_Limit': speed_limit
-            })
+        step_metrics = []
+        step_positions = []
+        for vehicle_id in recorded_ids:
+            if collection_mode == "subscribe" and vehicle_id in subscription_results:
+                metrics, position = read_subscribed_metrics(vehicle_id, subscription_results[vehicle_id], current_time)
+            else:
+                metrics, position = poll_vehicle_metrics(vehicle_id, current_time)
+            step_metrics.append(metrics)
+            step_positions.append(position)
+
+        # Queue the lane changes of the recorded vehicles since their previous observed step. In subscribe mode the lanes of
+        # vehicles recorded before arrive with the step's results, so steps skipped by the policy are observed without queries
+        observed_ids, observed_lanes = recorded_ids, [metrics[2] for metrics in step_metrics]
+        if recording_policy is not None and collection_mode == "subscribe":
+            recorded = set(recorded_ids)
+            skipped_ids = [v for v in events.tracked_vehicles() if v not in recorded and v in subscription_results]
+            observed_ids = list(recorded_ids) + skipped_ids
+            observed_lanes = observed_lanes + [subscription_results[v][tc.VAR_LANE_ID] for v in skipped_ids]
+        events.observe_lanes(step, observed_ids, observed_lanes, sumo.vehicle.getLaneChangeState)
+        profiler.mark("collection")
+
+        # Project all positions for the step in one call
+        lats, lons = project_step_positions(step_positions, net_offset_x, net_offset_y, proj_string)
+        profiler.mark("projection")
+
+        # Record the previous step column-wise now that the events SUMO stamps with its time are known,
+        # then drop the event and sampling state of vehicles that have left
+        if pending_step is not None:
+            record_step(*pending_step)
+        arrived_ids = sumo.simulation.getArrivedIDList()
+        events.forget(arrived_ids)
+        if recording_policy is not None:
+            recording_policy.forget(arrived_ids)
+        pending_step = (current_time, recorded_ids, step_metrics, lats, lons)
+        profiler.mark("recording")
 
         # Save state and chunk data
         if vehicles == None and step % save_interval == 0 and step != 0:
-            traci.simulation.saveState(output_path.replace('.csv', '_state_file.xml'))
+            sumo.simulation.saveState(output_path.replace('.csv', '_state_file.xml'))
             print(f"Simulation state saved at step {step}")
             chunk_counter += 1
-            df_chunk = pd.DataFrame(data_rows)
             output_chunk_path = f"{output_path.replace('.csv', '')}_chunk_{chunk_counter}.csv"
-            df_chunk.to_csv(output_chunk_path, index=False, mode='w', header=chunk_counter == 1)
-            data_rows.clear()      
+            recorder.write_csv(output_chunk_path, header=chunk_counter == 1)
+        profiler.mark("chunk_write")
+        profiler.end_step(current_time, len(vehicle_ids), len(recorded_ids))
 
         # Check if all vehicles have left the network
         if vehicles != None:
+            present_ids = set(vehicle_ids)
             for vehicle_id in vehicles_in_progress.copy():
-                if vehicle_id not in vehicle_ids:
+                if vehicle_id not in present_ids:
                     vehicles_remaining.discard(vehicle_id)
                     vehicles_in_progress.discard(vehicle_id)
                     print(f"LOG: Vehicle {vehicle_id} has left the network.")
 
             for vehicle_id in vehicles_remaining.copy():
-                if vehicle_id not in vehicles_in_progress and vehicle_id in vehicle_ids:
+                if vehicle_id not in vehicles_in_progress and vehicle_id in present_ids:
                     vehicles_in_progress.add(vehicle_id)
                     print(f"LOG: Vehicle {vehicle_id} has entered the network.")
             
@@ -274,91 +514,148 @@ def simulate_and_extract_metrics(sumo_cfg, net_path, output_path, simulation_tim
                 print("LOG: All vehicles have left the network.")
                 break
 
-    traci.close()
+    # Record the last step; its events would only be seen after a step that is not simulated
+    if pending_step is not None:
+        record_step(*pending_step)
 
     # Save last chunk
-    if vehicles == None and data_rows:
-        df_chunk = pd.DataFrame(data_rows)
+    write_start = time.perf_counter()
+    vehicle_data = recorder.to_frame()
+    if vehicles == None and len(recorder):
         output_chunk_path = f"{output_path.replace('.csv', '')}_chunk_{chunk_counter + 1}.csv"
-        df_chunk.to_csv(output_chunk_path, index=False, mode='w', header=chunk_counter == 0)
+        vehicle_data.to_csv(output_chunk_path, index=False, mode='w', header=chunk_counter == 0)
+    elif trip_output_paths is not None:
+        save_trip_outputs(vehicle_data, trip_output_paths)
     else:
-        pd.DataFrame(data_rows).to_csv(output_path, index=False)
+        vehicle_data.to_csv(output_path, index=False)
+    profiler.record("final_write", time.perf_counter() - write_start)
 
-    return pd.DataFrame(data_rows)
+    return vehicle_data
 
 
 ### ------------------------------ DATA MERGING ------------------------------ ###
-def merge_additional_data(vehicle_data, lane_change_data, collision_data):
-    """
-    Merges lane change and collision data with real-time vehicle data.
-    """
-    # Merge lane change data
-    if lane_change_data.empty:
-        print("No lane change data found!")
-        merged_data = vehicle_data
-        merged_data['Lane_Change'] = False
-        merged_data['Lane_Change_Reason'] = 'None'
-    else:
-        print("Merging Lane Change Data!")
-        merged_data = pd.merge(vehicle_data, lane_change_data, how='left', on=['Time', 'Vehicle_ID'])
-        merged_data['Lane_Change_Reason'] = merged_data['Lane_Change_Reason'].fillna('None')
-        merged_data['Lane_Change'] = merged_data['From_Lane'].notna()
-        merged_data = merged_data.drop(['From_Lane', 'To_Lane'], axis=1)
-    
-    # Merge collision data
-    if collision_data.empty:
-        print("No collision data found!")
-        merged_data['Collision'] = False
-    else:
-        print("Merging collision data!")
-        merged_data = pd.merge(merged_data, collision_data, how='left', on=['Time', 'Vehicle_ID'])
-        merged_data['Collision'] = merged_data['Collision'].fillna(False)
-    
-    return merged_data
-
-def add_vehicle(start, end, vehicle_type, vehicle_behavior):
+def add_vehicle(start, end, vehicle_type, vehicle_behavior, vehicle_id=None, depart="now"):
     """
     Adds a vehicle to the simulation.
     """
     # Get the route ID
     route_id = f"route_{start}_{end}"
-    if route_id not in traci.route.getIDList():
-        traci.route.add(route_id, [start, end])
+    if route_id not in sumo.route.getIDList():
+        sumo.route.add(route_id, [start, end])
     
     # Get the vehicle ID and type
-    vehicle_id = f"{vehicle_type}_{time.time()}"
+    vehicle_id = vehicle_id or f"{vehicle_type}_{time.time()}"
     typeID = f"{vehicle_type}_{vehicle_behavior}" if vehicle_behavior != "" else vehicle_type
     # Add the vehicle
-    traci.vehicle.add(vehicle_id, route_id, typeID=typeID, departLane="best", departSpeed="avg", departPos="last")
+    sumo.vehicle.add(vehicle_id, route_id, typeID=typeID, depart=depart, departLane="best", departSpeed="avg", departPos="last")
     
     return vehicle_id
 
-def merge_output_chunks_and_save(output_path):
+
+def add_trips(trips, net_path, net_offset_x, net_offset_y, proj_string, depart_interval=1.0):
+    """
+    Adds one vehicle per trip, departing depart_interval seconds apart from the current simulation time.
+    Trips that cannot be added are skipped. Returns {vehicle_id: output_path} in trip order.
     """
-    Merges multiple CSV chunk files into a single CSV file.
+    current_time = float(sumo.simulation.getTime())
+    batch_id = time.time()
+    trip_output_paths = {}
+    for i, trip in enumerate(trips):
+        start_point, end_point = trip['start_point'], trip['end_point']
+        try:
+            nearest_start_edge = get_nearest_edge(start_point[0], start_point[1], net_path, net_offset_x, net_offset_y, proj_string)
+            nearest_end_edge = get_nearest_edge(end_point[0], end_point[1], net_path, net_offset_x, net_offset_y, proj_string)
+            depart = "now" if i == 0 or depart_interval == 0 else str(current_time + i * depart_interval)
+            vehicle_id = add_vehicle(nearest_start_edge, nearest_end_edge, trip['vehicle_type'], trip['vehicle_behavior'],
+                                     vehicle_id=f"{trip['vehicle_type']}_{batch_id}_{i}", depart=depart)
+        except Exception as e:
+            print(f"LOG: !ERROR! Trip {i} from {start_point} to {end_point} could not be added: {e}")
+            continue
+        trip_output_paths[vehicle_id] = trip['output_path']
+    print(f"LOG: Added {len(trip_output_paths)} of {len(trips)} trips departing every {depart_interval:g}s.")
+    return trip_output_paths
+
+
+def save_trip_outputs(vehicle_data, trip_output_paths):
+    """
+    Splits the data of a trip batch by vehicle and saves each trip to its own output path.
+    Trips whose vehicle never departed get no file.
+    """
+    vehicle_ids = vehicle_data['Vehicle_ID'].astype(str)
+    for vehicle_id, trip_data in vehicle_data.groupby(vehicle_ids, sort=False):
+        output_path = trip_output_paths.get(vehicle_id)
+        if output_path is not None:
+            trip_data.to_csv(output_path, index=False)
+    saved = len(set(vehicle_ids) & set(trip_output_paths))
+    print(f"LOG: Saved {saved} of {len(trip_output_paths)} trips.")
+
+def find_chunk_files(output_path):
+    """
+    Returns the chunk files written for an output path, in chunk order.
     """
     output_dir = os.path.dirname(output_path)
     base_filename = os.path.basename(output_path).replace(".csv", "")
+    return sorted(glob.glob(os.path.join(output_dir, f"{base_filename}_chunk_*.csv")), key=lambda x: int(x.rsplit("_", 1)[-1].split(".")[0]))
 
-    # Find all chunk files that match the pattern: vehicle_data_chunk_*.csv
-    chunk_files = sorted(glob.glob(os.path.join(output_dir, f"processed_{base_filename}_chunk_*.csv")), key=lambda x: int(x.rsplit("_", 1)[-1].split(".")[0]))
 
+def merge_chunks_and_save(output_path, run_id=None, merged_path=None):
+    """
+    Streams every vehicle data chunk once and appends its rows to output_path.
+    Chunks already carry the event columns, so rows are copied as text without parsing them.
+    Ensemble runs pass a run_id (written as a leading Run_ID column) and a separate merged_path.
+    """
+    merged_path = merged_path or output_path
+
+    chunk_files = find_chunk_files(output_path)
     if not chunk_files:
-        print("No chunk files found. Returning empty DataFrame.")
-        return pd.DataFrame()
+        print("No chunk files found.")
+        return 0
+
+    print(f"Merging {len(chunk_files)} Chunks!")
+    prefix = "" if run_id is None else f"{run_id},"
+    total_rows = 0
+    with open(merged_path, 'w', newline='') as f_out:
+        for i, chunk_file in enumerate(chunk_files):
+            print(f"Chunk: {chunk_file}")
+            with open(chunk_file, newline='') as f_in:
+                # Only the first chunk is written with a header row
+                if i == 0:
+                    f_out.write(("" if run_id is None else "Run_ID,") + f_in.readline())
+                for line in f_in:
+                    f_out.write(prefix + line)
+                    total_rows += 1
+
+    print(f"Merged output saved to {merged_path}")
+    return total_rows
 
-    print(f"Merging {len(chunk_files)} chunk files...")
 
-    # Read and concatenate all chunk files
-    dataframes = [pd.read_csv(chunk) for chunk in chunk_files]
-    print(f"Chunks loaded, concatenating chunks!")
-    merged_df = pd.concat(dataframes, ignore_index=True)
+def get_dynamic_output_path(results_dir_path, vehicle_type, vehicle_behavior, trip_index=None):
+    """
+    Returns the timestamped output path for a dynamic vehicle run in results/dynamic/.
+    Trips of a batch share the timestamp and are told apart by a zero-padded trip index.
+    """
+    if vehicle_behavior == "":
+        behavior_name = "normal"
+    else:
+        behavior_name = vehicle_behavior
+    trip_suffix = "" if trip_index is None else f"_trip{trip_index:04d}"
+    return os.path.join(results_dir_path, "dynamic", "vehicle_data_" +  vehicle_type + "_" + behavior_name + "_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + trip_suffix + ".csv")
 
-    # Save merged file
-    merged_df.to_csv(output_path, index=False)
-    print(f"Merged output saved to {output_path}")
 
-    return merged_df
+def load_trips(trips_file):
+    """
+    Reads a trip batch from a JSON file: a list of {start_point, end_point, vehicle_type, vehicle_behavior}.
+    Points are [lat, lon] pairs; vehicle types and behaviors use the same names as --vehicle_type and --behavior.
+    A trip may set its own output_path, otherwise it gets a dynamic/ path with its trip index.
+    """
+    with open(trips_file) as f:
+        trips = json.load(f)
+    for i, trip in enumerate(trips):
+        missing = {'start_point', 'end_point', 'vehicle_type'} - set(trip)
+        if missing:
+            raise ValueError(f"Trip {i} is missing {', '.join(sorted(missing))}")
+        trip.setdefault('vehicle_behavior', "")
+    return trips
 
 
 ### ------------------------------ MAIN ------------------------------ ###
@@ -370,11 +667,62 @@ if __name__ == "__main__":
     parser.add_argument("--end_point", type=str, default="None", help="Ending point of the route.")
     parser.add_argument("--vehicle_type", type=str, default="veh_passenger", help="Type of vehicle to add to the simulation.")
     parser.add_argument("--behavior", type=str, default="", help="Behavior of the vehicle.")
+    parser.add_argument("--trips", type=str, default="None", help="JSON file with a list of dynamic trips to simulate together in one run.")
+    parser.add_argument("--depart_interval", type=float, default=1.0, help="Seconds between the departures of consecutive --trips.")
     parser.add_argument("--state_file", type=str, default="None", help="Path to previous save state file.")
+    parser.add_argument("--depart_time", type=float, default=None, help="Simulated departure time; starts from the nearest traffic snapshot.")
+    parser.add_argument("--collection_mode", type=str, default="poll", choices=COLLECTION_MODES, help="How vehicle metrics are fetched from TraCI.")
+    parser.add_argument("--sumo_interface", type=str, default="None", choices=SUMO_INTERFACES, help="Run SUMO in-process (libsumo) or over a TraCI socket (default: libsumo, traci with --gui).")
+    parser.add_argument("--gui", type=bool, default=False, help="Run in sumo-gui (requires the traci interface).")
+    parser.add_argument("--risk_summary", type=bool, default=False, help="Count per-vehicle risk features during the run and save the summary.")
+    parser.add_argument("--bbox", type=str, default="None", help="Only record vehicles inside '(min_lat, min_lon, max_lat, max_lon)'.")
+    parser.add_argument("--polygon", type=str, default="None", help="Only record vehicles inside '[(lat, lon), ...]'.")
+    parser.add_argument("--type_fractions", type=str, default="None", help="Fraction of vehicles recorded per type, e.g. \"{'veh_passenger': 0.1}\".")
+    parser.add_argument("--sample_fraction", type=float, default=1.0, help="Fraction of vehicles recorded for types not in --type_fractions.")
+    parser.add_argument("--sample_seed", type=int, default=0, help="Seed of the vehicle sampling hash.")
+    parser.add_argument("--record_interval", type=int, default=1, help="Record every n-th simulation step.")
+    parser.add_argument("--traci_record", type=str, default="None", help="Capture the run's TraCI responses to this log file (gzip-compressed JSON lines).")
+    parser.add_argument("--traci_replay", type=str, default="None", help="Replay a captured TraCI log instead of running SUMO.")
+    parser.add_argument("--profile", type=bool, default=False, help="Record per-step phase timings, vehicle counts and RSS, and print a summary.")
+    parser.add_argument("--extraction_backend", type=str, default="traci", choices=EXTRACTION_BACKENDS, help="Poll vehicles through TraCI or parse SUMO's native FCD output (static runs only).")
 
     args = parser.parse_args()
+    if args.dynamic and args.trips != "None":
+        parser.error("Use either --dynamic or --trips, not both.")
+    if args.extraction_backend == "fcd" and (args.dynamic or args.trips != "None"):
+        parser.error("The fcd extraction backend only supports static runs.")
+    if args.risk_summary and args.extraction_backend == "fcd":
+        parser.error("--risk_summary is only available with the traci extraction backend.")
+    if args.profile and args.extraction_backend == "fcd":
+        parser.error("--profile is only available with the traci extraction backend.")
+    if args.bbox != "None" and args.polygon != "None":
+        parser.error("Use either --bbox or --polygon, not both.")
+    if args.gui and args.sumo_interface == "libsumo":
+        parser.error("--gui requires --sumo_interface traci.")
+    sumo_interface = None if args.sumo_interface == "None" else args.sumo_interface
+    if args.extraction_backend == "fcd" and (args.traci_record != "None" or args.traci_replay != "None"):
+        parser.error("TraCI recording and replay are only available with the traci extraction backend.")
+    if args.traci_record != "None" and args.traci_replay != "None":
+        parser.error("Use either --traci_record or --traci_replay, not both.")
+    record_log = args.traci_record if args.traci_record != "None" else None
+    replay_log = args.traci_replay if args.traci_replay != "None" else None
     dynamic = args.dynamic
+    trips = load_trips(args.trips) if args.trips != "None" else None
     state_file = args.state_file
+    collection_mode = args.collection_mode
+
+    # Build the recording policy if any recording option differs from recording everything
+    recording_policy = None
+    policy_options = dict(type_fractions=ast.literal_eval(args.type_fractions) if args.type_fractions != "None" else None,
+                          default_fraction=args.sample_fraction, step_interval=args.record_interval, seed=args.sample_seed)
+    if args.bbox != "None":
+        recording_policy = RecordingPolicy.from_bbox(*ast.literal_eval(args.bbox), **policy_options)
+    elif args.polygon != "None":
+        recording_policy = RecordingPolicy(region=ast.literal_eval(args.polygon), **policy_options)
+    elif policy_options['type_fractions'] or args.sample_fraction < 1.0 or args.record_interval > 1:
+        recording_policy = RecordingPolicy(**policy_options)
+    if recording_policy is not None and args.extraction_backend == "fcd":
+        parser.error("Recording policies are only available with the traci extraction backend.")
 
     # Set default values
     if dynamic:
@@ -399,56 +747,63 @@ if __name__ == "__main__":
 
     sumocfg_file = "osm.sumocfg"
     net_file = "osm.net.xml.gz"
-    lanechange_file = "lanechange_output.xml"
-    collision_file = "collision_output.xml"
 
     sumocfg_path = os.path.join(configs_dir_path, sumocfg_file)
     net_path = os.path.join(configs_dir_path, net_file)
-    lanechange_path = os.path.join(results_dir_path, lanechange_file)
-    collision_path = os.path.join(results_dir_path, collision_file)
+
+    # Start dynamic runs from the traffic snapshot nearest to the departure time
+    if (dynamic or trips) and args.depart_time is not None and state_file == "None":
+        from snapshot_library import find_snapshot, get_snapshot_dir
+        state_file = find_snapshot(get_snapshot_dir(MAP), net_path, args.depart_time) or "None"
 
     # Set output path
     vehicles = None
     if dynamic:
-        if vehicle_behavior == "":
-            behavior_name = "normal"
-        else:
-            behavior_name = vehicle_behavior
-        output_path = os.path.join(results_dir_path, "dynamic", "vehicle_data_" +  vehicle_type + "_" + behavior_name + "_" + datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S") + ".csv")
+        output_path = get_dynamic_output_path(results_dir_path, vehicle_type, vehicle_behavior)
+    elif trips:
+        # Each trip is saved to its own dynamic/ file; the batch path only names the profile and risk summary
+        os.makedirs(os.path.join(results_dir_path, "dynamic"), exist_ok=True)
+        for i, trip in enumerate(trips):
+            if 'output_path' not in trip:
+                trip['output_path'] = get_dynamic_output_path(results_dir_path, trip['vehicle_type'], trip['vehicle_behavior'], trip_index=i)
+        output_path = get_dynamic_output_path(results_dir_path, "batch", "")
     elif vehicles == None:
         output_path = os.path.join(results_dir_path, "vehicle_data.csv")
     else:
         output_path = os.path.join(results_dir_path, "vehicle_data_" + str(vehicles) + ".csv")
     
     # Run simulation
-    vehicle_data = simulate_and_extract_metrics(sumocfg_path, net_path, output_path, simulation_time=2100, vehicles=vehicles, 
-                                                dynamic=dynamic, start_point=start_point, end_point=end_point, vehicle_type=vehicle_type, 
-                                                vehicle_behavior=vehicle_behavior, state_file=state_file)
-
-    # Extract lane change and collision data
-    lanechange_data = extract_lane_change_data(lanechange_path)
-    collision_data = extract_collision_data(collision_path)
-
-    # Merge lane change and collision data
-    if not dynamic and vehicles == None:
-        output_dir = os.path.dirname(output_path)
-        base_filename = os.path.basename(output_path).replace(".csv", "")
-
-        # Find all chunk files that match the pattern: vehicle_data_chunk_*.csv
-        print("Getting Chunk Files!")
-        chunk_files = sorted(glob.glob(os.path.join(output_dir, f"{base_filename}_chunk_*.csv")), key=lambda x: int(x.rsplit("_", 1)[-1].split(".")[0]))
-        print(f"Adding Lane Change and Collision Data to {len(chunk_files)} Chunks!")
-        for chunk_file in chunk_files:
-            print(f"Chunk: {chunk_file}")
-            df_chunk = pd.read_csv(chunk_file)
-            df_chunk.columns = ['Time', 'Vehicle_ID', 'Speed', 'Acceleration', 'Latitude', 'Longitude',
-                                'Lane', 'Headway_Distance', 'Time_Gap', 'Speed_Limit']
-            df_chunk = merge_additional_data(df_chunk, lanechange_data, collision_data)
-            df_chunk.to_csv(os.path.join(output_dir, f"processed_{os.path.basename(chunk_file)}"), index=False)
-        print('Merging processed chunks!')
-        vehicle_data = merge_output_chunks_and_save(output_path)
+    risk_accumulator = RiskAccumulator(load_network_index(net_path)) if args.risk_summary else None
+    profiler = StepProfiler() if args.profile else None
+    if args.extraction_backend == "fcd":
+        simulate_and_extract_fcd(sumocfg_path, net_path, output_path, simulation_time=2100)
     else:
-        vehicle_data = merge_additional_data(vehicle_data, lanechange_data, collision_data)
-        vehicle_data.to_csv(output_path, index=False)
-
-    print(f"Vehicle data saved to {output_path}!")
\ No newline at end of file
+        simulate_and_extract_metrics(sumocfg_path, net_path, output_path, simulation_time=2100, vehicles=vehicles, 
+                                                    dynamic=dynamic, start_point=start_point, end_point=end_point, vehicle_type=vehicle_type, 
+                                                    vehicle_behavior=vehicle_behavior, state_file=state_file,
+                                                    collection_mode=collection_mode, interface=sumo_interface, gui=args.gui,
+                                                    risk_accumulator=risk_accumulator, recording_policy=recording_policy,
+                                                    profiler=profiler, record_log=record_log, replay_log=replay_log,
+                                                    trips=trips, depart_interval=args.depart_interval)
+
+    # Save the step profile and print where the loop spent its time
+    if profiler is not None:
+        profiler.save(output_path.replace('.csv', '_profile.npz'))
+        print_summary(summarize(profiler.arrays(), profiler.extra))
+
+    # Save the per-vehicle risk features counted during the run
+    if risk_accumulator is not None:
+        risk_features_path = output_path.replace('.csv', '_risk_features.csv')
+        risk_accumulator.to_frame().to_csv(risk_features_path, index=False)
+        print(f"Risk features of {len(risk_accumulator)} vehicles saved to {risk_features_path}!")
+
+    # Lane change and collision columns are recorded with every row, so the chunks only need concatenating
+    if trips:
+        saved_paths = [trip['output_path'] for trip in trips if os.path.exists(trip['output_path'])]
+        print(f"Vehicle data of {len(saved_paths)} trips saved to {os.path.dirname(output_path)}!")
+    elif not dynamic and vehicles == None:
+        # Stream every vehicle_data_chunk_*.csv once into the final output
+        merge_chunks_and_save(output_path)
+        print(f"Vehicle data saved to {output_path}!")
+    else:
+        print(f"Vehicle data saved to {output_path}!")
\ No newline at end of file
@@ -0,0 +1,241 @@
+import gzip
+import json
+import collections
+from traci.exceptions import TraCIException
+
+LOG_VERSION = 2
+
+# Top-level interface functions; every other attribute of traci/libsumo is a domain (vehicle, simulation, ...)
+CONTROL_FUNCTIONS = ("start", "load", "simulationStep", "close")
+
+# libsumo returns SWIG objects for collisions; they are logged as plain tuples with the same attributes
+Collision = collections.namedtuple("Collision", ["collider", "victim", "colliderType", "victimType",
+                                                 "colliderSpeed", "victimSpeed", "type", "lane", "pos"])
+
+
+def freeze(value):
+    """
+    Turns call arguments into a hashable lookup key (lists become tuples, dicts sorted item tuples).
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    return value
+
+
+def call_key(domain, method, args, kwargs):
+    return domain, method, freeze(args), freeze(kwargs) if kwargs else ()
+
+
+def portable_result(method, result):
+    """
+    Converts interface-specific result objects to plain Python equivalents.
+    """
+    if method == "getCollisions":
+        return tuple(Collision(*(getattr(c, field) for field in Collision._fields)) for c in result)
+    return result
+
+
+def encode(value):
+    """
+    Turns a response into JSON data that keeps what JSON itself loses: tuples, collisions and non-string dict keys
+    (e.g. the variable IDs of subscription results) are tagged as {"t": ...}, {"c": ...} and {"d": [[key, value], ...]}.
+    """
+    if isinstance(value, Collision):
+        return {"c": [encode(v) for v in value]}
+    if isinstance(value, tuple):
+        return {"t": [encode(v) for v in value]}
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, dict):
+        return {"d": [[encode(k), encode(v)] for k, v in value.items()]}
+    return value
+
+
+def decode(value):
+    """
+    Inverse of encode().
+    """
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if isinstance(value, dict):
+        if "t" in value:
+            return tuple(decode(v) for v in value["t"])
+        if "c" in value:
+            return Collision(*(decode(v) for v in value["c"]))
+        return {decode(k): decode(v) for k, v in value["d"]}
+    return value
+
+
+### ------------------------------ RECORDING ------------------------------ ###
+class RecordingDomain:
+    """
+    Forwards calls to a domain of the real interface and logs each call with its response.
+    """
+
+    def __init__(self, recorder, name, domain):
+        self._recorder = recorder
+        self._name = name
+        self._domain = domain
+
+    def __getattr__(self, method):
+        func = getattr(self._domain, method)
+        recorder, name = self._recorder, self._name
+
+        def call(*args, **kwargs):
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                recorder.calls.append((call_key(name, method, args, kwargs), True, str(e)))
+                raise
+            recorder.calls.append((call_key(name, method, args, kwargs), False, portable_result(method, result)))
+            return result
+
+        # Cache the wrapper so later calls skip __getattr__
+        setattr(self, method, call)
+        return call
+
+
+class TraciRecorder:
+    """
+    Wraps the traci or libsumo module and captures every response into a gzip-compressed JSON lines log:
+    a header line, then one line per simulation step listing its calls. Used in place of the interface module.
+    """
+
+    def __init__(self, interface, log_path):
+        self._interface = interface
+        self._log = gzip.open(log_path, "wt", compresslevel=6, encoding="utf-8")
+        self._domains = {}
+        self.calls = []
+        self.steps = 0
+        self.write_line({"version": LOG_VERSION, "interface": interface.__name__})
+
+    def write_line(self, data):
+        self._log.write(json.dumps(data, separators=(",", ":")) + "\n")
+
+    def __getattr__(self, name):
+        domain = self._domains.get(name)
+        if domain is None:
+            domain = self._domains[name] = RecordingDomain(self, name, getattr(self._interface, name))
+        return domain
+
+    def flush_step(self):
+        self.write_line([[key, is_error, encode(result)] for key, is_error, result in self.calls])
+        self.calls = []
+
+    def start(self, cmd, **kwargs):
+        return self._interface.start(cmd, **kwargs)
+
+    def load(self, args):
+        return self._interface.load(args)
+
+    def simulationStep(self, step=0.):
+        result = self._interface.simulationStep(step)
+        self.flush_step()
+        self.steps += 1
+        return result
+
+    def close(self):
+        try:
+            self._interface.close()
+        finally:
+            if not self._log.closed:
+                self.flush_step()
+                self._log.close()
+                print(f"LOG: Recorded TraCI responses of {self.steps} steps to {self._log.name}")
+
+
+### ------------------------------ REPLAY ------------------------------ ###
+class ReplayMissError(LookupError):
+    """
+    Raised when the pipeline makes a call the recorded run did not make at that step.
+    """
+
+
+class ReplayDomain:
+    """
+    Serves a domain's recorded responses for the current step.
+    """
+
+    def __init__(self, replay, name):
+        self._replay = replay
+        self._name = name
+
+    def __getattr__(self, method):
+        replay, name = self._replay, self._name
+
+        def call(*args, **kwargs):
+            return replay.respond(call_key(name, method, args, kwargs))
+
+        setattr(self, method, call)
+        return call
+
+
+class TraciReplay:
+    """
+    Stand-in for the traci/libsumo module that answers from a recorded log, so the extraction
+    loop runs without SUMO. Calls are looked up by (domain, method, arguments) within each step,
+    so a pipeline that makes fewer calls or calls in a different order still replays;
+    a call with the same arguments made repeatedly in a step is answered in recorded order.
+    Unrecorded calls that return no data (setters, saveState, subscribe, ...) are accepted.
+    The log is plain JSON data, so loading it never runs code from the file.
+    """
+
+    def __init__(self, log_path):
+        with gzip.open(log_path, "rt", encoding="utf-8") as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                # Not a JSON lines log, e.g. one pickled by version 1
+                header = {}
+            if header.get("version") != LOG_VERSION:
+                raise ValueError(f"Unsupported TraCI log version {header.get('version')} in {log_path}")
+            self.recorded_interface = header["interface"]
+            self.steps = []
+            for line in f:
+                responses = {}
+                for key, is_error, result in json.loads(line):
+                    # Keys were logged frozen, so freezing the decoded lists restores the same tuples
+                    responses.setdefault(freeze(key), []).append((is_error, decode(result)))
+                self.steps.append(responses)
+        self._domains = {}
+        self.step = 0
+        self.served = {}
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        domain = self._domains.get(name)
+        if domain is None:
+            domain = self._domains[name] = ReplayDomain(self, name)
+        return domain
+
+    def respond(self, key):
+        responses = self.steps[self.step].get(key)
+        if responses is None:
+            if not key[1].startswith("get"):
+                return None
+            raise ReplayMissError(f"No recorded response for {key[0]}.{key[1]}{key[2]} at step {self.step}")
+        # Repeated calls are answered in order, the last response is repeated once they run out
+        index = self.served.get(key, 0)
+        self.served[key] = index + 1
+        is_error, result = responses[min(index, len(responses) - 1)]
+        if is_error:
+            raise TraCIException(result)
+        return result
+
+    def start(self, cmd, **kwargs):
+        pass
+
+    def load(self, args):
+        pass
+
+    def simulationStep(self, step=0.):
+        if self.step + 1 >= len(self.steps):
+            raise ReplayMissError(f"The recorded run ends after {len(self.steps) - 1} steps")
+        self.step += 1
+        self.served = {}
+
+    def close(self):
+        pass
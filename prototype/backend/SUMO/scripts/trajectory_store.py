@@ -0,0 +1,344 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+STORE_VERSION = 1
+
+# Maximum absolute reconstruction error per column; other float columns are stored losslessly
+DEFAULT_ERROR_BOUNDS = {
+    'Speed': 0.01,
+    'Acceleration': 0.01,
+    'Latitude': 1e-6,
+    'Longitude': 1e-6,
+    'Headway_Distance': 0.01,
+    'Time_Gap': 0.01,
+    'Speed_Limit': 0.01,
+}
+
+# Time is quantized to milliseconds and always reconstructed exactly at that resolution
+TIME_SCALE = 1000.0
+
+# Each dropping round can at most double the longest interpolated span
+MAX_DROP_ROUNDS = 10
+
+
+### ------------------------------ FILE MANAGEMENT ------------------------------ ###
+def get_store_path(csv_path):
+    """
+    Returns the trajectory store path for a vehicle data CSV (vehicle_data.csv -> vehicle_data.traj.npz).
+    """
+    return csv_path[:-4] + '.traj.npz' if csv_path.endswith('.csv') else csv_path + '.traj.npz'
+
+
+def storable(values):
+    """
+    Converts an array of Python strings to a fixed-width string array so it can be saved without pickling.
+    """
+    values = np.asarray(values)
+    return values.astype(str) if values.dtype == object else values
+
+
+def smallest_int_dtype(values):
+    """
+    Returns the narrowest signed integer dtype that holds every value.
+    """
+    if len(values) == 0:
+        return np.int8
+    low, high = int(values.min()), int(values.max())
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return dtype
+    return np.int64
+
+
+### ------------------------------ ENCODING ------------------------------ ###
+def exact_changes(values):
+    """
+    Marks rows whose value differs from the previous row (NaN equals NaN).
+    """
+    changed = np.ones(len(values), dtype=bool)
+    if values.dtype.kind == 'f':
+        changed[1:] = ~((values[1:] == values[:-1]) | (np.isnan(values[1:]) & np.isnan(values[:-1])))
+    else:
+        changed[1:] = values[1:] != values[:-1]
+    return changed
+
+
+def interpolation_anchors(keep):
+    """
+    Returns, for every row, the nearest kept row at or before it, the nearest kept row at or after it
+    and its fractional position between the two.
+    """
+    kept = np.flatnonzero(keep)
+    rows = np.arange(len(keep))
+    right = kept[np.minimum(np.searchsorted(kept, rows), len(kept) - 1)]
+    left = kept[np.searchsorted(kept, rows, side='right') - 1]
+    span = right - left
+    fraction = np.where(span > 0, (rows - left) / np.maximum(span, 1), 0.0)
+    return left, right, fraction
+
+
+def rows_within_bounds(left, right, fraction, quantized, originals, scales, bounds):
+    """
+    Checks every row against the linear interpolation between its anchors, using dequantized anchor values.
+    """
+    ok = np.ones(len(left), dtype=bool)
+    for column, q in quantized.items():
+        valid = ~np.isnan(originals[column])
+        interpolated_valid = valid[left] & valid[right]
+        q_left, q_right = q[left].astype(np.float64), q[right].astype(np.float64)
+        if column == 'Time':
+            # Time must round back to the exact quantized value
+            interpolated = np.rint(q_left + (q_right - q_left) * fraction)
+            ok &= interpolated == q
+            continue
+        interpolated = (q_left + (q_right - q_left) * fraction) / scales[column]
+        with np.errstate(invalid='ignore'):
+            close = np.abs(interpolated - originals[column]) <= bounds[column]
+        ok &= (valid == interpolated_valid) & (~valid | close)
+    return ok
+
+
+def select_rows(mandatory, quantized, originals, scales, bounds):
+    """
+    Drops rows that are linearly predictable from the kept rows around them within the error bounds.
+    Each round tries to drop every other kept row and keeps only drops whose whole span stays within bounds,
+    so all rounds are vectorized over the full table.
+    """
+    keep = np.ones(len(mandatory), dtype=bool)
+    for _ in range(MAX_DROP_ROUNDS):
+        kept = np.flatnonzero(keep)
+        candidates = kept[1::2]
+        candidates = candidates[~mandatory[candidates]]
+        if len(candidates) == 0:
+            break
+
+        trial = keep.copy()
+        trial[candidates] = False
+        left, right, fraction = interpolation_anchors(trial)
+        ok = rows_within_bounds(left, right, fraction, quantized, originals, scales, bounds)
+
+        # A candidate is dropped only if every row in its new span (anchor up to the next kept row) is within bounds
+        trial_kept = np.flatnonzero(trial)
+        span_ok = np.logical_and.reduceat(ok, trial_kept)
+        accepted = span_ok[np.searchsorted(trial_kept, candidates) - 1]
+        if not accepted.any():
+            break
+        keep[candidates[accepted]] = False
+    return keep
+
+
+def encode_trajectories(df, error_bounds=None):
+    """
+    Encodes a vehicle data table into compact arrays grouped by vehicle.
+    Bounded float columns are quantized and delta-encoded per vehicle, other columns are stored exactly,
+    and rows that linear interpolation reproduces within the bounds are dropped.
+    Returns (metadata, arrays).
+    """
+    bounds = dict(DEFAULT_ERROR_BOUNDS if error_bounds is None else error_bounds)
+    columns = list(df.columns)
+
+    # Group rows by vehicle (in order of first appearance), then by time
+    vehicle_codes, vehicle_values = pd.factorize(df['Vehicle_ID'], sort=False)
+    order = np.lexsort((df['Time'].to_numpy(dtype=np.float64), vehicle_codes))
+    vehicle_codes = vehicle_codes[order]
+    n = len(order)
+
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = vehicle_codes[1:] != vehicle_codes[:-1]
+    ends = np.ones(n, dtype=bool)
+    ends[:-1] = starts[1:]
+
+    quantized, originals, scales = {}, {}, {}
+    exact = {}
+    mandatory = starts | ends
+    for column in columns:
+        if column == 'Vehicle_ID':
+            continue
+        values = df[column].to_numpy()[order]
+        if column == 'Time' or (column in bounds and values.dtype.kind in 'fiu'):
+            values = values.astype(np.float64)
+            scales[column] = TIME_SCALE if column == 'Time' else 1.0 / bounds[column]
+            originals[column] = values
+            quantized[column] = np.rint(np.nan_to_num(values) * scales[column]).astype(np.int64)
+        else:
+            exact[column] = values
+            mandatory |= exact_changes(values) if values.dtype != object else exact_changes(pd.factorize(values)[0])
+
+    bounds['Time'] = 0.5 / TIME_SCALE
+    keep = select_rows(mandatory, quantized, originals, scales, bounds)
+    kept = np.flatnonzero(keep)
+
+    # Rows dropped after each kept row; a vehicle's last row is always kept
+    skips = np.diff(np.append(kept, n)) - 1
+    kept_starts = starts[kept]
+    vehicle_offsets = np.append(np.flatnonzero(kept_starts), len(kept))
+
+    # Vehicles are stored in order of first appearance, one kept-row range each
+    arrays = {
+        'vehicle_ids': storable(vehicle_values),
+        'vehicle_offsets': vehicle_offsets.astype(np.int64),
+    }
+    arrays['skips'] = skips.astype(smallest_int_dtype(skips))
+
+    column_meta = {}
+    for column, q in quantized.items():
+        valid = ~np.isnan(originals[column][kept])
+        q = q[kept]
+        # Hold the last valid value through gaps so deltas stay small
+        if not valid.all():
+            positions = np.where(valid | kept_starts, np.arange(len(q)), 0)
+            q = q[np.maximum.accumulate(positions)]
+            arrays[f'valid_{column}'] = np.packbits(valid)
+        deltas = np.diff(q, prepend=0)
+        arrays[f'first_{column}'] = q[kept_starts]
+        deltas[kept_starts] = 0
+        arrays[f'delta_{column}'] = deltas.astype(smallest_int_dtype(deltas))
+        column_meta[column] = {'kind': 'quantized', 'scale': scales[column], 'bound': bounds[column],
+                               'has_nan': bool(not valid.all())}
+
+    for column, values in exact.items():
+        values = values[kept]
+        if values.dtype == bool:
+            arrays[f'bits_{column}'] = np.packbits(values)
+            column_meta[column] = {'kind': 'bool'}
+        elif values.dtype.kind in 'fiu':
+            arrays[f'raw_{column}'] = values
+            column_meta[column] = {'kind': 'raw'}
+        else:
+            codes, categories = pd.factorize(values, sort=False)
+            arrays[f'codes_{column}'] = codes.astype(smallest_int_dtype(codes))
+            arrays[f'categories_{column}'] = storable(categories)
+            column_meta[column] = {'kind': 'categorical'}
+
+    metadata = {
+        'version': STORE_VERSION,
+        'columns': columns,
+        'rows': int(n),
+        'kept_rows': int(len(kept)),
+        'column_encoding': column_meta,
+    }
+    return metadata, arrays
+
+
+def write_trajectories(df, store_path, error_bounds=None):
+    """
+    Encodes a vehicle data table and saves it as a compressed .npz store.
+    """
+    metadata, arrays = encode_trajectories(df, error_bounds=error_bounds)
+    tmp_path = store_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez_compressed(f, metadata=np.asarray(json.dumps(metadata)), **arrays)
+    os.replace(tmp_path, store_path)
+    return metadata
+
+
+### ------------------------------ DECODING ------------------------------ ###
+def decode_trajectories(metadata, arrays, vehicle_ids=None, sort_by_time=True):
+    """
+    Rebuilds the vehicle data table from encoded arrays, interpolating dropped rows.
+    Rows come back ordered by time (ties in order of the vehicles' first appearance), or grouped by vehicle.
+    """
+    columns = metadata['columns']
+    offsets = arrays['vehicle_offsets']
+    skips = arrays['skips'].astype(np.int64)
+    n_kept = len(skips)
+
+    # Which kept rows to decode
+    vehicle_index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    selected = np.ones(n_kept, dtype=bool)
+    if vehicle_ids is not None:
+        wanted = np.isin(arrays['vehicle_ids'].astype(str), [str(v) for v in vehicle_ids])
+        selected = wanted[vehicle_index]
+    kept_starts = np.zeros(n_kept, dtype=bool)
+    kept_starts[offsets[:-1]] = True
+
+    # Output positions of kept rows and of the rows interpolated after each of them
+    dropped_counts = np.where(selected, skips, 0)
+    sizes = np.where(selected, skips + 1, 0)
+    kept_positions = np.cumsum(sizes) - sizes
+    n_out = int(sizes.sum())
+    dropped_left = np.repeat(np.arange(n_kept), dropped_counts)
+    step_in_span = np.arange(len(dropped_left)) - np.repeat(np.cumsum(dropped_counts) - dropped_counts, dropped_counts) + 1
+    fraction = step_in_span / (skips[dropped_left] + 1)
+    dropped_positions = kept_positions[dropped_left] + step_in_span
+    kept_rows = np.flatnonzero(selected)
+
+    def expand(kept_values, interpolated):
+        out = np.empty(n_out, dtype=kept_values.dtype)
+        out[kept_positions[kept_rows]] = kept_values[kept_rows]
+        out[dropped_positions] = interpolated
+        return out
+
+    data = {}
+    vehicle_values = arrays['vehicle_ids'].astype(object)[vehicle_index]
+    data['Vehicle_ID'] = expand(vehicle_values, vehicle_values[dropped_left])
+
+    for column, encoding in metadata['column_encoding'].items():
+        kind = encoding['kind']
+        if kind == 'quantized':
+            deltas = arrays[f'delta_{column}'].astype(np.int64)
+            deltas[kept_starts] = arrays[f'first_{column}']
+            totals = np.cumsum(deltas)
+            q = totals - np.repeat(totals[kept_starts] - deltas[kept_starts], np.diff(offsets))
+            q_left, q_right = q[dropped_left].astype(np.float64), q[dropped_left + 1].astype(np.float64)
+            interpolated_q = q_left + (q_right - q_left) * fraction
+            if column == 'Time':
+                interpolated_q = np.rint(interpolated_q)
+            values = expand(q.astype(np.float64), interpolated_q) / encoding['scale']
+            if encoding['has_nan']:
+                valid = np.unpackbits(arrays[f'valid_{column}'], count=n_kept).astype(bool)
+                values[~expand(valid, valid[dropped_left] & valid[dropped_left + 1])] = np.nan
+        elif kind == 'bool':
+            bits = np.unpackbits(arrays[f'bits_{column}'], count=n_kept).astype(bool)
+            values = expand(bits, bits[dropped_left])
+        elif kind == 'raw':
+            raw = arrays[f'raw_{column}']
+            values = expand(raw, raw[dropped_left])
+        else:
+            codes = arrays[f'codes_{column}'].astype(np.int64)
+            categories = np.append(arrays[f'categories_{column}'].astype(object), np.nan)
+            values = categories[expand(codes, codes[dropped_left])]
+        data[column] = values
+
+    df = pd.DataFrame(data, columns=columns)
+    if sort_by_time:
+        df = df.sort_values('Time', kind='stable').reset_index(drop=True)
+    return df
+
+
+def read_trajectories(store_path, vehicle_ids=None, sort_by_time=True):
+    """
+    Loads a trajectory store into the vehicle data DataFrame, optionally only for some vehicles.
+    """
+    with np.load(store_path, allow_pickle=False) as data:
+        metadata = json.loads(str(data['metadata']))
+        if metadata.get('version') != STORE_VERSION:
+            raise ValueError(f"Unsupported trajectory store version in {store_path}: {metadata.get('version')}")
+        arrays = {name: data[name] for name in data.files if name != 'metadata'}
+    return decode_trajectories(metadata, arrays, vehicle_ids=vehicle_ids, sort_by_time=sort_by_time)
+
+
+### ------------------------------ MAIN ------------------------------ ###
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress a vehicle data CSV into a trajectory store, or decode one.")
+    parser.add_argument("--dataset", type=str, required=True, help="Vehicle data CSV to compress, or .traj.npz store to decode.")
+    parser.add_argument("--output", type=str, default=None, help="Output path (default: next to the input).")
+    parser.add_argument("--error_bounds", type=str, default="None", help="Per-column error bounds as JSON, e.g. '{\"Speed\": 0.05}'.")
+
+    args = parser.parse_args()
+
+    if args.dataset.endswith('.traj.npz'):
+        output_path = args.output or args.dataset.replace('.traj.npz', '_decoded.csv')
+        read_trajectories(args.dataset).to_csv(output_path, index=False)
+        print(f"LOG: Decoded trajectories saved to {output_path}")
+    else:
+        error_bounds = None
+        if args.error_bounds != "None":
+            error_bounds = {**DEFAULT_ERROR_BOUNDS, **json.loads(args.error_bounds)}
+        output_path = args.output or get_store_path(args.dataset)
+        metadata = write_trajectories(pd.read_csv(args.dataset), output_path, error_bounds=error_bounds)
+        print(f"LOG: Kept {metadata['kept_rows']} of {metadata['rows']} rows, store saved to {output_path}")
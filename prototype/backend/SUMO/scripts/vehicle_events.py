@@ -0,0 +1,134 @@
+import numpy as np
+import traci.constants as tc
+
+# Lane change model state bits and the reason names SUMO's lanechange-output uses for them, in the order it joins them
+LANE_CHANGE_REASONS = (
+    (tc.LCA_STRATEGIC, "strategic"),
+    (tc.LCA_COOPERATIVE, "cooperative"),
+    (tc.LCA_SPEEDGAIN, "speedGain"),
+    (tc.LCA_KEEPRIGHT, "keepRight"),
+    (tc.LCA_SUBLANE, "sublane"),
+    (tc.LCA_TRACI, "traci"),
+    (tc.LCA_URGENT, "urgent"),
+)
+
+# Directions of vehicle.getLaneChangeState and the state bit set when the change in that direction is performed
+LANE_CHANGE_DIRECTIONS = ((-1, tc.LCA_RIGHT), (1, tc.LCA_LEFT))
+
+
+def lane_edge(lane_id):
+    """
+    Returns the edge ID of a SUMO lane ID ("<edge>_<index>").
+    """
+    return lane_id.rpartition("_")[0]
+
+
+def lane_change_reason(state):
+    """
+    Returns the lanechange-output style reason of a lane change model state, e.g. "strategic|urgent".
+    """
+    reasons = [reason for bit, reason in LANE_CHANGE_REASONS if state & bit]
+    return "|".join(reasons) if reasons else "unknown"
+
+
+def performed_lane_change(vehicle_id, get_lane_change_state):
+    """
+    Returns the reason of the lane change a vehicle performed in the last step, or None if it did not change lanes.
+    The state of the direction it changed to has that direction's bit set and no blocked bit.
+    """
+    for direction, bit in LANE_CHANGE_DIRECTIONS:
+        try:
+            state = get_lane_change_state(vehicle_id, direction)[1]
+        except Exception:
+            continue
+        if state & bit and not state & tc.LCA_BLOCKED:
+            return lane_change_reason(state)
+    return None
+
+
+class EventTracker:
+    """
+    Derives the Lane_Change, Lane_Change_Reason and Collision columns while the simulation runs.
+    Events seen after a step happened during it, and SUMO's lanechange/collision outputs stamp them with the time
+    the step started, so they belong to the samples of the previous step: observe a step's events first,
+    then take the previous step's columns with step_events().
+    A lane change is a new lane ID (on the same edge or the next one) that the lane change model reports
+    as performed; a collision is reported by the simulation for the collider and the victim.
+    Only vehicles that have been recorded are tracked, and no lane is queried for them at steps they are not recorded:
+    lanes that come for free (subscription results) may be observed then, otherwise the lane change model state is
+    stale across the skipped steps and a new lane on the same edge counts as a lane change with reason "unknown".
+    Events of vehicles that are not recorded at that step carry over to their next recorded sample.
+    """
+
+    def __init__(self):
+        self.lanes = {}
+        self.pending_lane_changes = {}
+        self.pending_collisions = set()
+        self.ongoing_collisions = set()
+
+    def add_collisions(self, collisions):
+        """
+        Queues the vehicles of getCollisions()-style results to be flagged on their next recorded sample.
+        A collision that lasts several steps is reported at each of them but, like collision-output, only counted once.
+        """
+        reported = set()
+        for collision in collisions:
+            pair = (collision.collider, collision.victim)
+            reported.add(pair)
+            if pair not in self.ongoing_collisions:
+                self.pending_collisions.add(collision.collider)
+                self.pending_collisions.add(collision.victim)
+        self.ongoing_collisions = reported
+
+    def tracked_vehicles(self):
+        """
+        Returns the vehicles whose lanes are tracked, i.e. that have been recorded and have not left.
+        """
+        return self.lanes.keys()
+
+    def observe_lanes(self, step, vehicle_ids, lane_ids, get_lane_change_state):
+        """
+        Compares each vehicle's lane with its lane at its previous observed step and queues the lane changes.
+        get_lane_change_state (vehicle.getLaneChangeState) is only called for vehicles whose lane ID changed since
+        the step before, which tells a lane change apart from moving on to the next edge. The first queued change wins.
+        """
+        for vehicle_id, lane_id in zip(vehicle_ids, lane_ids):
+            if lane_id is None:
+                continue
+            previous = self.lanes.get(vehicle_id)
+            self.lanes[vehicle_id] = (lane_id, step)
+            if previous is None or previous[0] == lane_id or vehicle_id in self.pending_lane_changes:
+                continue
+            if previous[1] == step - 1:
+                reason = performed_lane_change(vehicle_id, get_lane_change_state)
+            else:
+                reason = "unknown" if lane_edge(previous[0]) == lane_edge(lane_id) else None
+            if reason is not None:
+                self.pending_lane_changes[vehicle_id] = reason
+
+    def forget(self, vehicle_ids):
+        """
+        Drops the state of vehicles that have left the network.
+        """
+        for vehicle_id in vehicle_ids:
+            self.lanes.pop(vehicle_id, None)
+            self.pending_lane_changes.pop(vehicle_id, None)
+            self.pending_collisions.discard(vehicle_id)
+
+    def step_events(self, vehicle_ids):
+        """
+        Returns the (lane_changes, reasons, collisions) columns for a step's recorded vehicles
+        and clears the events they carry.
+        """
+        n = len(vehicle_ids)
+        lane_changes = np.zeros(n, dtype=bool)
+        collisions = np.zeros(n, dtype=bool)
+        reasons = ["None"] * n
+        for i, vehicle_id in enumerate(vehicle_ids):
+            if self.pending_lane_changes and vehicle_id in self.pending_lane_changes:
+                lane_changes[i] = True
+                reasons[i] = self.pending_lane_changes.pop(vehicle_id)
+            if self.pending_collisions and vehicle_id in self.pending_collisions:
+                collisions[i] = True
+                self.pending_collisions.discard(vehicle_id)
+        return lane_changes, reasons, collisions
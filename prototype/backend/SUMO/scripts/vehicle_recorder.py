@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+
+# Output schema of the extraction loop
+VEHICLE_DATA_COLUMNS = ['Time', 'Vehicle_ID', 'Speed', 'Acceleration', 'Latitude', 'Longitude',
+                        'Lane', 'Headway_Distance', 'Time_Gap', 'Speed_Limit',
+                        'Lane_Change', 'Lane_Change_Reason', 'Collision']
+
+# Storage type per numeric column (float32 where ~7 significant digits is enough, float64 for time and coordinates)
+NUMERIC_DTYPES = {
+    'Time': np.float64,
+    'Speed': np.float32,
+    'Acceleration': np.float32,
+    'Latitude': np.float64,
+    'Longitude': np.float64,
+    'Headway_Distance': np.float32,
+    'Time_Gap': np.float32,
+    'Speed_Limit': np.float32,
+    'Lane_Change': np.bool_,
+    'Collision': np.bool_,
+}
+
+# String columns stored as integer codes into a per-run dictionary
+ENCODED_COLUMNS = ('Vehicle_ID', 'Lane', 'Lane_Change_Reason')
+
+
+class StringDictionary:
+    """
+    Maps repeated strings (vehicle and lane IDs) to int32 codes. None is encoded as -1.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def encode_many(self, values):
+        return np.fromiter((self.encode(value) for value in values), dtype=np.int32, count=len(values))
+
+
+class ColumnarRecorder:
+    """
+    Buffers vehicle samples as one growable typed array per column instead of one dict per row.
+    Capacity doubles when full, and flushing reuses the arrays for the next chunk.
+    With a network index, Speed_Limit is joined from the static lane table by lane code instead of being recorded per sample.
+    """
+
+    def __init__(self, capacity=65536, net_index=None):
+        self.size = 0
+        self.capacity = capacity
+        self.net_index = net_index
+        self.lane_limits = np.empty(0, dtype=np.float32)
+        self.dictionaries = {column: StringDictionary() for column in ENCODED_COLUMNS}
+        self.arrays = {column: np.empty(capacity, dtype=NUMERIC_DTYPES.get(column, np.int32))
+                       for column in VEHICLE_DATA_COLUMNS}
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, extra):
+        """
+        Grows every column so `extra` more samples fit.
+        """
+        needed = self.size + extra
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for column, array in self.arrays.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[column] = grown
+        self.capacity = capacity
+
+    def append_step(self, current_time, vehicle_ids, step_metrics, lats, lons, events=None):
+        """
+        Appends every sample of a simulation step.
+        step_metrics holds one (speed, acceleration, lane_id, headway_distance, time_gap, speed_limit) tuple per vehicle.
+        events holds the (lane_changes, reasons, collisions) columns of the step; without it no event is recorded.
+        """
+        n = len(vehicle_ids)
+        if n == 0:
+            return
+        self.reserve(n)
+        start, end = self.size, self.size + n
+
+        speeds, accelerations, lane_ids, headways, time_gaps, speed_limits = zip(*step_metrics)
+        arrays = self.arrays
+        arrays['Time'][start:end] = current_time
+        arrays['Vehicle_ID'][start:end] = self.dictionaries['Vehicle_ID'].encode_many(vehicle_ids)
+        arrays['Speed'][start:end] = np.array(speeds, dtype=np.float64)
+        arrays['Acceleration'][start:end] = np.array(accelerations, dtype=np.float64)
+        arrays['Latitude'][start:end] = lats
+        arrays['Longitude'][start:end] = lons
+        arrays['Lane'][start:end] = self.dictionaries['Lane'].encode_many(lane_ids)
+        arrays['Headway_Distance'][start:end] = np.array(headways, dtype=np.float64)
+        arrays['Time_Gap'][start:end] = np.array(time_gaps, dtype=np.float64)
+        arrays['Speed_Limit'][start:end] = np.array(speed_limits, dtype=np.float64)
+        if events is None:
+            arrays['Lane_Change'][start:end] = False
+            arrays['Lane_Change_Reason'][start:end] = self.dictionaries['Lane_Change_Reason'].encode("None")
+            arrays['Collision'][start:end] = False
+        else:
+            lane_changes, reasons, collisions = events
+            arrays['Lane_Change'][start:end] = lane_changes
+            arrays['Lane_Change_Reason'][start:end] = self.dictionaries['Lane_Change_Reason'].encode_many(reasons)
+            arrays['Collision'][start:end] = collisions
+        self.size = end
+
+    def lane_speed_limits(self):
+        """
+        Returns the speed limit of every interned lane, looking up only lanes added since the last call.
+        """
+        lanes = self.dictionaries['Lane'].values
+        known = len(self.lane_limits)
+        if known < len(lanes):
+            new_limits = self.net_index.lane_speed_limits(lanes[known:]).astype(np.float32)
+            self.lane_limits = np.concatenate([self.lane_limits, new_limits])
+        return self.lane_limits
+
+    def to_frame(self):
+        """
+        Returns the buffered samples as a DataFrame. Encoded columns become categoricals over the dictionary.
+        """
+        data = {}
+        for column in VEHICLE_DATA_COLUMNS:
+            values = self.arrays[column][:self.size]
+            if column in self.dictionaries:
+                data[column] = pd.Categorical.from_codes(values, categories=self.dictionaries[column].values)
+            elif column == 'Speed_Limit' and self.net_index is not None:
+                # Missing lanes (code -1) pick up the trailing NaN
+                data[column] = np.append(self.lane_speed_limits(), np.float32(np.nan))[self.arrays['Lane'][:self.size]]
+            else:
+                data[column] = values
+        return pd.DataFrame(data, columns=VEHICLE_DATA_COLUMNS)
+
+    def write_csv(self, path, header=True):
+        """
+        Writes the buffered samples to a CSV chunk and empties the buffer.
+        """
+        self.to_frame().to_csv(path, index=False, mode='w', header=header)
+        self.clear()
+
+    def clear(self):
+        """
+        Empties the buffer, keeping the allocated arrays and dictionaries.
+        """
+        self.size = 0